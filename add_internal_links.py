@@ -1,47 +1,29 @@
-from anthropic import Anthropic
-import requests
-import xml.etree.ElementTree as ET
-from docx import Document
-from docx.shared import RGBColor
-from docx.oxml import OxmlElement
-from docx.oxml.ns import qn
+from api_clients import get_anthropic_client
+from sitemap import fetch_sitemap_pages
+from link_index import get_sitemap_index
+from anchor_matcher import link_article_locally, blocked_spans
+from linked_docx import render_linked_document
+from llm import build_cached_prompt, create_message, usage_counts, format_usage
+from model_routing import get_route
+import json
 import re
 
-def fetch_sitemap(sitemap_url):
+def fetch_sitemap(sitemap_url, progress_callback=None):
     """
     Fetch and parse XML sitemap to extract URLs and titles.
+    Follows sitemap indexes and gzipped sitemaps; results are cached on disk (see sitemap.py).
     
     Returns:
         list: List of dicts with 'url' and 'title' keys
     """
     try:
-        response = requests.get(sitemap_url, timeout=10)
-        response.raise_for_status()
-        
-        root = ET.fromstring(response.content)
-        
-        # Handle XML namespaces
-        namespaces = {'ns': 'http://www.sitemaps.org/schemas/sitemap/0.9'}
-        
-        urls = []
-        for url in root.findall('ns:url', namespaces):
-            loc = url.find('ns:loc', namespaces)
-            if loc is not None:
-                url_text = loc.text
-                # Extract title from URL (last segment)
-                title = url_text.rstrip('/').split('/')[-1].replace('-', ' ').title()
-                urls.append({
-                    'url': url_text,
-                    'title': title
-                })
-        
-        return urls
+        return fetch_sitemap_pages(sitemap_url, progress_callback=progress_callback)
     
     except Exception as e:
         raise Exception(f"Failed to fetch sitemap: {str(e)}")
 
 
-def add_internal_links(article_text, sitemap_url, num_links, priority_urls, api_key, progress_callback=None):
+def add_internal_links(article_text, sitemap_url, num_links, priority_urls, api_key, progress_callback=None, use_cache=True, candidate_limit=150, mode='llm', output='edits', model_routes=None):
     """
     Add internal links to an article using Claude AI.
     
@@ -52,6 +34,13 @@ def add_internal_links(article_text, sitemap_url, num_links, priority_urls, api_
         priority_urls: Comma-separated list of priority URLs (or empty string)
         api_key: Anthropic API key
         progress_callback: Optional function to call with progress updates
+        use_cache: Reuse an identical earlier response from the on-disk response cache
+        candidate_limit: Max sitemap pages sent to Claude; larger sitemaps are shortlisted by relevance
+        mode: 'llm' (Claude places every link), 'fast' (exact page-title matches only, no API call)
+              or 'hybrid' (title matches first, Claude places the rest)
+        output: 'edits' (Claude returns a short list of link insertions that are applied locally)
+                or 'article' (Claude returns the whole article with links inserted)
+        model_routes: The client's model routing overrides (see model_routing.py)
     
     Returns:
         Document: Word document with hyperlinks added
@@ -63,52 +52,150 @@ def add_internal_links(article_text, sitemap_url, num_links, priority_urls, api_
         else:
             print(text)
     
-    # Initialize client
-    client = Anthropic(api_key=api_key)
+    linked_article_text = insert_internal_links(
+        article_text,
+        sitemap_url,
+        num_links,
+        priority_urls,
+        api_key,
+        progress_callback=update_progress,
+        use_cache=use_cache,
+        candidate_limit=candidate_limit,
+        mode=mode,
+        output=output,
+        model_routes=model_routes
+    )
+    
+    # Create Word document with hyperlinks
+    update_progress("Creating Word document with hyperlinks...")
+    doc = render_linked_document(linked_article_text)
+    update_progress("✓ Document created with hyperlinks!")
+    
+    return doc
+
+
+def insert_internal_links(article_text, sitemap_url, num_links, priority_urls, api_key, progress_callback=None, use_cache=True, candidate_limit=150, mode='llm', output='edits', model_routes=None):
+    """
+    Same as add_internal_links, but returns the linked article text instead of a Word document.
+    
+    Returns:
+        str: Article text with links in [[anchor text|URL]] format (render with linked_docx)
+    """
+    
+    def update_progress(text):
+        if progress_callback:
+            progress_callback(text)
+        else:
+            print(text)
     
     # Fetch sitemap
     update_progress("Fetching sitemap...")
-    sitemap_pages = fetch_sitemap(sitemap_url)
-    
-    # Format sitemap for prompt
-    sitemap_text = "\n".join([f"- {page['title']}: {page['url']}" for page in sitemap_pages])
+    sitemap_pages = fetch_sitemap(sitemap_url, progress_callback=update_progress)
     
     # Parse priority URLs
     priority_urls_list = []
     if priority_urls.strip():
         priority_urls_list = [url.strip() for url in priority_urls.replace('\n', ',').split(',') if url.strip()]
     
+    linked_article_text = article_text
+    links_needed = num_links
+    used_urls = []
+    
+    # Fast path: link literal mentions of page titles without calling Claude
+    if mode in ('fast', 'hybrid'):
+        update_progress("Matching page titles in article...")
+        linked_article_text, matched = link_article_locally(article_text, sitemap_url, sitemap_pages, num_links, priority_urls_list)
+        used_urls = [match['url'] for match in matched]
+        links_needed = num_links - len(matched)
+        update_progress(f"Matched {len(matched)} link(s) from page titles")
+    
+    if mode == 'llm' or (mode == 'hybrid' and links_needed > 0):
+        linked_article_text = place_links_with_claude(
+            linked_article_text,
+            sitemap_url,
+            sitemap_pages,
+            links_needed,
+            priority_urls_list,
+            get_anthropic_client(api_key),
+            update_progress,
+            use_cache=use_cache,
+            candidate_limit=candidate_limit,
+            existing_urls=used_urls,
+            output=output,
+            model_routes=model_routes
+        )
+    
+    return linked_article_text
+
+
+def place_links_with_claude(article_text, sitemap_url, sitemap_pages, num_links, priority_urls_list, client, update_progress, use_cache=True, candidate_limit=150, existing_urls=None, output='edits', model_routes=None):
+    """
+    Ask Claude to add links to an article.
+    
+    Args:
+        existing_urls: URLs already linked in article_text; they are kept and not offered again
+        output: 'edits' to get (paragraph, anchor, URL) insertions back and apply them locally,
+                'article' to have Claude echo the full linked article
+        model_routes: The client's model routing overrides ('link_placement' for edits, 'link_rewrite' for article)
+    
+    Returns:
+        str: Article text with links in [[anchor text|URL]] format
+    """
+    existing_urls = set(existing_urls or [])
+    all_pages = sitemap_pages
+    if existing_urls:
+        sitemap_pages = [page for page in sitemap_pages if page['url'] not in existing_urls]
+        priority_urls_list = [url for url in priority_urls_list if url not in existing_urls]
+    
+    # Every URL Claude may link to, for validating returned edits
+    valid_urls = {page['url'] for page in sitemap_pages} | set(priority_urls_list)
+    
+    # Only send the most relevant pages for large sitemaps (priority URLs are always kept)
+    if len(sitemap_pages) > candidate_limit:
+        # The index covers the full sitemap so it stays cached across articles; used URLs are dropped afterwards
+        sitemap_index = get_sitemap_index(sitemap_url, all_pages)
+        shortlist = sitemap_index.shortlist(article_text, candidate_limit + len(existing_urls), priority_urls_list)
+        sitemap_pages = [page for page in shortlist if page['url'] not in existing_urls][:len(priority_urls_list) + candidate_limit]
+        update_progress(f"Shortlisted {len(sitemap_pages)} of {len(sitemap_index.pages)} sitemap pages")
+    
+    # Format sitemap for prompt
+    sitemap_text = "\n".join([f"- {page['title']}: {page['url']}" for page in sitemap_pages])
+    
     priority_text = "\n".join([f"- {url}" for url in priority_urls_list]) if priority_urls_list else "None specified"
     
+    existing_links_note = ""
+    if existing_urls:
+        existing_links_note = f"\n\nThe article already contains {len(existing_urls)} link(s) in [[anchor text|URL]] format. Keep them exactly as they are and add only the new links."
+    
     # Create prompt
     update_progress("Analyzing article for link opportunities...")
     
-    prompt = f"""You are an internal linking specialist. Add internal links to this article.
-
-ARTICLE TO ADD LINKS TO:
-{article_text}
+    # The page list is the same for every article of a small-sitemap client, so it leads the prompt and is cached
+    sitemap_context = f"""You are an internal linking specialist. Add internal links to an article.
 
 AVAILABLE PAGES (from sitemap):
-{sitemap_text}
-
-PRIORITY URLS (use these first if contextually relevant):
-{priority_text}
-
-NUMBER OF LINKS TO ADD: {num_links}
+{sitemap_text}"""
+    
+    if output == 'edits':
+        article_block = number_paragraphs(article_text)
+        output_instructions = f"""OUTPUT FORMAT:
+Return ONLY a JSON array with one object per link to insert, for example:
+[{{"paragraph": 3, "anchor": "payment processing", "url": "https://example.com/payments"}}]
+- "paragraph" is the number in square brackets in front of the paragraph
+- "anchor" must be copied EXACTLY from that paragraph
+- "url" must be one of the available pages or priority URLs
+- Do NOT return the article text
 
-INSTRUCTIONS:
-1. Read the article carefully and identify {num_links} opportunities for internal links
-2. PRIORITIZE the priority URLs first - if they fit contextually, use them before other pages
-3. For each link:
-   - Find natural anchor text (2-5 words) that describes the destination page
-   - Choose the most relevant page from the available pages
-   - Ensure the link fits naturally in the sentence context
-   - Do NOT force links where they don't make sense
-4. Each URL should be used ONLY ONCE across the entire article
-5. Distribute links throughout the article - avoid clustering in one section
-6. Links should feel natural, not keyword-stuffed
+CRITICAL RULES:
+- Use each URL only once
+- Add exactly {num_links} links (or fewer if not enough good opportunities)
+- Links must be contextually relevant
+- Never put a link in a heading or inside an existing [[anchor text|URL]] link
 
-OUTPUT FORMAT:
+Return the JSON array:"""
+    else:
+        article_block = article_text
+        output_instructions = f"""OUTPUT FORMAT:
 Return the article with links in this EXACT format:
 - Use double square brackets for links: [[anchor text|URL]]
 - Example: "This is a sentence about [[payment processing|https://example.com/payments]] in the article."
@@ -124,92 +211,148 @@ CRITICAL RULES:
 - Only add the link syntax, don't modify any other text
 
 Return the complete article with internal links added:"""
+    
+    prompt = f"""ARTICLE TO ADD LINKS TO:
+{article_block}
+
+PRIORITY URLS (use these first if contextually relevant):
+{priority_text}
+
+NUMBER OF LINKS TO ADD: {num_links}{existing_links_note}
+
+INSTRUCTIONS:
+1. Read the article carefully and identify {num_links} opportunities for internal links
+2. PRIORITIZE the priority URLs first - if they fit contextually, use them before other pages
+3. For each link:
+   - Find natural anchor text (2-5 words) that describes the destination page
+   - Choose the most relevant page from the available pages
+   - Ensure the link fits naturally in the sentence context
+   - Do NOT force links where they don't make sense
+4. Each URL should be used ONLY ONCE across the entire article
+5. Distribute links throughout the article - avoid clustering in one section
+6. Links should feel natural, not keyword-stuffed
+
+{output_instructions}"""
 
     # Call Claude
-    message = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=8000,
+    message = create_message(
+        client,
+        use_cache=use_cache,
+        **get_route('link_placement' if output == 'edits' else 'link_rewrite', model_routes),
         messages=[{
             "role": "user",
-            "content": prompt
+            "content": build_cached_prompt([sitemap_context], prompt)
         }]
     )
     
-    linked_article_text = message.content[0].text.strip()
-    
-    # Create Word document with hyperlinks
-    update_progress("Creating Word document with hyperlinks...")
+    response_text = message.content[0].text.strip()
     
-    doc = Document()
+    if output == 'edits':
+        edits = parse_link_edits(response_text)
+        linked_article_text, applied, rejected = apply_link_edits(article_text, edits, valid_urls, existing_urls)
+        for edit, reason in rejected:
+            label = f"{edit.get('anchor')!r} -> {edit.get('url')}" if isinstance(edit, dict) else repr(edit)[:80]
+            update_progress(f"Skipped link {label}: {reason}")
+        update_progress(f"Applied {len(applied)} of {len(edits)} link edits")
+    else:
+        linked_article_text = response_text
     
-    # Parse the linked article and add to document
-    # Split by paragraphs
-    paragraphs = linked_article_text.split('\n\n')
+    update_progress(f"Links placed ({message.model}; {format_usage(usage_counts(message.usage))})")
     
-    for para_text in paragraphs:
-        if not para_text.strip():
-            continue
-        
-        # Add paragraph
-        paragraph = doc.add_paragraph()
-        
-        # Find all links in format [[anchor text|URL]]
-        parts = re.split(r'\[\[([^\]]+)\]\]', para_text)
-        
-        for i, part in enumerate(parts):
-            if i % 2 == 0:
-                # Regular text
-                if part:
-                    paragraph.add_run(part)
-            else:
-                # Link part - format: anchor text|URL
-                if '|' in part:
-                    anchor, url = part.split('|', 1)
-                    anchor = anchor.strip()
-                    url = url.strip()
-                    
-                    # Add hyperlink
-                    add_hyperlink(paragraph, url, anchor)
-                else:
-                    # Malformed link, just add as text
-                    paragraph.add_run(f"[[{part}]]")
-    
-    update_progress("✓ Document created with hyperlinks!")
-    
-    return doc
+    return linked_article_text
+
 
+def number_paragraphs(article_text):
+    """Prefix each paragraph with its index ([0], [1], ...) so Claude can refer to it in edits."""
+    paragraphs = article_text.split('\n\n')
+    return "\n\n".join(f"[{i}] {para}" for i, para in enumerate(paragraphs) if para.strip())
 
-def add_hyperlink(paragraph, url, text):
+
+def parse_link_edits(response_text):
     """
-    Add a hyperlink to a paragraph in Word document.
+    Parse Claude's JSON list of link insertions.
     
-    Args:
-        paragraph: The paragraph object
-        url: The URL to link to
-        text: The anchor text
+    The first JSON value in the response is used, so code fences or a sentence around the
+    array are fine. Anything other than a list is wrapped in one; items that aren't edit
+    dicts are left for apply_link_edits to reject.
+    
+    Returns:
+        list: Edits, normally dicts with 'paragraph', 'anchor' and 'url' keys
     """
-    # Create hyperlink element
-    part = paragraph.part
-    r_id = part.relate_to(url, 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/hyperlink', is_external=True)
+    decoder = json.JSONDecoder()
+    for match in re.finditer(r'[\[{]', response_text):
+        try:
+            edits, _ = decoder.raw_decode(response_text, match.start())
+        except ValueError:
+            continue
+        return edits if isinstance(edits, list) else [edits]
     
-    hyperlink = OxmlElement('w:hyperlink')
-    hyperlink.set(qn('r:id'), r_id)
+    raise Exception("Could not parse link edits: no JSON found in response")
+
+
+def apply_link_edits(article_text, edits, valid_urls, existing_urls=None):
+    """
+    Insert link edits into the original article text.
     
-    # Create run element
-    new_run = OxmlElement('w:r')
-    rPr = OxmlElement('w:rPr')
+    An edit is only applied if its URL is a known page not used yet, its paragraph exists, and
+    its anchor occurs in that paragraph outside headings and existing links.
     
-    # Add blue color and underline
-    color = OxmlElement('w:color')
-    color.set(qn('w:val'), '0000FF')
-    rPr.append(color)
+    Args:
+        article_text: Original article text
+        edits: Dicts with 'paragraph', 'anchor' and 'url' keys
+        valid_urls: Set of URLs that may be linked
+        existing_urls: URLs already linked in the article
     
-    u = OxmlElement('w:u')
-    u.set(qn('w:val'), 'single')
-    rPr.append(u)
+    Returns:
+        tuple: (linked_article_text, applied edits, list of (edit, reason) for rejected edits)
+    """
+    paragraphs = article_text.split('\n\n')
+    used_urls = set(existing_urls or [])
+    applied = []
+    rejected = []
     
-    new_run.append(rPr)
-    new_run.text = text
-    hyperlink.append(new_run)
+    for edit in edits:
+        if not isinstance(edit, dict):
+            rejected.append((edit, "malformed edit"))
+            continue
+        
+        url = str(edit.get('url', '')).strip()
+        anchor = str(edit.get('anchor', '')).strip()
+        index = edit.get('paragraph')
+        
+        # Linked URLs are checked first: callers may leave them out of valid_urls
+        if url in used_urls:
+            rejected.append((edit, "URL already linked"))
+            continue
+        if url not in valid_urls:
+            rejected.append((edit, "URL not in sitemap"))
+            continue
+        if not isinstance(index, int) or not 0 <= index < len(paragraphs):
+            rejected.append((edit, "no such paragraph"))
+            continue
+        
+        paragraph = paragraphs[index]
+        if not anchor:
+            rejected.append((edit, "no anchor"))
+            continue
+        
+        # Exact case first, then any case; whole words only and never inside a heading or another link
+        blocked = blocked_spans(paragraph)
+        found = None
+        for flags in (0, re.IGNORECASE):
+            for match in re.finditer(r'(?<!\w)' + re.escape(anchor) + r'(?!\w)', paragraph, flags):
+                if not any(match.start() < end and start < match.end() for start, end in blocked):
+                    found = match
+                    break
+            if found:
+                break
+        
+        if not found:
+            rejected.append((edit, "anchor not found in paragraph"))
+            continue
+        
+        paragraphs[index] = f"{paragraph[:found.start()]}[[{found.group()}|{url}]]{paragraph[found.end():]}"
+        used_urls.add(url)
+        applied.append(edit)
     
-    paragraph._p.append(hyperlink)
\ No newline at end of file
+    return '\n\n'.join(paragraphs), applied, rejected
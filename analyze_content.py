@@ -1,9 +1,198 @@
-from anthropic import Anthropic
-from serpapi import GoogleSearch
-from firecrawl import FirecrawlApp
+from api_clients import get_anthropic_client
+from scraper import scrape_urls
+from serp import google_search
+from outline import extract_outline
+from gap_analysis import analyze_gaps, gap_json, article_summary
+from llm import build_cached_prompt, create_message, usage_counts, add_usage, format_usage
+from model_routing import get_route
 import json
 
-def analyze_content_for_refresh(article_text, keyword, icp_brief, serpapi_key, firecrawl_key, api_key, progress_callback=None):
+PRIORITY_TOOL_NAME = "record_gap_priorities"
+# Extra calls allowed for gaps a structured response left out or got wrong
+PRIORITY_RETRIES = 2
+
+
+def gap_candidates(gaps):
+    """
+    Missing and thin sections from gap_json as one list of {'title', 'type', 'section'} dicts.
+
+    Titles are the keys of the structured filter (the tool schema enum and its answers), so a
+    title that repeats (ignoring case and surrounding space) is only kept the first time.
+    """
+    candidates = []
+    seen = set()
+    for gap_type, sections in (('missing', gaps['missing_sections']), ('thin', gaps['thin_sections'])):
+        for section in sections:
+            key = section['title'].strip().lower()
+            if key not in seen:
+                seen.add(key)
+                candidates.append({'title': section['title'], 'type': gap_type, 'section': section})
+    return candidates
+
+
+def priority_tool(candidates):
+    """
+    Tool definition for the structured ICP filter. The schema only admits the given gap titles.
+    """
+    return {
+        "name": PRIORITY_TOOL_NAME,
+        "description": "Record the ICP priority of every content gap.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "gaps": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "title": {"type": "string", "enum": [candidate['title'] for candidate in candidates]},
+                            "type": {"type": "string", "enum": ["missing", "thin"]},
+                            "priority": {"type": "string", "enum": ["high", "low"]},
+                            "reason": {"type": "string", "description": "Why the gap matters (or not) for the ICP"}
+                        },
+                        "required": ["title", "type", "priority", "reason"],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["gaps"],
+            "additionalProperties": False
+        }
+    }
+
+
+def validate_priorities(message, candidates):
+    """
+    Check a structured ICP filter response against the gaps it was asked about.
+
+    Args:
+        message: Claude response to a request forcing the priority tool
+        candidates: gap_candidates entries the response should cover
+
+    Returns:
+        tuple: (valid entries by title, candidates still unresolved, list of problems found)
+    """
+    by_title = {candidate['title'].strip().lower(): candidate for candidate in candidates}
+    valid = {}
+    mentioned = set()
+    errors = []
+
+    tool_input = next(
+        (block.input for block in message.content if block.type == 'tool_use' and block.name == PRIORITY_TOOL_NAME),
+        None
+    )
+    if not isinstance(tool_input, dict) or not isinstance(tool_input.get('gaps'), list):
+        errors.append(f"the response did not call {PRIORITY_TOOL_NAME} with a 'gaps' list")
+        return valid, list(candidates), errors
+
+    for entry in tool_input['gaps']:
+        if not isinstance(entry, dict):
+            errors.append(f"entry is not an object: {entry!r}")
+            continue
+
+        candidate = by_title.get(str(entry.get('title', '')).strip().lower())
+        if candidate is None:
+            errors.append(f"unknown gap title: {entry.get('title')!r}")
+            continue
+
+        mentioned.add(candidate['title'])
+        if candidate['title'] in valid:
+            continue
+        elif entry.get('type') != candidate['type']:
+            errors.append(f"'{candidate['title']}' is a {candidate['type']} section, not {entry.get('type')!r}")
+        elif entry.get('priority') not in ('high', 'low'):
+            errors.append(f"'{candidate['title']}' has priority {entry.get('priority')!r} (use 'high' or 'low')")
+        elif not isinstance(entry.get('reason'), str) or not entry['reason'].strip():
+            errors.append(f"'{candidate['title']}' has no reason")
+        else:
+            valid[candidate['title']] = {'title': candidate['title'], 'type': candidate['type'], 'priority': entry['priority'], 'reason': entry['reason'].strip()}
+
+    omitted = [candidate['title'] for candidate in candidates if candidate['title'] not in mentioned]
+    if omitted:
+        errors.append(f"no entry for: {', '.join(omitted)}")
+    unresolved = [candidate for candidate in candidates if candidate['title'] not in valid]
+    return valid, unresolved, errors
+
+
+def prioritize_gaps_structured(client, article_context, gaps, update_progress, total_usage, use_cache=True, retries=PRIORITY_RETRIES, route=None):
+    """
+    ICP filter through a forced tool call. Gaps that fail validation are asked about
+    again on their own, so one bad entry doesn't rerun the whole filter.
+
+    Args:
+        client: Anthropic client
+        article_context: Cached prompt prefix (article summary and ICP brief)
+        gaps: gap_json result
+        update_progress: Progress function
+        total_usage: Usage totals to add each call's usage to
+        use_cache: Use the on-disk response cache
+        retries: Extra calls allowed for unresolved gaps
+        route: Model settings to use (defaults to the 'refresh_priorities' route)
+
+    Returns:
+        dict: high_priority_missing, high_priority_thin and low_priority lists (the shape
+            the free-text ICP filter asks for)
+    """
+    route = route or get_route('refresh_priorities')
+    pending = gap_candidates(gaps)
+    resolved = {}
+    errors = []
+
+    for attempt in range(retries + 1):
+        if not pending:
+            break
+        if attempt:
+            update_progress(f"Re-checking {len(pending)} gap(s) that failed validation...")
+
+        pending_gaps = {
+            'missing_sections': [candidate['section'] for candidate in pending if candidate['type'] == 'missing'],
+            'thin_sections': [candidate['section'] for candidate in pending if candidate['type'] == 'thin']
+        }
+        correction = ""
+        if errors:
+            correction = "\n\nYour previous answer had these problems:\n" + '\n'.join(f"- {error}" for error in errors)
+
+        prompt = f"""Filter these content gaps based on ICP relevance.
+
+GAP ANALYSIS:
+{json.dumps(pending_gaps, indent=2)}
+
+Task:
+Decide which gaps and thin sections are HIGH PRIORITY for this ICP and which are LOW PRIORITY.
+Call {PRIORITY_TOOL_NAME} with exactly one entry per gap above, using its exact title and its type ("missing" or "thin").{correction}"""
+
+        message = create_message(
+            client,
+            use_cache=use_cache,
+            **route,
+            tools=[priority_tool(pending)],
+            tool_choice={"type": "tool", "name": PRIORITY_TOOL_NAME},
+            messages=[{"role": "user", "content": build_cached_prompt([article_context], prompt)}]
+        )
+        add_usage(total_usage, usage_counts(message.usage))
+
+        valid, pending, errors = validate_priorities(message, pending)
+        resolved.update(valid)
+
+    if pending:
+        # Keep what could not be classified instead of dropping it silently
+        update_progress(f"⚠️ {len(pending)} gap(s) could not be classified ({'; '.join(errors)}); keeping them as high priority")
+        for candidate in pending:
+            resolved[candidate['title']] = {'title': candidate['title'], 'type': candidate['type'], 'priority': 'high', 'reason': "Not classified; review manually"}
+
+    filtered = {'high_priority_missing': [], 'high_priority_thin': [], 'low_priority': []}
+    for candidate in gap_candidates(gaps):
+        entry = resolved[candidate['title']]
+        if entry['priority'] == 'low':
+            filtered['low_priority'].append({'title': entry['title'], 'why_not_relevant': entry['reason']})
+        elif entry['type'] == 'missing':
+            filtered['high_priority_missing'].append({'title': entry['title'], 'why_important_for_icp': entry['reason']})
+        else:
+            filtered['high_priority_thin'].append({'title': entry['title'], 'why_needs_enrichment': entry['reason']})
+    return filtered
+
+
+def analyze_content_for_refresh(article_text, keyword, icp_brief, serpapi_key, firecrawl_key, api_key, progress_callback=None, use_cache=True, structured=False, model_routes=None):
     """
     Analyze article and generate refresh recommendations.
     
@@ -15,6 +204,10 @@ def analyze_content_for_refresh(article_text, keyword, icp_brief, serpapi_key, f
         firecrawl_key: FireCrawl key
         api_key: Anthropic API key
         progress_callback: Optional progress tracking function
+        use_cache: Reuse identical earlier responses from the on-disk response cache
+        structured: Get ICP priorities through a forced tool call with a fixed JSON schema,
+            validated locally; only gaps that fail validation are asked about again
+        model_routes: The client's model routing overrides (see model_routing.py)
     
     Returns:
         str: Recommendations in write_article.py format
@@ -26,7 +219,8 @@ def analyze_content_for_refresh(article_text, keyword, icp_brief, serpapi_key, f
         else:
             print(text)
     
-    client = Anthropic(api_key=api_key)
+    client = get_anthropic_client(api_key)
+    total_usage = {}
     
     # Step 1: Get competitor URLs
     update_progress("Searching for top competitor articles...")
@@ -37,8 +231,7 @@ def analyze_content_for_refresh(article_text, keyword, icp_brief, serpapi_key, f
         "api_key": serpapi_key
     }
     
-    search = GoogleSearch(params)
-    results = search.get_dict()
+    results = google_search(params)
     
     urls = [r['link'] for r in results.get('organic_results', [])][:5]
     update_progress(f"Found {len(urls)} competitor URLs")
@@ -46,111 +239,56 @@ def analyze_content_for_refresh(article_text, keyword, icp_brief, serpapi_key, f
     # Step 2: Scrape competitor H2/H3 structures
     update_progress("Scraping competitor article structures...")
     
-    firecrawl = FirecrawlApp(api_key=firecrawl_key)
     competitor_structures = []
     
-    for idx, url in enumerate(urls, 1):
-        try:
-            update_progress(f"Scraping {idx}/5: {url[:50]}...")
-            result = firecrawl.scrape(url)
-            markdown = result.markdown if hasattr(result, 'markdown') else ''
-            
-            if not markdown:
-                continue
-            
-            # Extract H2/H3 headers
-            headers = []
-            lines = markdown.split('\n')
-            for line in lines:
-                line = line.strip()
-                if line.startswith('## ') and not line.startswith('### '):
-                    h2_title = line.replace('## ', '').strip()
-                    headers.append(f"## {h2_title}")
-                elif line.startswith('### '):
-                    h3_title = line.replace('### ', '').strip()
-                    headers.append(f"### {h3_title}")
-            
-            competitor_structures.append({
-                'url': url,
-                'headers': '\n'.join(headers)
-            })
-            
-        except Exception as e:
-            update_progress(f"Failed to scrape {url}: {str(e)}")
+    # Failures are reported by scrape_urls as each page finishes
+    for page in scrape_urls(urls, firecrawl_key, progress_callback=update_progress):
+        if page['error']:
             continue
+        
+        competitor_structures.append({
+            'url': page['url'],
+            'outline': page['outline']
+        })
     
     update_progress(f"Successfully scraped {len(competitor_structures)} competitor articles")
     
     # Step 3: Extract your article structure
-    your_headers = []
-    lines = article_text.split('\n')
-    for line in lines:
-        line = line.strip()
-        if line.startswith('## ') and not line.startswith('### '):
-            h2_title = line.replace('## ', '').strip()
-            your_headers.append(f"## {h2_title}")
-        elif line.startswith('### '):
-            h3_title = line.replace('### ', '').strip()
-            your_headers.append(f"### {h3_title}")
-    
-    your_structure = '\n'.join(your_headers)
-    
-    # Step 4: Claude Call 1 - Gap Analysis
-    update_progress("Analyzing content gaps...")
+    your_outline = extract_outline(article_text)
     
-    competitor_structures_text = '\n\n'.join([
-        f"COMPETITOR {i+1} ({comp['url'][:50]}):\n{comp['headers']}"
-        for i, comp in enumerate(competitor_structures)
-    ])
+    # Step 4: Gap Analysis (local: section alignment, competitor coverage, word-count deltas)
+    update_progress("Analyzing content gaps...")
     
-    gap_prompt = f"""Analyze this article structure against competitor articles to identify gaps.
-
-YOUR ARTICLE STRUCTURE:
-{your_structure}
-
-COMPETITOR ARTICLE STRUCTURES:
-{competitor_structures_text}
-
-Task:
-1. Identify sections that competitors have but you don't (missing sections)
-2. Identify sections you have that seem thinner/less comprehensive than competitors (thin sections)
-
-Return your analysis as JSON:
-{{
-  "missing_sections": [
-    {{"title": "Section Title", "frequency": "appears in X/5 competitors", "reason": "why it matters"}}
-  ],
-  "thin_sections": [
-    {{"title": "Your Section Title", "issue": "what's missing compared to competitors"}}
-  ]
-}}
-
-Return ONLY the JSON, no explanations."""
-
-    gap_message = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=3000,
-        messages=[{"role": "user", "content": gap_prompt}]
+    gap_report = analyze_gaps(your_outline, [comp['outline'] for comp in competitor_structures], keyword)
+    gaps = gap_json(gap_report)
+    gap_analysis = json.dumps(gaps, indent=2)
+    update_progress(
+        f"Found {len(gap_report['missing'])} missing and "
+        f"{sum(1 for section in gap_report['aligned'] if section['thin'])} thin sections"
     )
     
-    gap_analysis = gap_message.content[0].text.strip()
-    # Clean JSON from potential markdown formatting
-    gap_analysis = gap_analysis.replace('```json', '').replace('```', '').strip()
-    
-    # Step 5: Claude Call 2 - ICP Relevance Filter
+    # Step 5: Claude Call 1 - ICP Relevance Filter
     update_progress("Filtering recommendations for ICP relevance...")
     
-    icp_prompt = f"""Filter these content gaps based on ICP relevance.
+    # The article summary and ICP brief are sent to both remaining calls, so they lead the prompt and are cached
+    article_context = f"""YOUR ARTICLE:
+{article_summary(article_text, gap_report)}
+
+TARGET AUDIENCE (ICP):
+{icp_brief}"""
+    
+    priority_route = get_route('refresh_priorities', model_routes)
+    if structured:
+        icp_filtered = json.dumps(
+            prioritize_gaps_structured(client, article_context, gaps, update_progress, total_usage, use_cache=use_cache, route=priority_route),
+            indent=2
+        )
+    else:
+        icp_prompt = f"""Filter these content gaps based on ICP relevance.
 
 GAP ANALYSIS:
 {gap_analysis}
 
-YOUR ARTICLE:
-{article_text}
-
-TARGET AUDIENCE (ICP):
-{icp_brief}
-
 Task:
 Determine which gaps and thin sections are HIGH PRIORITY for this ICP and which are LOW PRIORITY.
 
@@ -169,32 +307,28 @@ Return as JSON:
 
 Return ONLY the JSON."""
 
-    icp_message = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=3000,
-        messages=[{"role": "user", "content": icp_prompt}]
-    )
+        icp_message = create_message(
+            client,
+            use_cache=use_cache,
+            **priority_route,
+            messages=[{"role": "user", "content": build_cached_prompt([article_context], icp_prompt)}]
+        )
     
-    icp_filtered = icp_message.content[0].text.strip()
-    icp_filtered = icp_filtered.replace('```json', '').replace('```', '').strip()
+        add_usage(total_usage, usage_counts(icp_message.usage))
+        icp_filtered = icp_message.content[0].text.strip()
+        icp_filtered = icp_filtered.replace('```json', '').replace('```', '').strip()
     
-    # Step 6: Claude Call 3 - Generate Recommendations with Writing Guidelines
+    # Step 6: Claude Call 2 - Generate Recommendations with Writing Guidelines
     update_progress("Generating detailed recommendations...")
     
     recommendations_prompt = f"""Generate detailed content refresh recommendations with writing guidelines.
 
-YOUR ARTICLE:
-{article_text}
-
-COMPETITOR STRUCTURES:
-{competitor_structures_text}
+GAP ANALYSIS (competitor coverage and word counts):
+{gap_analysis}
 
 FILTERED GAPS (HIGH PRIORITY):
 {icp_filtered}
 
-ICP CONTEXT:
-{icp_brief}
-
 PRIMARY KEYWORD: {keyword}
 
 Task:
@@ -204,27 +338,29 @@ H2 [New Section Title] ([word count] words)
 [Detailed writing guidelines: what to cover, how to structure, specific points to include, tone, examples to add, ICP pain points to address]
 
 H3 [Section to Enrich] - ENRICH ([new word count] words)
-[Current state, what's missing, specific additions needed, examples from competitors, ICP alignment needed]
+[Current state, what's missing, specific additions needed, ICP alignment needed]
 
 Rules:
 1. Use "H2" prefix for new sections to add
 2. Use "H3" prefix with "- ENRICH" suffix for existing sections to expand
-3. Word counts should be realistic (150-300 words typical)
+3. Word counts should be realistic (150-300 words typical); use the competitor median word counts as a guide
 4. Writing guidelines must be detailed and specific (not vague)
-5. Reference competitor examples where relevant
+5. Use the competitor heading variants ("also_called") to see how competitors frame a topic; competitor page content is not available, so don't cite it
 6. Align with ICP needs explicitly
 7. Only include HIGH PRIORITY items
 
 Generate recommendations now:"""
 
-    rec_message = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=5000,
-        messages=[{"role": "user", "content": recommendations_prompt}]
+    rec_message = create_message(
+        client,
+        use_cache=use_cache,
+        **get_route('refresh_recommendations', model_routes),
+        messages=[{"role": "user", "content": build_cached_prompt([article_context], recommendations_prompt)}]
     )
     
+    add_usage(total_usage, usage_counts(rec_message.usage))
     recommendations = rec_message.content[0].text.strip()
     
-    update_progress("✓ Analysis complete!")
+    update_progress(f"✓ Analysis complete! ICP filter: {priority_route['model']}, recommendations: {rec_message.model}. Token usage: {format_usage(total_usage)}")
     
     return recommendations
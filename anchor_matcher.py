@@ -0,0 +1,220 @@
+"""
+Deterministic internal linking without an LLM.
+
+Every sitemap page title (and any synonyms) is compiled into one word-level Aho-Corasick
+automaton, so an article is scanned for all titles in a single pass. Matches are then
+picked to respect priority URLs, one use per URL and an even spread through the article,
+and written out in the same [[anchor|URL]] markup Claude is asked to produce.
+"""
+from link_index import cached_for_sitemap
+from bisect import bisect_right
+from collections import deque
+import re
+
+# Single-word titles too generic to make good anchors
+GENERIC_TITLES = {
+    'about', 'blog', 'careers', 'category', 'contact', 'home', 'index', 'login', 'news',
+    'page', 'pricing', 'privacy', 'resources', 'search', 'signup', 'tag', 'terms'
+}
+
+WORD_RE = re.compile(r"[A-Za-z0-9]+(?:'[A-Za-z]+)?")
+# Characters allowed between the words of one anchor
+JOINER_RE = re.compile(r"[ \t\-]+")
+
+
+def _words(text):
+    return [w.lower() for w in WORD_RE.findall(text)]
+
+
+def title_variants(title):
+    """Word sequences that should match a title: as written, plus singular/plural of the last word."""
+    words = tuple(_words(title))
+    if not words or all(w.isdigit() for w in words):
+        return []
+    if len(words) == 1 and (words[0] in GENERIC_TITLES or len(words[0]) < 4):
+        return []
+
+    variants = {words}
+    last = words[-1]
+    if last.endswith('s') and len(last) > 3:
+        variants.add(words[:-1] + (last[:-1],))
+    elif not last.isdigit():
+        variants.add(words[:-1] + (last + 's',))
+    return list(variants)
+
+
+class AnchorMatcher:
+    """
+    Word-level Aho-Corasick automaton over page titles.
+
+    Args:
+        pages: List of dicts with 'url' and 'title' keys
+        synonyms: Optional dict of url -> list of extra anchor phrases for that page
+    """
+
+    def __init__(self, pages, synonyms=None):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        phrases = [(page['title'], page['url']) for page in pages]
+        for url, extra in (synonyms or {}).items():
+            phrases.extend((phrase, url) for phrase in extra)
+
+        for phrase, url in phrases:
+            for words in title_variants(phrase):
+                self._add(words, url)
+        self._build()
+
+    def _add(self, words, url):
+        state = 0
+        for word in words:
+            if word not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][word] = len(self.goto) - 1
+            state = self.goto[state][word]
+        if (len(words), url) not in self.output[state]:
+            self.output[state].append((len(words), url))
+
+    def _build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and word not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(word, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def find_matches(self, text):
+        """
+        Scan text once for every title.
+
+        Returns:
+            list: Dicts with 'start', 'end' (character offsets), 'anchor' (text as written) and 'url'
+        """
+        tokens = [(m.start(), m.end(), m.group().lower()) for m in WORD_RE.finditer(text)]
+        matches = []
+        state = 0
+
+        for i, (_, end, word) in enumerate(tokens):
+            while state and word not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(word, 0)
+
+            for length, url in self.output[state]:
+                first = i - length + 1
+                start = tokens[first][0]
+                # Words of an anchor may only be separated by spaces or hyphens
+                if all(JOINER_RE.fullmatch(text[tokens[j][1]:tokens[j + 1][0]]) for j in range(first, i)):
+                    matches.append({'start': start, 'end': end, 'anchor': text[start:end], 'url': url})
+
+        return matches
+
+
+def blocked_spans(text):
+    """Character ranges that must not receive links: headings, existing links and bare URLs."""
+    patterns = [
+        r'^[ \t]*#.*$',              # markdown headings
+        r'\[\[[^\]]*\]\]',            # [[anchor|URL]] links
+        r'\[[^\]]*\]\([^)]*\)',        # [text](url) links
+        r'https?://\S+'              # bare URLs
+    ]
+    return [(m.start(), m.end()) for pattern in patterns for m in re.finditer(pattern, text, re.MULTILINE)]
+
+
+def select_links(text, matches, num_links, priority_urls=None, exclude_urls=None):
+    """
+    Choose up to num_links non-overlapping matches, one per URL, spread through the text.
+
+    Priority URLs are placed first, then longer (more specific) titles. Links are first
+    limited to one per paragraph; only if slots remain is the limit raised to two, and so
+    on. Within that limit each URL uses the occurrence in the paragraph with the fewest
+    links, farthest from the links already chosen.
+
+    Returns:
+        list: Selected match dicts, in text order
+    """
+    priority = set(priority_urls or [])
+    exclude = set(exclude_urls or [])
+    blocked = blocked_spans(text)
+    # Start offsets of the paragraphs after the first
+    breaks = [m.end() for m in re.finditer(r'\n[ \t]*\n', text)]
+
+    by_url = {}
+    for match in matches:
+        if match['url'] in exclude:
+            continue
+        if any(match['start'] < end and start < match['end'] for start, end in blocked):
+            continue
+        by_url.setdefault(match['url'], []).append(dict(match, paragraph=bisect_right(breaks, match['start'])))
+
+    def rank(url):
+        longest = max(m['end'] - m['start'] for m in by_url[url])
+        first = min(m['start'] for m in by_url[url])
+        return (url not in priority, -longest, first)
+
+    ranked = sorted(by_url, key=rank)
+    chosen = []
+    per_paragraph = {}
+
+    for group in ([url for url in ranked if url in priority], [url for url in ranked if url not in priority]):
+        cap = 1
+        while group and len(chosen) < num_links:
+            waiting = []
+            for url in group:
+                if len(chosen) >= num_links:
+                    break
+                unused = [m for m in by_url[url] if not any(m['start'] < c['end'] and c['start'] < m['end'] for c in chosen)]
+                free = [m for m in unused if per_paragraph.get(m['paragraph'], 0) < cap]
+                if not free:
+                    # Try again once more links per paragraph are allowed
+                    if unused:
+                        waiting.append(url)
+                    continue
+
+                best = min(free, key=lambda m: (
+                    per_paragraph.get(m['paragraph'], 0),
+                    -min((abs(m['start'] - c['start']) for c in chosen), default=0)
+                ))
+                chosen.append(best)
+                per_paragraph[best['paragraph']] = per_paragraph.get(best['paragraph'], 0) + 1
+            group = waiting
+            cap += 1
+
+    return sorted(({k: v for k, v in m.items() if k != 'paragraph'} for m in chosen), key=lambda m: m['start'])
+
+
+def insert_links(text, selected):
+    """Wrap each selected match in [[anchor|URL]] markup."""
+    parts = []
+    position = 0
+    for match in sorted(selected, key=lambda m: m['start']):
+        parts.append(text[position:match['start']])
+        parts.append(f"[[{match['anchor']}|{match['url']}]]")
+        position = match['end']
+    parts.append(text[position:])
+    return ''.join(parts)
+
+
+def get_anchor_matcher(sitemap_url, pages, synonyms=None):
+    """Return the matcher for a client's sitemap, compiling it only when the page list changes."""
+    if synonyms:
+        return AnchorMatcher(pages, synonyms)
+    return cached_for_sitemap('anchors', sitemap_url, pages, lambda: AnchorMatcher(pages))
+
+
+def link_article_locally(article_text, sitemap_url, pages, num_links, priority_urls=None, synonyms=None, exclude_urls=None):
+    """
+    Add up to num_links links by exact title matching.
+
+    Returns:
+        tuple: (linked_article_text, list of selected matches)
+    """
+    matcher = get_anchor_matcher(sitemap_url, pages, synonyms)
+    selected = select_links(article_text, matcher.find_matches(article_text), num_links, priority_urls, exclude_urls)
+    return insert_links(article_text, selected), selected
@@ -0,0 +1,158 @@
+"""
+Process-wide registry of pooled API clients.
+
+Clients are built once per API key and reused by every call site and Streamlit rerun, so
+HTTP connections (and their TLS handshakes) are kept alive between requests. Pool size
+and timeouts can be tuned with environment variables.
+"""
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+# Max connections kept open per client (per host for requests sessions)
+POOL_SIZE = int(os.environ.get('API_POOL_SIZE', '20'))
+# Seconds to wait for a response before failing
+REQUEST_TIMEOUT = float(os.environ.get('API_REQUEST_TIMEOUT', '600'))
+CONNECT_TIMEOUT = float(os.environ.get('API_CONNECT_TIMEOUT', '10'))
+# Seconds an idle keep-alive connection stays in the pool
+KEEPALIVE_EXPIRY = float(os.environ.get('API_KEEPALIVE_EXPIRY', '60'))
+# Set LLM_FAKE_BACKEND=1 to answer Claude requests locally (see fake_llm.py)
+FAKE_LLM_BACKEND = os.environ.get('LLM_FAKE_BACKEND', '') in ('1', 'true', 'yes')
+# SDK retries for Message Batches calls, which don't go through rate_limiter.RateLimiter
+BATCH_MAX_RETRIES = int(os.environ.get('BATCH_MAX_RETRIES', '5'))
+
+SERPAPI_URL = "https://serpapi.com/search.json"
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def _get_or_create(kind, key, factory):
+    with _lock:
+        if (kind, key) not in _clients:
+            _clients[(kind, key)] = factory()
+        return _clients[(kind, key)]
+
+
+def _httpx_options():
+    import httpx
+    return {
+        'limits': httpx.Limits(
+            max_connections=POOL_SIZE,
+            max_keepalive_connections=POOL_SIZE,
+            keepalive_expiry=KEEPALIVE_EXPIRY
+        ),
+        'timeout': httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT)
+    }
+
+
+def get_anthropic_client(api_key):
+    """Shared Anthropic client with a keep-alive connection pool (a FakeAnthropic when LLM_FAKE_BACKEND is set)."""
+
+    def factory():
+        if FAKE_LLM_BACKEND:
+            from fake_llm import FakeAnthropic
+            return FakeAnthropic()
+        from anthropic import Anthropic, DefaultHttpxClient
+        # Retries are done by rate_limiter.RateLimiter, which backs off for every caller at once
+        return Anthropic(api_key=api_key, max_retries=0, http_client=DefaultHttpxClient(**_httpx_options()))
+
+    return _get_or_create('anthropic', api_key, factory)
+
+
+def get_anthropic_batch_client(api_key):
+    """
+    Shared Anthropic client for the Message Batches API, using the SDK's own retries (a
+    batch_generate.FakeBatchClient when LLM_FAKE_BACKEND is set).
+
+    Batch submit, status and result calls are few and not subject to the per-minute message
+    limits, so they retry transient errors themselves instead of going through the rate limiter.
+    """
+
+    def factory():
+        if FAKE_LLM_BACKEND:
+            from batch_generate import FakeBatchClient
+            return FakeBatchClient()
+        from anthropic import Anthropic, DefaultHttpxClient
+        return Anthropic(api_key=api_key, max_retries=BATCH_MAX_RETRIES, http_client=DefaultHttpxClient(**_httpx_options()))
+
+    return _get_or_create('anthropic_batches', api_key, factory)
+
+
+def get_openai_client(api_key):
+    """Shared OpenAI client with a keep-alive connection pool."""
+
+    def factory():
+        from openai import OpenAI, DefaultHttpxClient
+        return OpenAI(api_key=api_key, http_client=DefaultHttpxClient(**_httpx_options()))
+
+    return _get_or_create('openai', api_key, factory)
+
+
+def get_pinecone_client(api_key):
+    """Shared Pinecone client."""
+
+    def factory():
+        from pinecone import Pinecone
+        return Pinecone(api_key=api_key)
+
+    return _get_or_create('pinecone', api_key, factory)
+
+
+def get_pinecone_index(api_key, index_name):
+    """Shared handle to one Pinecone index (each handle owns its own connection pool)."""
+    return _get_or_create('pinecone_index', (api_key, index_name), lambda: get_pinecone_client(api_key).Index(index_name))
+
+
+def get_firecrawl_client(api_key):
+    """Shared FireCrawl client."""
+
+    def factory():
+        from firecrawl import FirecrawlApp
+        return FirecrawlApp(api_key=api_key, timeout=REQUEST_TIMEOUT)
+
+    return _get_or_create('firecrawl', api_key, factory)
+
+
+def get_exa_client(api_key):
+    """Shared Exa client."""
+
+    def factory():
+        from exa_py import Exa
+        return Exa(api_key=api_key)
+
+    return _get_or_create('exa', api_key, factory)
+
+
+def get_http_session():
+    """Shared requests session for plain HTTP calls (sitemaps, SerpAPI)."""
+
+    def factory():
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    return _get_or_create('http', None, factory)
+
+
+def serpapi_search(params):
+    """
+    Run a SerpAPI Google search over the shared session.
+
+    Equivalent to GoogleSearch(params).get_dict(), which opens a new connection per call.
+
+    Args:
+        params: SerpAPI parameters, including api_key
+
+    Returns:
+        dict: Parsed JSON response
+    """
+    query = {'engine': 'google', 'output': 'json', 'source': 'python'}
+    query.update(params)
+
+    response = get_http_session().get(SERPAPI_URL, params=query, timeout=(CONNECT_TIMEOUT, REQUEST_TIMEOUT))
+    response.raise_for_status()
+    return response.json()
@@ -1,14 +1,28 @@
 import streamlit as st
-from write_article import generate_article
-from add_internal_links import add_internal_links
+from write_article import generate_article, parse_brief, context_token_report, format_context_report
+from linked_docx import linked_docx_bytes, export_linked_zip, DOCX_MIME
+from scraper import scrape_urls
+from scrape_cache import scrape_cache_stats
+from serp import google_search, research_keywords, serp_cache_stats
+from header_clusters import cluster_headers, format_topics
+from batch_generate import submit_article_batch, collect_article_batch
+from jobs import get_job_engine, FINISHED_STATUSES
+from scheduler import llm_slot_stats
+from rate_limiter import rate_limit_stats
+from model_routing import get_route, parse_routes, DEFAULT_ROUTES
+from section_store import get_section_store
+from brief_digest import ensure_client_digests, client_briefs, digest_is_current, BRIEF_KINDS
+from llm import build_cached_prompt, create_message, stream_message, usage_counts, format_usage, response_cache_stats
 import json
-import time
-from pinecone import Pinecone
-from openai import OpenAI
+import uuid
+from api_clients import get_anthropic_client, get_anthropic_batch_client, get_openai_client, get_pinecone_client, get_pinecone_index, get_exa_client
 import math
 
 st.set_page_config(page_title="Article Generator - Multi-Client", page_icon="📝", layout="wide")
 
+# Number of sections written in parallel per article
+SECTION_WORKERS = 5
+
 # Initialize session state
 if 'clients' not in st.session_state:
     st.session_state.clients = {}
@@ -22,6 +36,18 @@ if 'results' not in st.session_state:
     st.session_state.results = {}
 if 'selected_client' not in st.session_state:
     st.session_state.selected_client = None
+if 'article_batches' not in st.session_state:
+    st.session_state.article_batches = []
+# Background jobs started from this session: row id -> job id
+if 'gen_jobs' not in st.session_state:
+    st.session_state.gen_jobs = {}
+if 'link_jobs' not in st.session_state:
+    st.session_state.link_jobs = {}
+# Row data of submitted articles (row id -> data), for resuming failed rows and regenerating sections
+if 'gen_params' not in st.session_state:
+    st.session_state.gen_params = {}
+if 'session_user' not in st.session_state:
+    st.session_state.session_user = f"session-{uuid.uuid4().hex[:8]}"
 
 # Get API key from secrets (no user input needed)
 try:
@@ -30,6 +56,157 @@ except:
     st.error("API key not configured. Contact administrator.")
     st.stop()
 
+# Response cache statistics (counters are for this server process)
+cache_stats = response_cache_stats()
+with st.sidebar.expander("🗃️ LLM Response Cache"):
+    st.write(f"Hits: {cache_stats['hits']} | Misses: {cache_stats['misses']} ({cache_stats['hit_rate']:.0%} hit rate)")
+    st.write(f"Tokens saved: {cache_stats['saved_input_tokens']:,} input, {cache_stats['saved_output_tokens']:,} output")
+    st.caption(f"{cache_stats['entries']} cached responses, {cache_stats['bytes'] / 1024 / 1024:.1f} MB")
+
+section_store = get_section_store()
+if section_store:
+    checkpoint_stats = section_store.stats()
+    with st.sidebar.expander("💾 Section Checkpoints"):
+        st.write(f"Restored: {checkpoint_stats['restored']} | Stored: {checkpoint_stats['stored']}")
+        st.caption(f"{checkpoint_stats['sections']} sections of {checkpoint_stats['briefs']} briefs")
+
+scrape_stats = scrape_cache_stats()
+with st.sidebar.expander("🕸️ Scrape Cache"):
+    st.write(f"Hits: {scrape_stats['hits']} | Misses: {scrape_stats['misses']} ({scrape_stats['hit_rate']:.0%} hit rate)")
+    st.write(f"Re-scraped pages: {scrape_stats['changed']} changed, {scrape_stats['unchanged']} unchanged")
+    st.caption(f"{scrape_stats['entries']} cached pages, {scrape_stats['bytes'] / 1024 / 1024:.1f} MB")
+
+limit_stats = rate_limit_stats()
+with st.sidebar.expander("⏱️ Claude Rate Limits"):
+    st.write(f"Requests: {limit_stats['requests']} | Throttled: {limit_stats['throttled']} | Retries: {limit_stats['retries']} | Failed: {limit_stats['failed']}")
+    st.write(f"Time throttled: {limit_stats['backoff_seconds']:.0f}s backing off, {limit_stats['bucket_wait_seconds']:.0f}s waiting for rate budget")
+    st.caption(
+        f"Concurrency limit {limit_stats['concurrency_limit']} "
+        f"({limit_stats['concurrency_decreases']} decreases, {limit_stats['concurrency_increases']} increases)"
+    )
+
+serp_stats = serp_cache_stats()
+with st.sidebar.expander("🔎 SERP Cache"):
+    st.write(f"Hits: {serp_stats['hits']} | Misses: {serp_stats['misses']} ({serp_stats['hit_rate']:.0%} hit rate)")
+    st.caption(f"{serp_stats['entries']} cached searches")
+
+# Generation and linking run on the background job engine, shared by every session of this server
+job_engine = get_job_engine(api_key)
+
+# Job capacity is shared fairly between users, then between each user's clients
+job_user = st.sidebar.text_input(
+    "Your name",
+    key="job_user_name",
+    help="Background jobs are shared fairly between writers; jobs without a name count per browser session."
+).strip() or st.session_state.session_user
+
+with st.sidebar.expander("🧵 Background Jobs"):
+    job_metrics = job_engine.store.metrics()
+    for priority in ('interactive', 'bulk'):
+        wait = job_metrics['wait'].get(priority)
+        wait_text = f", wait median {wait['median']:.0f}s / max {wait['max']:.0f}s (last hour)" if wait else ""
+        st.write(f"{priority.title()}: {job_metrics['running'].get(priority, 0)} running, {job_metrics['queued'].get(priority, 0)} queued{wait_text}")
+    if job_metrics['queued_by_user']:
+        st.caption("Queued by user: " + ", ".join(f"{user}: {count}" for user, count in job_metrics['queued_by_user'].items()))
+        st.caption("Queued by client: " + ", ".join(f"{client}: {count}" for client, count in job_metrics['queued_by_client'].items()))
+        st.caption(f"Oldest queued job waiting {job_metrics['oldest_wait']:.0f}s")
+    slot_stats = llm_slot_stats()
+    st.caption(
+        f"Claude requests: {slot_stats['in_use']}/{slot_stats['limit']} in flight, "
+        f"{slot_stats['waiting']['interactive']} interactive and {slot_stats['waiting']['bulk']} bulk waiting"
+    )
+    lookup_id = st.number_input("Job ID", min_value=0, step=1, key="job_lookup_id")
+    if lookup_id:
+        lookup_job = job_engine.get(int(lookup_id))
+        if lookup_job is None:
+            st.caption("No job with that ID")
+        else:
+            st.write(f"**{lookup_job['label'] or lookup_job['kind']}**: {lookup_job['status']}")
+            if lookup_job['status'] == 'complete' and lookup_job['kind'] == 'generate':
+                st.download_button(
+                    "📄 Download Article",
+                    data=lookup_job['result']['article'],
+                    file_name=f"job_{lookup_job['id']}.md",
+                    mime="text/markdown",
+                    key="job_lookup_download"
+                )
+            elif lookup_job['status'] == 'complete' and lookup_job['kind'] == 'link':
+                st.download_button(
+                    "📄 Download",
+                    data=lambda text=lookup_job['result']['linked_text']: linked_docx_bytes(text),
+                    file_name=lookup_job['result']['file_name'],
+                    mime=DOCX_MIME,
+                    key="job_lookup_download"
+                )
+            elif lookup_job['status'] == 'error':
+                st.caption(lookup_job['error'])
+            elif lookup_job['progress']:
+                st.caption(lookup_job['progress'][:200])
+
+
+def collect_finished_jobs(jobs_key, results_key):
+    """
+    Move finished background jobs of this session into its results.
+
+    Returns:
+        dict: row id -> job dict for the jobs still queued or running
+    """
+    session_jobs = st.session_state[jobs_key]
+    active = {}
+    for row_id, job in [(row_id, job_engine.get(job_id)) for row_id, job_id in list(session_jobs.items())]:
+        if job is None or job['status'] in FINISHED_STATUSES:
+            del session_jobs[row_id]
+            if job and job['status'] == 'complete':
+                st.session_state[results_key][row_id] = job['result']
+            elif job and job['status'] == 'error':
+                st.session_state[results_key][row_id] = {'status': 'error', 'error': job['error']}
+        else:
+            active[row_id] = job
+    return active
+
+
+def prompt_briefs(client_data):
+    """
+    Company and ICP brief text for prompts: the client's digests if it uses them (rebuilt
+    first if a brief changed), otherwise the full briefs. If a digest can't be built the
+    full brief is used for it and a warning is shown.
+    
+    Returns:
+        tuple: (company_brief_text, icp_brief_text)
+    """
+    if client_data.get('use_digests'):
+        try:
+            with st.spinner("Updating brief digests..."):
+                ensure_client_digests(client_data, api_key)
+        except Exception as e:
+            # A toast, because most callers rerun the page right after
+            st.toast(f"Couldn't update the brief digests, using the full briefs: {str(e)}", icon="⚠️")
+    return client_briefs(client_data)
+
+
+@st.fragment(run_every=2)
+def show_job_progress(jobs_key, title):
+    """Live progress of this session's jobs; reruns the page once one of them finishes."""
+    session_jobs = st.session_state[jobs_key]
+    if not session_jobs:
+        return
+    jobs = job_engine.store.get_many(session_jobs.values())
+    if any(job['status'] in FINISHED_STATUSES for job in jobs.values()) or len(jobs) < len(session_jobs):
+        st.rerun()
+    
+    st.markdown("---")
+    st.subheader(title)
+    for row_id, job_id in session_jobs.items():
+        job = jobs[job_id]
+        if job['status'] == 'running':
+            # Streamed section text follows the status line
+            status, _, preview = job['progress'].partition('\n\n')
+            st.progress(job['progress_pct'] or 0.0, text=f"Row {row_id + 1} (job {job_id}): {status[:150] or 'Starting...'}")
+            if preview:
+                st.markdown(preview)
+        else:
+            st.caption(f"Row {row_id + 1} (job {job_id}): queued")
+
 # Main tabs
 tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8 = st.tabs(["📁 Manage Clients","🔍 Content Briefs", "📝 Generate Articles", "🔗 Add Internal Links", "🔎 Research", "🔄 Content Refresh","🗄️ DB Research","✏️ AI Editor"])
 
@@ -81,6 +258,76 @@ with tab1:
                     st.rerun()
         else:
             st.info("No clients yet. Create one to get started.")
+    
+    if st.session_state.clients:
+        with st.expander("🧭 Model Routing"):
+            st.caption("Override the model, max_tokens or timeout per pipeline step for one client. Steps left out use the defaults below.")
+            routes_client = st.selectbox(
+                "Client",
+                options=list(st.session_state.clients.keys()),
+                key="routes_client_select"
+            )
+            st.json(DEFAULT_ROUTES, expanded=False)
+            current_routes = st.session_state.clients[routes_client].get('model_routes', {})
+            routes_text = st.text_area(
+                "Overrides (JSON)",
+                value=json.dumps(current_routes, indent=2) if current_routes else "",
+                placeholder='{"section": {"model": "claude-opus-4-1-20250805", "max_tokens": 6000}}',
+                height=150,
+                key=f"routes_text_{routes_client}"
+            )
+            if st.button("💾 Save Routes", key="save_routes"):
+                try:
+                    st.session_state.clients[routes_client]['model_routes'] = parse_routes(routes_text)
+                    st.success(f"✅ Model routes saved for '{routes_client}'")
+                except Exception as e:
+                    st.error(str(e))
+        
+        with st.expander("📚 Brief Digests"):
+            st.caption("Condense long company and ICP briefs once and use the digests in prompts instead of the full text. A digest is rebuilt only when its brief changes.")
+            digest_client = st.selectbox(
+                "Client",
+                options=list(st.session_state.clients.keys()),
+                key="digest_client_select"
+            )
+            digest_client_data = st.session_state.clients[digest_client]
+            digest_client_data['use_digests'] = st.checkbox(
+                "Use digests in prompts",
+                value=digest_client_data.get('use_digests', False),
+                key=f"use_digests_{digest_client}"
+            )
+            
+            col_a, col_b = st.columns(2)
+            replacement_briefs = {
+                'company_brief': col_a.file_uploader("Replace Company Brief", type=['txt'], key=f"replace_company_{digest_client}"),
+                'icp_brief': col_b.file_uploader("Replace ICP Brief", type=['txt'], key=f"replace_icp_{digest_client}")
+            }
+            if any(replacement_briefs.values()) and st.button("📤 Update Briefs", key="update_briefs"):
+                for kind, upload in replacement_briefs.items():
+                    if upload:
+                        digest_client_data[kind] = upload.getvalue().decode('utf-8')
+                st.success("✅ Briefs updated")
+            
+            for kind, label in BRIEF_KINDS.items():
+                digest = digest_client_data.get('digests', {}).get(kind)
+                if digest_is_current(digest, digest_client_data[kind]):
+                    st.markdown(f"**{label[0].upper() + label[1:]}:** digest r{digest['revision']}, {len(digest_client_data[kind]):,} → {len(digest['text']):,} characters ({digest['model']})")
+                    st.text_area(label, value=digest['text'], height=150, disabled=True, key=f"digest_{kind}_{digest_client}_{digest['revision']}", label_visibility="collapsed")
+                elif digest:
+                    st.markdown(f"**{label[0].upper() + label[1:]}:** ⚠️ digest out of date (brief changed)")
+                else:
+                    st.markdown(f"**{label[0].upper() + label[1:]}:** no digest yet")
+            
+            if st.button("🔄 Build Digests", key="build_digests"):
+                try:
+                    with st.spinner("Digesting briefs..."):
+                        rebuilt = ensure_client_digests(digest_client_data, api_key, progress_callback=st.write)
+                    if not rebuilt:
+                        st.info("Digests are already up to date")
+                    else:
+                        st.rerun()
+                except Exception as e:
+                    st.error(f"Error: {str(e)}")
 
 # TAB 3: GENERATE ARTICLES
 with tab3:
@@ -100,8 +347,56 @@ with tab3:
     st.session_state.selected_client = selected_client
     
     st.markdown(f"**Active Client:** {selected_client}")
+    batch_mode = st.checkbox(
+        "📦 Batch mode",
+        key="batch_mode",
+        help="Queue articles, then submit them together as one Message Batch. About half the cost; results can take up to 24 hours."
+    )
+    context_mode = st.radio(
+        "Section context",
+        options=["full", "window"],
+        format_func=lambda mode: "Full brief" if mode == "full" else "Outline window",
+        horizontal=True,
+        key="context_mode",
+        help="Full brief repeats the whole brief in every section prompt. Outline window sends a titles-only outline plus each section's parent and neighbouring guidelines, which keeps long briefs cheap."
+    )
+    
+    with st.expander("📏 Compare context modes"):
+        compare_brief = st.file_uploader("Article Brief", type=['md', 'txt'], key="compare_brief")
+        if compare_brief:
+            client_data = st.session_state.clients[selected_client]
+            company_text, icp_text = client_briefs(client_data)
+            report = context_token_report(
+                compare_brief.getvalue().decode('utf-8'),
+                company_text,
+                icp_text,
+                client_data['guidelines']
+            )
+            st.table({
+                "Mode": list(report.keys()),
+                "Input tokens sent": [stats['input_tokens'] for stats in report.values()],
+                "With prompt caching": [stats['cached_equivalent'] for stats in report.values()],
+                "Shared context": [stats['shared_tokens'] for stats in report.values()],
+                "Largest request": [stats['largest_request'] for stats in report.values()]
+            })
+            st.caption(format_context_report(report).split('\n')[-1] + " (estimates, ~4 characters per token)")
     st.markdown("---")
     
+    # Rows waiting on a submitted batch
+    batched_rows = {int(job_id) for batch in st.session_state.article_batches for job_id in batch['manifest']['jobs']}
+    
+    # Rows queued outside batch mode become background jobs
+    if st.session_state.queue and not batch_mode:
+        for row_id in st.session_state.queue:
+            data = st.session_state.pop(f'data_{row_id}')
+            st.session_state.gen_jobs[row_id] = job_engine.submit(
+                'generate', data, label=data['title'] or f"Row {row_id + 1}", user=job_user, client=selected_client
+            )
+        st.session_state.queue = []
+    
+    active_gen_jobs = collect_finished_jobs('gen_jobs', 'results')
+    gen_positions = job_engine.store.queue_positions('generate')
+    
     # Add row button
     col1, col2 = st.columns([6, 1])
     with col2:
@@ -148,13 +443,26 @@ with tab3:
                     st.success("✅ Done")
                 elif result['status'] == 'error':
                     st.error("❌ Error")
-            # Check if in queue
-            elif row_id in st.session_state.queue:
-                queue_pos = st.session_state.queue.index(row_id) + 1
-                if queue_pos == 1:
+                    # Finished sections are checkpointed, so a rerun only writes the missing ones
+                    if row_id in st.session_state.gen_params and st.button("🔁 Resume", key=f"resume_{row_id}", use_container_width=True):
+                        data = st.session_state.gen_params[row_id]
+                        del st.session_state.results[row_id]
+                        st.session_state.gen_jobs[row_id] = job_engine.submit(
+                            'generate', data, label=data['title'] or f"Row {row_id + 1}", user=job_user, client=selected_client
+                        )
+                        st.rerun()
+            elif row_id in batched_rows:
+                st.info("📦 Batched")
+            # Check if a background job is working on it
+            elif row_id in active_gen_jobs:
+                job = active_gen_jobs[row_id]
+                if job['status'] == 'running':
                     st.info("⏳ Running")
                 else:
-                    st.warning(f"Queue #{queue_pos}")
+                    st.warning(f"Queue #{gen_positions.get(job['id'], 1)}")
+            # Check if waiting for a batch submit
+            elif row_id in st.session_state.queue:
+                st.warning(f"Batch #{st.session_state.queue.index(row_id) + 1}")
             # Show generate button
             else:
                 files_ready = article_brief and selected_client
@@ -164,17 +472,26 @@ with tab3:
                     disabled=not files_ready,
                     use_container_width=True
                 ):
-                    # Add to queue
-                    st.session_state.queue.append(row_id)
-                    # Store file data in session state
                     client_data = st.session_state.clients[selected_client]
-                    st.session_state[f'data_{row_id}'] = {
+                    company_text, icp_text = prompt_briefs(client_data)
+                    data = {
                         'title': title,
                         'article_brief': article_brief.read().decode('utf-8'),
-                        'company_brief': client_data['company_brief'],
-                        'icp_brief': client_data['icp_brief'],
-                        'guidelines': client_data['guidelines']
+                        'company_brief': company_text,
+                        'icp_brief': icp_text,
+                        'guidelines': client_data['guidelines'],
+                        'model_routes': client_data.get('model_routes', {}),
+                        'context_mode': context_mode
                     }
+                    st.session_state.gen_params[row_id] = data
+                    if batch_mode:
+                        # Held in the session until the batch is submitted
+                        st.session_state.queue.append(row_id)
+                        st.session_state[f'data_{row_id}'] = data
+                    else:
+                        st.session_state.gen_jobs[row_id] = job_engine.submit(
+                            'generate', data, label=title or f"Row {row_id + 1}", user=job_user, client=selected_client
+                        )
                     st.rerun()
         
         # Status/Download column
@@ -198,79 +515,84 @@ with tab3:
                         key=f"download_log_{row_id}",
                         use_container_width=True
                     )
+                    if row_id in st.session_state.gen_params:
+                        data = st.session_state.gen_params[row_id]
+                        with st.popover("♻️ Regenerate Section", use_container_width=True):
+                            brief_sections = parse_brief(data['article_brief'])
+                            section_index = st.selectbox(
+                                "Section",
+                                options=range(len(brief_sections)),
+                                format_func=lambda i: f"{brief_sections[i]['level']}: {brief_sections[i]['title']}",
+                                key=f"regen_section_{row_id}"
+                            )
+                            if st.button("♻️ Regenerate", key=f"regen_{row_id}", disabled=not brief_sections):
+                                # The other sections are restored from their checkpoints
+                                del st.session_state.results[row_id]
+                                st.session_state.gen_jobs[row_id] = job_engine.submit(
+                                    'generate', {**data, 'regenerate': [section_index]},
+                                    label=f"{data['title'] or f'Row {row_id + 1}'} (section {section_index + 1})",
+                                    user=job_user, client=selected_client, priority='interactive'
+                                )
+                                st.rerun()
                 elif result['status'] == 'error':
                     st.caption(result['error'][:50] + "...")
+            elif row_id in active_gen_jobs:
+                st.caption(f"Job {active_gen_jobs[row_id]['id']}")
     
-    # Process queue
-    if st.session_state.queue:
-        current_row_id = st.session_state.queue[0]
-        
+    # Submit queue as one batch
+    if st.session_state.queue and batch_mode:
         st.markdown("---")
-        st.subheader(f"🔄 Generating Article (Row {current_row_id + 1})")
-        
-        # Get stored data
-        data = st.session_state[f'data_{current_row_id}']
-        
-        # Progress tracking
-        progress_bar = st.progress(0)
-        status_text = st.empty()
+        if st.button(f"📦 Submit {len(st.session_state.queue)} queued article(s) as batch", type="primary"):
+            try:
+                jobs = {row_id: st.session_state[f'data_{row_id}'] for row_id in st.session_state.queue}
+                batch_id, manifest = submit_article_batch(jobs, get_anthropic_batch_client(api_key))
+                st.session_state.article_batches.append({'id': batch_id, 'manifest': manifest})
+                for row_id in jobs:
+                    del st.session_state[f'data_{row_id}']
+                st.session_state.queue = []
+                st.rerun()
+            except Exception as e:
+                st.error(f"❌ Error submitting batch: {str(e)}")
+    
+    # Check submitted batches
+    if st.session_state.article_batches:
+        batch_client = get_anthropic_batch_client(api_key)
         
-        def update_progress(text, pct=None):
-            status_text.text(text)
-            if pct is not None:
-                progress_bar.progress(pct)
+        st.markdown("---")
+        st.subheader("📦 Submitted Batches")
+        for batch_info in list(st.session_state.article_batches):
+            try:
+                batch = batch_client.messages.batches.retrieve(batch_info['id'])
+                total = len(batch_info['manifest']['requests'])
+                done = total - batch.request_counts.processing
+                st.progress(done / total, text=f"{batch_info['id']}: {done}/{total} sections finished")
+                
+                if batch.processing_status == 'ended':
+                    for job_id, result in collect_article_batch(batch_client, batch_info['id'], batch_info['manifest']).items():
+                        st.session_state.results[int(job_id)] = result
+                    st.session_state.article_batches.remove(batch_info)
+                    st.rerun()
+            except Exception as e:
+                st.error(f"❌ Error checking batch {batch_info['id']}: {str(e)}")
         
-        # Generate article
-        try:
-            final_article, log = generate_article(
-                data['article_brief'],
-                data['company_brief'],
-                data['icp_brief'],
-                data['guidelines'],
-                api_key,
-                progress_callback=update_progress
-            )
-            
-            # Store result
-            st.session_state.results[current_row_id] = {
-                'status': 'complete',
-                'article': final_article,
-                'log': log
-            }
-            
-            # Remove from queue
-            st.session_state.queue.pop(0)
-            
-            # Clean up data
-            del st.session_state[f'data_{current_row_id}']
-            
-            st.success(f"✅ Article {current_row_id + 1} complete!")
-            time.sleep(1)
-            st.rerun()
-            
-        except Exception as e:
-            # Store error
-            st.session_state.results[current_row_id] = {
-                'status': 'error',
-                'error': str(e)
-            }
-            
-            # Remove from queue
-            st.session_state.queue.pop(0)
-            
-            st.error(f"❌ Error: {str(e)}")
-            time.sleep(2)
+        if st.button("🔄 Check Batch Status"):
             st.rerun()
     
+    # Progress of running generation jobs
+    if st.session_state.gen_jobs:
+        show_job_progress('gen_jobs', "🔄 Generating Articles")
+    
     # Show queue status in sidebar
-    if st.session_state.queue:
+    if st.session_state.queue or active_gen_jobs:
         st.sidebar.markdown("---")
         st.sidebar.subheader("📋 Generation Queue")
-        for idx, row_id in enumerate(st.session_state.queue, 1):
-            if idx == 1:
+        for row_id, job in active_gen_jobs.items():
+            if job['status'] == 'running':
                 st.sidebar.write(f"🔄 Row {row_id + 1} - Generating...")
             else:
                 st.sidebar.write(f"⏳ Row {row_id + 1} - Queued")
+        for row_id in st.session_state.queue:
+            st.sidebar.write(f"📦 Row {row_id + 1} - Waiting for batch submit")
 
 # TAB 4: ADD INTERNAL LINKS
 with tab4:
@@ -295,6 +617,14 @@ with tab4:
     
     st.markdown(f"**Active Client:** {link_client}")
     st.markdown(f"**Sitemap:** {client_data['sitemap_url']}")
+    link_mode = st.radio(
+        "Linking mode",
+        options=['llm', 'hybrid', 'fast'],
+        format_func=lambda mode: {'llm': "🤖 Claude", 'hybrid': "⚡ Hybrid", 'fast': "🚀 Fast (no API call)"}[mode],
+        key="link_mode",
+        horizontal=True,
+        help="Fast links exact mentions of page titles locally. Hybrid does that first and lets Claude place any remaining links."
+    )
     st.markdown("---")
     
     # Initialize linking session state
@@ -302,11 +632,12 @@ with tab4:
         st.session_state.link_rows = [{'id': 0}]
     if 'next_link_id' not in st.session_state:
         st.session_state.next_link_id = 1
-    if 'link_queue' not in st.session_state:
-        st.session_state.link_queue = []
     if 'link_results' not in st.session_state:
         st.session_state.link_results = {}
     
+    active_link_jobs = collect_finished_jobs('link_jobs', 'link_results')
+    link_positions = job_engine.store.queue_positions('link')
+    
     # Add row button
     col1, col2 = st.columns([6, 1])
     with col2:
@@ -374,13 +705,13 @@ with tab4:
                     st.success("✅ Done")
                 elif result['status'] == 'error':
                     st.error("❌ Error")
-            # Check if in queue
-            elif row_id in st.session_state.link_queue:
-                queue_pos = st.session_state.link_queue.index(row_id) + 1
-                if queue_pos == 1:
+            # Check if a background job is working on it
+            elif row_id in active_link_jobs:
+                job = active_link_jobs[row_id]
+                if job['status'] == 'running':
                     st.info("⏳ Running")
                 else:
-                    st.warning(f"Queue #{queue_pos}")
+                    st.warning(f"Queue #{link_positions.get(job['id'], 1)}")
             # Show add links button
             else:
                 files_ready = article_file and link_client
@@ -390,17 +721,16 @@ with tab4:
                     disabled=not files_ready,
                     use_container_width=True
                 ):
-                    # Add to queue
-                    st.session_state.link_queue.append(row_id)
-                    # Store data
                     article_text = article_file.read().decode('utf-8')
-                    st.session_state[f'link_data_{row_id}'] = {
-                        'title': title,
+                    st.session_state.link_jobs[row_id] = job_engine.submit('link', {
                         'article_text': article_text,
                         'num_links': num_links,
                         'priority_urls': priority_urls,
-                        'sitemap_url': client_data['sitemap_url']
-                    }
+                        'sitemap_url': client_data['sitemap_url'],
+                        'mode': link_mode,
+                        'model_routes': client_data.get('model_routes', {}),
+                        'file_name': f"{title or 'article'}_linked_{row_id}.docx"
+                    }, label=title or f"Link row {row_id + 1}", user=job_user, client=link_client)
                     st.rerun()
         
         # Status/Download column
@@ -408,86 +738,41 @@ with tab4:
             if row_id in st.session_state.link_results:
                 result = st.session_state.link_results[row_id]
                 if result['status'] == 'complete':
+                    # Rendered only when clicked; session state keeps just the linked text
                     st.download_button(
                         "📄 Download",
-                        data=result['doc_bytes'],
-                        file_name=f"{title or 'article'}_linked_{row_id}.docx",
-                        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                        data=lambda text=result['linked_text']: linked_docx_bytes(text),
+                        file_name=result['file_name'],
+                        mime=DOCX_MIME,
                         key=f"link_download_{row_id}",
                         use_container_width=True
                     )
                 elif result['status'] == 'error':
                     st.caption(result['error'][:50] + "...")
+            elif row_id in active_link_jobs:
+                st.caption(f"Job {active_link_jobs[row_id]['id']}")
     
-    # Process queue
-    if st.session_state.link_queue:
-        current_row_id = st.session_state.link_queue[0]
-        
-        st.markdown("---")
-        st.subheader(f"🔗 Adding Links (Row {current_row_id + 1})")
-        
-        # Get stored data
-        data = st.session_state[f'link_data_{current_row_id}']
-        
-        # Progress tracking
-        status_text = st.empty()
-        
-        def update_progress(text):
-            status_text.text(text)
-        
-        # Add links
-        try:
-            doc = add_internal_links(
-                article_text=data['article_text'],
-                sitemap_url=data['sitemap_url'],
-                num_links=data['num_links'],
-                priority_urls=data['priority_urls'],
-                api_key=api_key,
-                progress_callback=update_progress
-            )
-            
-            # Save to bytes
-            from io import BytesIO
-            doc_bytes = BytesIO()
-            doc.save(doc_bytes)
-            doc_bytes.seek(0)
-            
-            # Store result
-            st.session_state.link_results[current_row_id] = {
-                'status': 'complete',
-                'doc_bytes': doc_bytes.getvalue()
-            }
-            
-            # Remove from queue
-            st.session_state.link_queue.pop(0)
-            
-            # Clean up data
-            del st.session_state[f'link_data_{current_row_id}']
-            
-            st.success(f"✅ Links added to article {current_row_id + 1}!")
-            time.sleep(1)
-            st.rerun()
-            
-        except Exception as e:
-            # Store error
-            st.session_state.link_results[current_row_id] = {
-                'status': 'error',
-                'error': str(e)
-            }
-            
-            # Remove from queue
-            st.session_state.link_queue.pop(0)
-            
-            st.error(f"❌ Error: {str(e)}")
-            time.sleep(2)
-            st.rerun()
+    # Bulk export: documents are rendered one at a time straight into the ZIP on click
+    completed_links = [result for result in st.session_state.link_results.values() if result['status'] == 'complete']
+    if len(completed_links) > 1:
+        st.download_button(
+            f"📦 Download all ({len(completed_links)}) as ZIP",
+            data=lambda: export_linked_zip([(result['file_name'], result['linked_text']) for result in completed_links]).read(),
+            file_name=f"{link_client}_linked_articles.zip",
+            mime="application/zip",
+            key="link_download_all"
+        )
+    
+    # Progress of running linking jobs
+    if st.session_state.link_jobs:
+        show_job_progress('link_jobs', "🔗 Adding Links")
     
     # Show queue status in sidebar
-    if st.session_state.link_queue:
+    if active_link_jobs:
         st.sidebar.markdown("---")
         st.sidebar.subheader("🔗 Linking Queue")
-        for idx, row_id in enumerate(st.session_state.link_queue, 1):
-            if idx == 1:
+        for row_id, job in active_link_jobs.items():
+            if job['status'] == 'running':
                 st.sidebar.write(f"🔄 Row {row_id + 1} - Adding links...")
             else:
                 st.sidebar.write(f"⏳ Row {row_id + 1} - Queued")
@@ -529,15 +814,31 @@ with tab2:
     # SECTION 1: RESEARCH TOPIC
     st.subheader("Step 1: Research Topic")
     
+    # Batch prefetch: search and scrape many keywords up front so each later research run hits the caches
+    with st.expander("📥 Prefetch keywords"):
+        prefetch_keywords = st.text_area("Keywords (one per line)", key="prefetch_keywords", height=120)
+        if st.button("Prefetch", disabled=not prefetch_keywords.strip()):
+            prefetch_status = st.empty()
+            prefetched = research_keywords(
+                prefetch_keywords.splitlines(),
+                serpapi_key,
+                firecrawl_key,
+                num=10,
+                progress_callback=prefetch_status.text
+            )
+            for prefetch_keyword, prefetch_result in prefetched.items():
+                if prefetch_result['error']:
+                    st.warning(f"{prefetch_keyword}: {prefetch_result['error']}")
+                else:
+                    scraped = sum(1 for page in prefetch_result['pages'] if not page['error'])
+                    st.write(f"✓ {prefetch_keyword}: {scraped}/{len(prefetch_result['urls'])} pages, {len(prefetch_result['people_also_ask'])} PAA questions")
+    
     keyword = st.text_input("Enter keyword/topic", placeholder="e.g., payment automation for B2B")
     
     if st.button("🔍 Research Topic", disabled=not keyword):
         with st.spinner("Researching topic..."):
             try:
-                from serpapi import GoogleSearch
-                from firecrawl import FirecrawlApp
                 import re
-                from anthropic import Anthropic
                 
                 # Step 1: Search Google
                 st.info("Searching Google for top results...")
@@ -547,8 +848,7 @@ with tab2:
                     "api_key": serpapi_key
                 }
                 
-                search = GoogleSearch(params)
-                results = search.get_dict()
+                results = google_search(params)
                 
                 urls = [r['link'] for r in results.get('organic_results', [])][:10]
                 people_also_ask = [q.get('question', '') for q in results.get('related_questions', [])]
@@ -557,40 +857,20 @@ with tab2:
                 
                 # Step 2: Scrape each URL and extract headers
                 st.info("Scraping articles and extracting headers...")
-                firecrawl = FirecrawlApp(api_key=firecrawl_key)
-                
+                scrape_status = st.empty()
                 all_headers = []
+                pages_headers = []
                 scrape_errors = []
+                page_words = []
                 
-                for idx, url in enumerate(urls, 1):
-                    try:
-                        st.text(f"Scraping {idx}/{len(urls)}: {url[:50]}...")
-                        result = firecrawl.scrape(url)
-                        markdown = result.markdown if hasattr(result, 'markdown') else ''
-                        
-                        if not markdown:
-                            scrape_errors.append(f"{url}: No markdown content returned")
-                            st.warning(f"No content from {url[:50]}")
-                            continue
-                        
-                        # Debug: show first 200 chars of markdown
-                        st.text(f"Got {len(markdown)} chars. Preview: {markdown[:200]}")
-                
-                                
-                        # Extract H2 and H3 headers
-                        lines = markdown.split('\n')
-                        for line in lines:
-                            line = line.strip()
-                            if line.startswith('## ') and not line.startswith('### '):
-                                h2_title = line.replace('## ', '').strip()
-                                all_headers.append(f"## {h2_title}")
-                            elif line.startswith('### '):
-                                h3_title = line.replace('### ', '').strip()
-                                all_headers.append(f"### {h3_title}")
-                        
-                    except Exception as e:
-                        st.warning(f"Failed to scrape {url}: {str(e)}")
+                for page in scrape_urls(urls, firecrawl_key, progress_callback=scrape_status.text):
+                    if page['error']:
+                        scrape_errors.append(f"{page['url']}: {page['error']}")
                         continue
+                    
+                    all_headers.extend(page['headers'])
+                    pages_headers.append(page['headers'])
+                    page_words.append(page['outline']['words'])
                 
                 if scrape_errors:
                     st.warning(f"Failed to scrape {len(scrape_errors)} URLs:")
@@ -601,26 +881,29 @@ with tab2:
                     st.error("No headers extracted from any articles. FireCrawl may be failing or articles have no H2/H3 headers.")
                     st.stop()
                 
-                st.success(f"Extracted {len(all_headers)} total headers from {len(urls)} articles")                
+                st.success(f"Extracted {len(all_headers)} total headers from {len(urls)} articles (median length {sorted(page_words)[len(page_words) // 2]:,} words)")                
                 
                 # Step 3: Deduplicate with Claude
                 st.info("Deduplicating headers with AI...")
-                client = Anthropic(api_key=api_key)
+                client = get_anthropic_client(api_key)
                 
-                headers_text = '\n'.join(all_headers)
+                # Group duplicate and near-duplicate headers locally so Claude sees one line per topic
+                topics = cluster_headers(pages_headers)
+                headers_text = format_topics(topics, len(pages_headers))
+                st.text(f"Grouped {len(all_headers)} headers into {len(topics)} topics")
                 paa_text = '\n'.join([f"- {q}" for q in people_also_ask])
                 
                 dedup_prompt = f"""You are analyzing article headers from competitor content.
 
-ALL HEADERS FOUND:
+HEADER TOPICS FOUND (duplicates already merged; each line shows how many of the {len(pages_headers)} competitor pages cover the topic and other wordings seen):
 {headers_text}
 
 PEOPLE ALSO ASK QUESTIONS:
 {paa_text}
 
 Task:
-1. Deduplicate similar/identical headers (merge synonyms and similar concepts)
-2. Remove exact duplicates
+1. Merge any remaining topics that are synonyms or similar concepts
+2. Favor topics covered by more competitor pages
 3. Create a unique, consolidated list
 4. Include relevant PAA questions as potential sections
 5. Organize logically with H2s and H3s
@@ -629,9 +912,9 @@ Return ONLY the unique list of headers in markdown format (using ## for H2 and #
 
 Unique headers:"""
                 
-                message = client.messages.create(
-                    model="claude-sonnet-4-20250514",
-                    max_tokens=4000,
+                message = create_message(
+                    client,
+                    **get_route('brief_dedup', research_client_data.get('model_routes')),
                     messages=[{"role": "user", "content": dedup_prompt}]
                 )
                 
@@ -675,20 +958,21 @@ Unique headers:"""
     if st.button("📝 Generate Brief Structure", disabled=not structure_input):
         with st.spinner("Refining structure for ICP/company fit..."):
             try:
-                from anthropic import Anthropic
-                client = Anthropic(api_key=api_key)
+                client = get_anthropic_client(api_key)
+                
+                # Client briefs lead the prompt so the refine and guidelines steps share a cached prefix
+                company_text, icp_text = prompt_briefs(research_client_data)
+                client_context = f"""TARGET AUDIENCE:
+{icp_text}
+
+COMPANY CONTEXT:
+{company_text}"""
                 
                 refine_prompt = f"""You are refining an article outline for a specific audience and company.
 
 CURRENT HEADERS:
 {structure_input}
 
-TARGET AUDIENCE:
-{research_client_data['icp_brief']}
-
-COMPANY CONTEXT:
-{research_client_data['company_brief']}
-
 Task:
 1. Evaluate each section for relevance to the ICP
 2. Rewrite headers to use ICP-specific language and pain points
@@ -701,10 +985,10 @@ Return ONLY the refined outline in markdown format (## for H2, ### for H3). No e
 
 Refined outline:"""
                 
-                message = client.messages.create(
-                    model="claude-sonnet-4-20250514",
-                    max_tokens=4000,
-                    messages=[{"role": "user", "content": refine_prompt}]
+                message = create_message(
+                    client,
+                    **get_route('brief_structure', research_client_data.get('model_routes')),
+                    messages=[{"role": "user", "content": build_cached_prompt([client_context], refine_prompt)}]
                 )
                 
                 brief_structure = message.content[0].text.strip()
@@ -749,20 +1033,20 @@ Refined outline:"""
     if st.button("✍️ Generate Writing Guidelines", disabled=not final_structure or not guidelines_keyword):
         with st.spinner("Generating writing guidelines..."):
             try:
-                from anthropic import Anthropic
-                client = Anthropic(api_key=api_key)
+                client = get_anthropic_client(api_key)
+                
+                company_text, icp_text = prompt_briefs(research_client_data)
+                client_context = f"""TARGET AUDIENCE:
+{icp_text}
+
+COMPANY CONTEXT:
+{company_text}"""
                 
                 guidelines_prompt = f"""Generate concise writing guidelines for each section of this outline.
 
 OUTLINE:
 {final_structure}
 
-ICP CONTEXT:
-{research_client_data['icp_brief']}
-
-COMPANY CONTEXT:
-{research_client_data['company_brief']}
-
 PRIMARY KEYWORD: {guidelines_keyword}
 
 REQUIREMENTS:
@@ -784,10 +1068,10 @@ FORMAT:
 
 Generate guidelines now:"""
                 
-                message = client.messages.create(
-                    model="claude-sonnet-4-20250514",
-                    max_tokens=8000,
-                    messages=[{"role": "user", "content": guidelines_prompt}]
+                message = create_message(
+                    client,
+                    **get_route('brief_guidelines', research_client_data.get('model_routes')),
+                    messages=[{"role": "user", "content": build_cached_prompt([client_context], guidelines_prompt)}]
                 )
                 
                 guidelines = message.content[0].text.strip()
@@ -865,6 +1149,13 @@ with tab6:
     with col2:
         keyword_input = st.text_input("Primary Keyword", placeholder="e.g., payment automation")
     
+    structured_refresh = st.checkbox(
+        "Structured ICP filter",
+        value=True,
+        key="refresh_structured",
+        help="Claude answers through a fixed JSON schema that is validated locally; only gaps that fail validation are asked about again."
+    )
+    
     if st.button("🔍 Analyze Content", disabled=not uploaded_article or not keyword_input):
         with st.spinner("Analyzing content..."):
             try:
@@ -884,11 +1175,13 @@ with tab6:
                 recommendations = analyze_content_for_refresh(
                     article_text=article_text,
                     keyword=keyword_input,
-                    icp_brief=refresh_client_data['icp_brief'],
+                    icp_brief=prompt_briefs(refresh_client_data)[1],
                     serpapi_key=serpapi_key,
                     firecrawl_key=firecrawl_key,
                     api_key=api_key,
-                    progress_callback=update_progress
+                    progress_callback=update_progress,
+                    structured=structured_refresh,
+                    model_routes=refresh_client_data.get('model_routes')
                 )
                 
                 st.session_state.refresh_recommendations = recommendations
@@ -940,13 +1233,16 @@ with tab6:
                     status_text.text(text)
                 
                 # Generate updates using write_article logic
+                company_text, icp_text = prompt_briefs(refresh_client_data)
                 updated_sections, log = generate_article(
                     article_brief_text=edited_recommendations,
-                    company_brief_text=refresh_client_data['company_brief'],
-                    icp_brief_text=refresh_client_data['icp_brief'],
+                    company_brief_text=company_text,
+                    icp_brief_text=icp_text,
                     writing_guidelines_text=refresh_client_data.get('guidelines', ''),
                     api_key=api_key,
-                    progress_callback=update_progress
+                    progress_callback=update_progress,
+                    max_workers=SECTION_WORKERS,
+                    model_routes=refresh_client_data.get('model_routes')
                 )
                 
                 st.success("✓ Updates generated!")
@@ -994,10 +1290,9 @@ with tab5:
     if st.button("🔍 Search", disabled=not query):
         with st.spinner("Searching..."):
             try:
-                from exa_py import Exa
                 from datetime import datetime, timedelta
                 
-                exa = Exa(api_key=exa_key)
+                exa = get_exa_client(exa_key)
                 
                 # Calculate date range (last 1 year)
                 end_date = datetime.now()
@@ -1050,19 +1345,17 @@ with tab5:
 with tab7:
     st.header("🗄️ DB Research")
     
-    # Initialize clients
+    # Initialize clients (shared across sessions, see api_clients)
     try:
-        if 'pinecone_client' not in st.session_state:
-            st.session_state.pinecone_client = Pinecone(api_key=st.secrets["PINECONE_API_KEY"])
-        if 'openai_client' not in st.session_state:
-            st.session_state.openai_client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
+        pinecone_client = get_pinecone_client(st.secrets["PINECONE_API_KEY"])
+        openai_client = get_openai_client(st.secrets["OPENAI_API_KEY"])
     except Exception as e:
         st.error(f"Failed to initialize clients: {str(e)}")
         st.stop()
 
     def search_transcripts(index, query, top_k=50, content_filter=None, transcript_id=None):
         """Search transcripts and return top K results with optional filtering."""
-        response = st.session_state.openai_client.embeddings.create(
+        response = openai_client.embeddings.create(
             model="text-embedding-3-small",
             input=query
         )
@@ -1116,8 +1409,7 @@ with tab7:
     # Get available indexes
     @st.cache_data(ttl=60)
     def get_available_indexes():
-        pc = Pinecone(api_key=st.secrets["PINECONE_API_KEY"])
-        indexes = pc.list_indexes()
+        indexes = pinecone_client.list_indexes()
         return [idx.name for idx in indexes]
 
     try:
@@ -1134,7 +1426,7 @@ with tab7:
             help="Choose which client database to search"
         )
         
-        index = st.session_state.pinecone_client.Index(selected_index)
+        index = get_pinecone_index(st.secrets["PINECONE_API_KEY"], selected_index)
         stats = index.describe_index_stats()
         
         st.markdown(f"**Database:** `{selected_index}` | **Total vectors:** {stats['total_vector_count']:,}")
@@ -1333,37 +1625,39 @@ with tab8:
         # Call Claude
         with st.spinner("AI is updating your article..."):
             try:
-                from anthropic import Anthropic
-                client = Anthropic(api_key=api_key)
+                client = get_anthropic_client(api_key)
                 
                 context_text = ""
                 if editor_client_data:
+                    company_text, icp_text = prompt_briefs(editor_client_data)
                     context_text = f"""
 CONTEXT - Target Audience:
-{editor_client_data['icp_brief']}
+{icp_text}
 
 CONTEXT - Company:
-{editor_client_data['company_brief']}
+{company_text}
 """
                 
-                ai_prompt = f"""You are editing an article based on user instructions.
+                # Client context changes least, then the article; only the instruction is uncached
+                article_block = f"""You are editing an article based on user instructions.
 
 CURRENT ARTICLE:
-{st.session_state.editor_article}
-
-{context_text}
-
-USER INSTRUCTION:
+{st.session_state.editor_article}"""
+                
+                ai_prompt = f"""USER INSTRUCTION:
 {prompt}
 
 Task: Apply the user's instruction to the article. Return the COMPLETE updated article with the changes applied. Do not add explanations, just return the updated article text.
 
 Updated article:"""
                 
-                message = client.messages.create(
-                    model="claude-sonnet-4-20250514",
-                    max_tokens=8000,
-                    messages=[{"role": "user", "content": ai_prompt}]
+                # Stream the rewrite into a live preview instead of waiting for the whole article
+                preview = st.empty()
+                message = stream_message(
+                    client,
+                    on_text=lambda text: preview.markdown(text),
+                    **get_route('editor', editor_client_data.get('model_routes') if editor_client_data else None),
+                    messages=[{"role": "user", "content": build_cached_prompt([context_text, article_block], ai_prompt)}]
                 )
                 
                 updated_article = message.content[0].text.strip()
@@ -1374,7 +1668,7 @@ Updated article:"""
                 # Add AI response to history
                 st.session_state.editor_chat_history.append({
                     "role": "assistant",
-                    "content": "✅ Article updated! You can continue editing or download the result."
+                    "content": f"✅ Article updated! You can continue editing or download the result. ({message.model}, {format_usage(usage_counts(message.usage))})"
                 })
                 
                 st.rerun()
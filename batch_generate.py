@@ -0,0 +1,282 @@
+"""
+Bulk article generation through the Anthropic Message Batches API.
+
+Every section of every queued brief is submitted as one batch request. Batches cost
+half as much as interactive calls and usually finish well within 24 hours, which
+suits overnight runs. Articles are assembled with the same logic as generate_article.
+"""
+from api_clients import get_anthropic_batch_client
+from write_article import parse_brief, build_shared_context, build_section_request, section_window, assemble_article
+from llm import usage_counts, add_usage, format_usage
+from model_routing import get_route
+from section_store import get_section_store, brief_hash, prompt_hash
+from types import SimpleNamespace
+import itertools
+import time
+import sys
+
+
+def build_batch_requests(jobs):
+    """
+    Turn queued briefs into batch requests, one per section.
+
+    Args:
+        jobs: Dict of job_id -> {'article_brief', 'company_brief', 'icp_brief', 'guidelines'} and
+            optionally the client's 'model_routes' and a 'context_mode'
+
+    Returns:
+        tuple: (requests, manifest) - manifest maps results back to jobs and to their section
+            checkpoint keys, and is JSON-serializable
+    """
+    requests = []
+    manifest = {'jobs': {}, 'requests': {}, 'checkpoints': {}}
+
+    for job_id, data in jobs.items():
+        sections = parse_brief(data['article_brief'])
+        shared_context = build_shared_context(
+            data['article_brief'],
+            data['company_brief'],
+            data['icp_brief'],
+            data.get('guidelines', ''),
+            data.get('context_mode', 'full')
+        )
+        manifest['jobs'][str(job_id)] = sections
+        route = get_route('section', data.get('model_routes'))
+
+        for index, section in enumerate(sections):
+            # custom_id must match ^[a-zA-Z0-9_-]{1,64}$
+            custom_id = f"job{job_id}_s{index}"
+            window = section_window(sections, index) if data.get('context_mode') == 'window' else ''
+            params = build_section_request(shared_context, section, route, window)
+            requests.append({'custom_id': custom_id, 'params': params})
+            manifest['requests'][custom_id] = [str(job_id), index]
+            manifest['checkpoints'][custom_id] = [brief_hash(data['article_brief']), prompt_hash(params)]
+
+    return requests, manifest
+
+
+def submit_article_batch(jobs, client):
+    """
+    Submit all sections of the given briefs as a single Message Batch.
+
+    Returns:
+        tuple: (batch_id, manifest)
+    """
+    requests, manifest = build_batch_requests(jobs)
+    if not requests:
+        raise Exception("No sections found in the queued briefs")
+
+    batch = client.messages.batches.create(requests=requests)
+    return batch.id, manifest
+
+
+def collect_article_batch(client, batch_id, manifest):
+    """
+    Download the results of an ended batch and assemble each article.
+
+    Every succeeded section is also checkpointed (see section_store.py), so the sections of an
+    article that failed in the batch are not paid for again when it is generated normally.
+
+    Returns:
+        dict: job_id -> {'status': 'complete', 'article', 'log'} or {'status': 'error', 'error'}
+    """
+    written = {job_id: [None] * len(sections) for job_id, sections in manifest['jobs'].items()}
+    usage = {job_id: [None] * len(sections) for job_id, sections in manifest['jobs'].items()}
+    models = {job_id: [None] * len(sections) for job_id, sections in manifest['jobs'].items()}
+    errors = {}
+    store = get_section_store()
+
+    for entry in client.messages.batches.results(batch_id):
+        if entry.custom_id not in manifest['requests']:
+            continue
+        job_id, index = manifest['requests'][entry.custom_id]
+        section = manifest['jobs'][job_id][index]
+
+        if entry.result.type == 'succeeded':
+            message = entry.result.message
+            written[job_id][index] = {
+                'level': section['level'],
+                'title': section['title'],
+                'content': message.content[0].text.strip()
+            }
+            usage[job_id][index] = usage_counts(message.usage)
+            models[job_id][index] = getattr(message, 'model', '')
+            # Manifests from before checkpoints have no keys
+            checkpoint_key = manifest.get('checkpoints', {}).get(entry.custom_id)
+            if store and checkpoint_key:
+                store.put(checkpoint_key[0], index, checkpoint_key[1], written[job_id][index]['content'], models[job_id][index], usage[job_id][index])
+        else:
+            errors.setdefault(job_id, []).append(f"{section['level']}: {section['title']} ({entry.result.type})")
+
+    results = {}
+    for job_id, sections in manifest['jobs'].items():
+        missing = [f"{s['level']}: {s['title']}" for s, w in zip(sections, written[job_id]) if w is None]
+        if missing:
+            failed = errors.get(job_id) or missing
+            results[job_id] = {
+                'status': 'error',
+                'error': f"{len(missing)} section(s) failed in batch {batch_id}: " + '; '.join(failed)
+            }
+            continue
+
+        # Same log layout as generate_article
+        log = [f"Article Generation Log\n{'='*50}\n", f"Total sections to write: {len(sections)}\n\n"]
+        total_usage = {}
+        for section, written_section, counts, model in zip(sections, written[job_id], usage[job_id], models[job_id]):
+            word_count = len(written_section['content'].split())
+            log.append(f"✓ Wrote {section['level']}: {section['title']} ({word_count} words, target: {section['word_count']}; {model}; {format_usage(counts)})\n")
+            add_usage(total_usage, counts)
+        log.append(f"\nToken usage: {format_usage(total_usage)}\n")
+        log.append(f"\n✓ Article assembled (batch {batch_id})\n")
+
+        results[job_id] = {
+            'status': 'complete',
+            'article': assemble_article(written[job_id]),
+            'log': ''.join(log)
+        }
+
+    return results
+
+
+def generate_articles_batch(jobs, api_key=None, progress_callback=None, poll_interval=60, client=None):
+    """
+    Submit queued briefs as one batch, wait for it to finish and assemble the articles.
+
+    Args:
+        jobs: Dict of job_id -> {'article_brief', 'company_brief', 'icp_brief', 'guidelines'}
+        api_key: Anthropic API key (ignored when client is given)
+        progress_callback: Optional function to call with progress updates (text, progress_pct)
+        poll_interval: Seconds between batch status checks
+        client: Optional client to use instead of the shared Anthropic client, e.g. FakeBatchClient
+
+    Returns:
+        dict: job_id -> result, as returned by collect_article_batch
+    """
+
+    def update_progress(text, pct=None):
+        if progress_callback:
+            progress_callback(text, pct)
+        else:
+            print(text)
+
+    if client is None:
+        client = get_anthropic_batch_client(api_key)
+
+    batch_id, manifest = submit_article_batch(jobs, client)
+    total = len(manifest['requests'])
+    update_progress(f"Submitted batch {batch_id} ({total} sections from {len(jobs)} briefs)")
+
+    while True:
+        batch = client.messages.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        done = total - counts.processing
+        update_progress(f"Batch {batch_id}: {done}/{total} sections finished", done / total)
+        if batch.processing_status == 'ended':
+            break
+        time.sleep(poll_interval)
+
+    results = collect_article_batch(client, batch_id, manifest)
+    update_progress(f"✓ Batch complete: {sum(r['status'] == 'complete' for r in results.values())}/{len(results)} articles", 1.0)
+    return results
+
+
+class FakeBatchClient:
+    """
+    Offline stand-in for Anthropic() that implements messages.batches locally.
+
+    Each request is answered by responder(params) -> text (a placeholder by default).
+    The batch reports 'in_progress' for polls_until_done retrieves, then 'ended'.
+    """
+
+    def __init__(self, responder=None, polls_until_done=1):
+        self.messages = SimpleNamespace(batches=_FakeMessageBatches(responder, polls_until_done))
+
+
+class _FakeMessageBatches:
+
+    def __init__(self, responder, polls_until_done):
+        self.responder = responder or _placeholder_response
+        self.polls_until_done = polls_until_done
+        self.batches = {}
+        self.ids = itertools.count(1)
+
+    def create(self, requests):
+        batch_id = f"msgbatch_fake_{next(self.ids)}"
+        self.batches[batch_id] = {'requests': list(requests), 'polls': 0}
+        return self.retrieve(batch_id, count_poll=False)
+
+    def retrieve(self, batch_id, count_poll=True):
+        batch = self.batches[batch_id]
+        if count_poll:
+            batch['polls'] += 1
+        ended = batch['polls'] >= self.polls_until_done
+        total = len(batch['requests'])
+        return SimpleNamespace(
+            id=batch_id,
+            processing_status='ended' if ended else 'in_progress',
+            request_counts=SimpleNamespace(
+                processing=0 if ended else total,
+                succeeded=total if ended else 0,
+                errored=0,
+                canceled=0,
+                expired=0
+            )
+        )
+
+    def results(self, batch_id):
+        for request in self.batches[batch_id]['requests']:
+            text = self.responder(request['params'])
+            message = SimpleNamespace(
+                content=[SimpleNamespace(type='text', text=text)],
+                usage=SimpleNamespace(input_tokens=0, output_tokens=len(text.split())),
+                model=request['params']['model']
+            )
+            yield SimpleNamespace(
+                custom_id=request['custom_id'],
+                result=SimpleNamespace(type='succeeded', message=message)
+            )
+
+
+def _placeholder_response(params):
+    # Echo the "SECTION TO WRITE" line so assembled output can be checked by eye
+    section_prompt = params['messages'][0]['content'][-1]['text']
+    return f"Placeholder content for {section_prompt.split(chr(10))[1]}."
+
+
+# Command-line interface: python batch_generate.py brief1.md brief2.md [--fake]
+if __name__ == "__main__":
+    brief_paths = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    use_fake = '--fake' in sys.argv
+
+    with open('Vector Company Brief.txt', 'r', encoding='utf-8') as f:
+        company_brief = f.read()
+
+    with open('Vector ICP briefs.txt', 'r', encoding='utf-8') as f:
+        icp_brief = f.read()
+
+    jobs = {}
+    for job_id, path in enumerate(brief_paths):
+        with open(path, 'r', encoding='utf-8') as f:
+            jobs[job_id] = {
+                'article_brief': f.read(),
+                'company_brief': company_brief,
+                'icp_brief': icp_brief,
+                'guidelines': ''
+            }
+
+    results = generate_articles_batch(
+        jobs,
+        api_key="YOUR_API_KEY_HERE",  # Replace when testing locally
+        client=FakeBatchClient() if use_fake else None,
+        poll_interval=1 if use_fake else 60
+    )
+
+    for job_id, path in enumerate(brief_paths):
+        result = results[str(job_id)]
+        if result['status'] == 'complete':
+            out_path = path.rsplit('.', 1)[0] + '_article.md'
+            with open(out_path, 'w', encoding='utf-8') as f:
+                f.write(result['article'])
+            print(f"✓ {path} -> {out_path}")
+        else:
+            print(f"✗ {path}: {result['error']}")
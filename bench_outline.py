@@ -0,0 +1,91 @@
+"""
+Micro-benchmark for outline extraction on large scraped pages.
+
+Compares extract_outline with the old line-by-line '## ' / '### ' loop it replaced.
+Pages come from the scrape cache when it has any, otherwise synthetic pages are used.
+
+Usage:
+    python bench_outline.py [--pages 50] [--repeat 5] [file.md ...]
+"""
+from outline import extract_outline
+from scrape_cache import get_scrape_cache
+import argparse
+import random
+import time
+
+
+def legacy_headers(markdown):
+    """The H2/H3 loop previously copy-pasted in analyze_content.py and the Content Briefs tab."""
+    headers = []
+    for line in markdown.split('\n'):
+        line = line.strip()
+        if line.startswith('## ') and not line.startswith('### '):
+            headers.append(f"## {line.replace('## ', '').strip()}")
+        elif line.startswith('### '):
+            headers.append(f"### {line.replace('### ', '').strip()}")
+    return headers
+
+
+def synthetic_page(sections=80, seed=0):
+    rng = random.Random(seed)
+    words = "payment automation invoice approval workflow vendor finance team process cost".split()
+    parts = ["Intro " + ' '.join(rng.choices(words, k=120))]
+    for i in range(sections):
+        level = rng.choice([2, 2, 3, 3, 4])
+        parts.append(f"{'#' * level} **Section {i}** {' '.join(rng.choices(words, k=3))}")
+        for _ in range(rng.randint(1, 5)):
+            parts.append(' '.join(rng.choices(words, k=rng.randint(40, 160))))
+        if i % 10 == 0:
+            parts.append(f"Setext {i}\n" + '-' * 10)
+            parts.append("```\n## not a heading\n```")
+    return '\n\n'.join(parts)
+
+
+def load_pages(paths, count):
+    if paths:
+        pages = []
+        for path in paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                pages.append(f.read())
+        return pages, 'files'
+
+    rows = get_scrape_cache().conn.execute("SELECT markdown FROM pages ORDER BY size DESC LIMIT ?", (count,)).fetchall()
+    if rows:
+        return [row[0] for row in rows], 'scrape cache'
+    return [synthetic_page(seed=i) for i in range(count)], 'synthetic'
+
+
+def timed(function, pages, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for page in pages:
+            function(page)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark markdown outline extraction")
+    parser.add_argument('files', nargs='*', help="Markdown files to use instead of cached or synthetic pages")
+    parser.add_argument('--pages', type=int, default=50, help="Number of pages")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per extractor (best is reported)")
+    args = parser.parse_args()
+
+    pages, source = load_pages(args.files, args.pages)
+    total_bytes = sum(len(page.encode('utf-8')) for page in pages)
+    print(f"{len(pages)} pages from {source}, {total_bytes / 1024 / 1024:.1f} MB")
+
+    for name, function in (('legacy H2/H3 loop', legacy_headers), ('extract_outline', extract_outline)):
+        elapsed = timed(function, pages, args.repeat)
+        print(f"{name:>18}: {elapsed * 1000:8.1f} ms total, {elapsed * 1000 / len(pages):6.2f} ms/page, "
+              f"{total_bytes / 1024 / 1024 / elapsed:6.1f} MB/s")
+
+    sections = sum(len(extract_outline(page)['sections']) for page in pages)
+    legacy = sum(len(legacy_headers(page)) for page in pages)
+    print(f"headings found: extract_outline {sections}, legacy loop {legacy}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+Compact digests of a client's company and ICP briefs.
+
+Briefs uploaded in Manage Clients can run to many pages and are repeated in every section,
+brief, refresh and editor prompt. A digest condenses each brief once into the facts those
+prompts actually use. Digests are stored on the client under 'digests', keyed by a hash of
+the brief they were made from, and are only rebuilt when that brief changes or
+DIGEST_VERSION is bumped. Identical digest requests are also served from the response
+cache, so a brief digested in an earlier session isn't sent to Claude again.
+
+Prompts use digests only for clients with 'use_digests' set (see client_briefs).
+"""
+from api_clients import get_anthropic_client
+from llm import create_message, usage_counts, format_usage
+from model_routing import get_route
+import hashlib
+import time
+
+# Bump when the digest prompts change so existing digests are rebuilt
+DIGEST_VERSION = 1
+
+BRIEF_KINDS = {
+    'company_brief': "company brief",
+    'icp_brief': "ICP (ideal customer profile) brief",
+}
+
+DIGEST_FOCUS = {
+    'company_brief': """- What the company sells, to whom, and how it is positioned against alternatives
+- Product names, features and capabilities, with exact names and numbers
+- Proof points: customers, results, statistics, awards
+- Brand voice, terminology to use or avoid, and claims that must not be made""",
+    'icp_brief': """- Each persona or segment: role, seniority, industry and company size
+- Their goals, pain points and objections, in their own words where the brief gives them
+- What they already know, what they search for, and what convinces them
+- Terminology they use and topics that matter most to them""",
+}
+
+
+def brief_hash(text):
+    """SHA-256 of a brief's text."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def digest_is_current(digest, text):
+    """True if the stored digest was built from this exact text with the current prompt version."""
+    return bool(digest) and digest.get('hash') == brief_hash(text) and digest.get('version') == DIGEST_VERSION
+
+
+def build_digest(kind, text, api_key, model_routes=None):
+    """
+    Condense one brief with Claude.
+
+    Args:
+        kind: 'company_brief' or 'icp_brief'
+        text: The full brief
+        api_key: Anthropic API key
+        model_routes: The client's model routing overrides
+
+    Returns:
+        dict: text, hash, version, model, created, source_chars, usage
+    """
+    prompt = f"""Condense this {BRIEF_KINDS[kind]} into a digest that writers will use instead of the full brief.
+
+Keep:
+{DIGEST_FOCUS[kind]}
+
+Rules:
+- Keep every specific fact, name and number that a writer could use; drop repetition, filler and formatting
+- Use short markdown bullet points under a few headings
+- Do not add anything that is not in the brief
+- Aim for at most about 600 words
+
+BRIEF:
+{text}
+
+Return only the digest."""
+
+    message = create_message(
+        get_anthropic_client(api_key),
+        **get_route('brief_digest', model_routes),
+        messages=[{"role": "user", "content": prompt}]
+    )
+
+    return {
+        'text': message.content[0].text.strip(),
+        'hash': brief_hash(text),
+        'version': DIGEST_VERSION,
+        'model': message.model,
+        'created': time.time(),
+        'source_chars': len(text),
+        'usage': usage_counts(message.usage)
+    }
+
+
+def ensure_client_digests(client_data, api_key, progress_callback=None):
+    """
+    Build the client's missing or outdated digests and store them under client_data['digests'].
+
+    Args:
+        client_data: The client's dict (modified in place)
+        api_key: Anthropic API key
+        progress_callback: Optional function called with a status line per rebuilt digest
+
+    Returns:
+        list: Brief kinds that were rebuilt (empty if all digests were current)
+    """
+    digests = client_data.setdefault('digests', {})
+    rebuilt = []
+
+    for kind in BRIEF_KINDS:
+        text = client_data.get(kind, '')
+        if not text.strip() or digest_is_current(digests.get(kind), text):
+            continue
+        digest = build_digest(kind, text, api_key, client_data.get('model_routes'))
+        digest['revision'] = digests.get(kind, {}).get('revision', 0) + 1
+        digests[kind] = digest
+        rebuilt.append(kind)
+        if progress_callback:
+            progress_callback(
+                f"✓ Digested {BRIEF_KINDS[kind]}: {digest['source_chars']:,} → {len(digest['text']):,} characters "
+                f"({digest['model']}; {format_usage(digest['usage'])})"
+            )
+
+    return rebuilt
+
+
+def client_briefs(client_data):
+    """
+    Company and ICP brief text to put in prompts for this client.
+
+    Returns the digests when the client uses them and they match the current briefs,
+    otherwise the full briefs.
+
+    Returns:
+        tuple: (company_brief_text, icp_brief_text)
+    """
+    briefs = []
+    for kind in BRIEF_KINDS:
+        text = client_data.get(kind, '')
+        digest = client_data.get('digests', {}).get(kind)
+        if client_data.get('use_digests') and digest_is_current(digest, text):
+            briefs.append(digest['text'])
+        else:
+            briefs.append(text)
+    return tuple(briefs)
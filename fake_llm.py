@@ -0,0 +1,105 @@
+"""
+Offline stand-in for the Anthropic client, for load tests and running the app without API keys.
+
+Set LLM_FAKE_BACKEND=1 and get_anthropic_client returns a FakeAnthropic: messages.create and
+messages.stream sleep for LLM_FAKE_LATENCY seconds and answer with placeholder text, as real
+Message objects so response caching and usage reporting work unchanged. Message Batches are
+served by batch_generate.FakeBatchClient instead.
+"""
+from anthropic.types import Message
+import itertools
+import os
+import threading
+import time
+
+FAKE_LATENCY = float(os.environ.get('LLM_FAKE_LATENCY', '0.5'))
+
+
+class FakeAnthropic:
+    """
+    Client with messages.create / messages.stream that answer locally.
+
+    Args:
+        latency: Seconds each request takes
+        responder: Optional function(request kwargs) -> response text
+    """
+
+    def __init__(self, latency=FAKE_LATENCY, responder=None):
+        self.messages = _FakeMessages(latency, responder or _placeholder_response)
+
+
+class _FakeMessages:
+
+    def __init__(self, latency, responder):
+        self.latency = latency
+        self.responder = responder
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.calls = 0
+
+    def _respond(self, kwargs):
+        with self.lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            text = self.responder(kwargs)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+        return Message.model_validate({
+            'id': f"msg_fake_{next(self.ids)}",
+            'type': 'message',
+            'role': 'assistant',
+            'model': kwargs.get('model', 'fake'),
+            'content': [{'type': 'text', 'text': text}],
+            'stop_reason': 'end_turn',
+            'usage': {'input_tokens': _count_words(kwargs.get('messages', [])), 'output_tokens': len(text.split())}
+        })
+
+    def create(self, **kwargs):
+        return self._respond(kwargs)
+
+    def stream(self, **kwargs):
+        return _FakeStream(self._respond(kwargs))
+
+
+class _FakeStream:
+
+    def __init__(self, message):
+        self.message = message
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @property
+    def text_stream(self):
+        for word in self.message.content[0].text.split(' '):
+            yield word + ' '
+
+    def get_final_message(self):
+        return self.message
+
+
+def _count_words(messages):
+    total = 0
+    for message in messages:
+        content = message['content']
+        blocks = content if isinstance(content, list) else [{'text': content}]
+        total += sum(len(block.get('text', '').split()) for block in blocks)
+    return total
+
+
+def _placeholder_response(kwargs):
+    # Echo the start of the last prompt block so output can be matched to requests by eye
+    content = kwargs['messages'][-1]['content']
+    prompt = content[-1]['text'] if isinstance(content, list) else content
+    first_line = prompt.strip().split('\n')[0][:80]
+    return f"Placeholder response to: {first_line}"
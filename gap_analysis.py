@@ -0,0 +1,180 @@
+"""
+Local structural gap analysis for Content Refresh.
+
+Compares an article's outline with competitor outlines: each of our sections is aligned
+with the competitor sections that cover the same topic, competitor-only topics are
+grouped and counted, and section lengths are compared with the competitor median.
+The result is deterministic and compact, so the LLM steps get these numbers plus short
+excerpts of the sections involved instead of the full article and every competitor header.
+"""
+from header_clusters import header_terms, cluster_headers
+from collections import Counter
+from statistics import median
+import math
+
+# Minimum weighted word-set similarity for a competitor section to count as covering one of ours
+ALIGN_THRESHOLD = 0.5
+# A section is thin if it has less than this share of the competitor median length
+THIN_RATIO = 0.6
+# Words of each section quoted to the LLM
+EXCERPT_WORDS = 120
+
+
+def _sections(outline, levels=(2, 3)):
+    return [section for section in outline['sections'] if section['level'] in levels]
+
+
+def _weighted_similarity(terms_a, terms_b, weights):
+    # Jaccard with each word weighted by rarity, so words every header shares (usually
+    # the keyword itself) count for little and the distinguishing words decide the match
+    union = sum(weights[term] for term in terms_a | terms_b)
+    return sum(weights[term] for term in terms_a & terms_b) / union if union else 0.0
+
+
+def _alignment_terms(title, keyword_terms):
+    # The keyword shows up in many headers ("What is X", "Benefits of X") and says nothing
+    # about which topic a section covers, so it only counts when a header has nothing else
+    terms = header_terms(title)
+    return terms - keyword_terms or terms
+
+
+def analyze_gaps(your_outline, competitor_outlines, keyword='', min_pages=2):
+    """
+    Compare an article's sections with competitor pages.
+
+    Args:
+        your_outline: extract_outline result for the article
+        competitor_outlines: extract_outline results for competitor pages
+        keyword: Primary keyword; its words are ignored when matching sections
+        min_pages: Competitor pages a topic must appear on to count as missing
+            (lowered to 1 when fewer than 3 competitors were scraped)
+
+    Returns:
+        dict: 'competitors' (number of pages), 'aligned' (one dict per H2/H3 of the article
+            with 'title', 'level', 'words', 'pages', 'competitor_median_words',
+            'word_delta', 'thin', 'matches' and 'start' / 'end' offsets) and 'missing'
+            (competitor topics the article lacks: 'title', 'level', 'pages', 'median_words',
+            'variants')
+    """
+    total = len(competitor_outlines)
+    min_pages = min_pages if total >= 3 else 1
+    keyword_terms = header_terms(keyword)
+    yours = [(section, _alignment_terms(section['title'], keyword_terms)) for section in _sections(your_outline)]
+    competitor_sections = [
+        (page_index, section, _alignment_terms(section['title'], keyword_terms))
+        for page_index, outline in enumerate(competitor_outlines)
+        for section in _sections(outline)
+    ]
+
+    # Word weights: inverse frequency across all headers
+    header_count = len(yours) + len(competitor_sections)
+    document_frequency = Counter(term for _, terms in yours for term in terms)
+    document_frequency.update(term for _, _, terms in competitor_sections for term in terms)
+    weights = {term: math.log(1 + header_count / count) for term, count in document_frequency.items()}
+
+    # Best matching section of ours for every competitor section
+    matched = {i: {} for i in range(len(yours))}
+    unmatched_headers = [[] for _ in competitor_outlines]
+    unmatched_words = {}
+
+    for page_index, section, terms in competitor_sections:
+        best, best_score = None, ALIGN_THRESHOLD
+        for i, (_, your_terms) in enumerate(yours):
+            score = _weighted_similarity(terms, your_terms, weights)
+            if score >= best_score:
+                best, best_score = i, score
+
+        if best is None:
+            header = f"{'#' * section['level']} {section['title']}"
+            unmatched_headers[page_index].append(header)
+            unmatched_words.setdefault(header_terms(section['title']), []).append(section['subtree_words'])
+        else:
+            # Count each competitor page once per section, keeping its longest match
+            previous = matched[best].get(page_index)
+            if previous is None or section['subtree_words'] > previous['subtree_words']:
+                matched[best][page_index] = section
+
+    aligned = []
+    for i, (section, _) in enumerate(yours):
+        matches = list(matched[i].values())
+        competitor_median = int(median(s['subtree_words'] for s in matches)) if matches else None
+        aligned.append({
+            'title': section['title'],
+            'level': section['level'],
+            'words': section['subtree_words'],
+            'pages': len(matches),
+            'competitor_median_words': competitor_median,
+            'word_delta': section['subtree_words'] - competitor_median if competitor_median is not None else None,
+            'thin': competitor_median is not None and section['subtree_words'] < competitor_median * THIN_RATIO,
+            'matches': sorted({s['title'] for s in matches}),
+            'start': section['start'],
+            'end': section['subtree_end']
+        })
+
+    missing = []
+    for topic in cluster_headers(unmatched_headers):
+        if topic['pages'] < min_pages:
+            continue
+        lengths = [words for form in [topic['title']] + topic['variants'] for words in unmatched_words.get(header_terms(form), [])]
+        missing.append({
+            'title': topic['title'],
+            'level': topic['level'],
+            'pages': topic['pages'],
+            'median_words': int(median(lengths)) if lengths else None,
+            'variants': topic['variants']
+        })
+
+    return {'competitors': total, 'aligned': aligned, 'missing': missing}
+
+
+def gap_json(report):
+    """
+    The report in the JSON shape the refresh prompts expect (missing_sections / thin_sections).
+    """
+    total = report['competitors']
+    missing_sections = [
+        {
+            'title': topic['title'],
+            'frequency': f"appears in {topic['pages']}/{total} competitors",
+            'competitor_median_words': topic['median_words'],
+            'also_called': topic['variants'][:3]
+        }
+        for topic in report['missing']
+    ]
+    thin_sections = [
+        {
+            'title': section['title'],
+            'issue': (
+                f"{section['words']} words vs competitor median {section['competitor_median_words']} "
+                f"across {section['pages']}/{total} competitors"
+            )
+        }
+        for section in report['aligned'] if section['thin']
+    ]
+    return {'missing_sections': missing_sections, 'thin_sections': thin_sections}
+
+
+def article_summary(article_text, report, excerpt_words=EXCERPT_WORDS):
+    """
+    Compact view of the article for the LLM: every H2/H3 with its length and competitor
+    coverage, plus the opening words of the thin sections.
+    """
+    total = report['competitors']
+    lines = []
+    for section in report['aligned']:
+        coverage = f"covered by {section['pages']}/{total} competitors"
+        if section['competitor_median_words'] is not None:
+            coverage += f", competitor median {section['competitor_median_words']} words"
+        lines.append(f"{'#' * section['level']} {section['title']} ({section['words']} words; {coverage})")
+
+    excerpts = []
+    for section in report['aligned']:
+        if section['thin']:
+            words = article_text[section['start']:section['end']].split()
+            excerpt = ' '.join(words[:excerpt_words]) + (' ...' if len(words) > excerpt_words else '')
+            excerpts.append(excerpt)
+
+    summary = "ARTICLE OUTLINE:\n" + '\n'.join(lines)
+    if excerpts:
+        summary += "\n\nTHIN SECTION EXCERPTS:\n" + '\n\n'.join(excerpts)
+    return summary
@@ -0,0 +1,127 @@
+"""
+Local grouping of competitor headers.
+
+Headers from all competitor pages are normalized (case, numbering, punctuation,
+stopwords, plurals) and grouped when their word sets are near-identical, so Claude gets
+one line per topic annotated with how many competitor pages cover it, instead of every
+raw header. The page counts are exact rather than estimated by the model.
+"""
+from link_index import tokenize
+from collections import Counter
+import re
+
+# Minimum Jaccard similarity of two headers' word sets to treat them as the same topic
+SIMILARITY_THRESHOLD = 0.75
+
+# Leading numbering such as "1.", "2)", "Step 3:", "#4 -"
+NUMBERING_RE = re.compile(r'^\s*(?:step\s+)?#?\d+\s*[.):\-–—]?\s*', re.IGNORECASE)
+
+
+def header_parts(header):
+    """Split a markdown header line into (level, text), e.g. '### FAQs' -> (3, 'FAQs')."""
+    match = re.match(r'^(#{1,6})\s+(.*)$', header.strip())
+    if match:
+        return len(match.group(1)), match.group(2).strip()
+    return 2, header.strip()
+
+
+def header_terms(text):
+    """Normalized word set of a header's text."""
+    return frozenset(tokenize(NUMBERING_RE.sub('', text)))
+
+
+def similarity(terms_a, terms_b):
+    if not terms_a or not terms_b:
+        return 0.0
+    return len(terms_a & terms_b) / len(terms_a | terms_b)
+
+
+def cluster_headers(pages_headers, threshold=SIMILARITY_THRESHOLD):
+    """
+    Group headers from several pages into topics.
+
+    Args:
+        pages_headers: One list of markdown header lines ('## ...', '### ...') per competitor page
+        threshold: Minimum word-set similarity for two headers to share a topic
+
+    Returns:
+        list: Topic dicts sorted by coverage, then by where they appear in the outlines, each
+            with 'title' and 'level' (most common form), 'pages' (number of pages with the topic),
+            'count' (total occurrences) and 'variants' (other distinct wordings)
+    """
+    # Exact duplicates first: identical normalized word sets
+    groups = {}
+    for page_index, headers in enumerate(pages_headers):
+        for header_index, header in enumerate(headers):
+            level, text = header_parts(header)
+            terms = header_terms(text)
+            # Headers made only of stopwords can't be compared; each wording stays its own topic
+            key = terms or ('raw', ' '.join(re.findall(r'[a-z0-9]+', text.lower())))
+            if key == ('raw', ''):
+                continue
+            group = groups.setdefault(key, {'terms': terms, 'forms': Counter(), 'levels': Counter(), 'pages': set(), 'positions': []})
+            group['forms'][text] += 1
+            group['levels'][level] += 1
+            group['pages'].add(page_index)
+            # Relative position in the page's outline (0 = first header)
+            group['positions'].append(header_index / len(headers))
+
+    # Near duplicates: merge each group into the most similar bigger cluster sharing a word
+    clusters = []
+    clusters_by_term = {}
+    for group in sorted(groups.values(), key=lambda g: (-len(g['pages']), -sum(g['forms'].values()), len(g['terms']))):
+        candidates = {id(cluster): cluster for term in group['terms'] for cluster in clusters_by_term.get(term, [])}
+        best, best_score = None, threshold
+        for cluster in candidates.values():
+            score = similarity(group['terms'], cluster['terms'])
+            if score >= best_score:
+                best, best_score = cluster, score
+
+        if best is None:
+            best = {'terms': group['terms'], 'forms': Counter(), 'levels': Counter(), 'pages': set(), 'positions': []}
+            clusters.append(best)
+            for term in group['terms']:
+                clusters_by_term.setdefault(term, []).append(best)
+
+        best['forms'].update(group['forms'])
+        best['levels'].update(group['levels'])
+        best['pages'] |= group['pages']
+        best['positions'] += group['positions']
+
+    topics = []
+    for cluster in clusters:
+        # Wordings that differ only in case, punctuation or numbering are shown once
+        forms = []
+        seen = set()
+        for form, _ in cluster['forms'].most_common():
+            key = ' '.join(re.findall(r'[a-z0-9]+', NUMBERING_RE.sub('', form).lower()))
+            if key not in seen:
+                seen.add(key)
+                forms.append(form)
+        topics.append({
+            'title': forms[0],
+            'level': cluster['levels'].most_common(1)[0][0],
+            'pages': len(cluster['pages']),
+            'count': sum(cluster['forms'].values()),
+            'variants': forms[1:],
+            'position': sum(cluster['positions']) / len(cluster['positions'])
+        })
+
+    # Equally common topics keep the order competitors put them in
+    topics.sort(key=lambda topic: (-topic['pages'], topic['position']))
+    return topics
+
+
+def format_topics(topics, total_pages, max_variants=3):
+    """
+    Render topics as frequency-annotated markdown lines for a prompt.
+
+    Example: '## Pricing Plans (4/10 pages; also: Plans and Pricing, Cost)'
+    """
+    lines = []
+    for topic in topics:
+        note = f"{topic['pages']}/{total_pages} pages"
+        if topic['variants']:
+            note += f"; also: {', '.join(topic['variants'][:max_variants])}"
+        lines.append(f"{'#' * topic['level']} {topic['title']} ({note})")
+    return '\n'.join(lines)
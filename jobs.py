@@ -0,0 +1,435 @@
+"""
+Background job engine for article generation and internal linking.
+
+Jobs are stored in SQLite and run by a pool of worker threads that lives for the whole
+server process, so they keep running across Streamlit reruns and after the browser tab
+is closed. The app only submits jobs and reads their state back by id. Jobs left
+'running' by a previous process are queued again when the engine starts.
+
+Each job has a priority class, a user and a client. Free workers take the next job
+chosen by scheduler.pick_next_job (interactive before bulk, then fair share between
+users and their clients), and one worker is kept free of bulk jobs for interactive ones.
+"""
+from write_article import generate_article
+from add_internal_links import insert_internal_links
+from scheduler import pick_next_job, priority_class, PRIORITY_CLASSES
+from statistics import median
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_DB_PATH = os.environ.get(
+    'JOBS_DB_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'jobs.sqlite')
+)
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '4'))
+# Sections written in parallel inside one generation job
+SECTION_WORKERS = int(os.environ.get('JOB_SECTION_WORKERS', '5'))
+# Workers that only take interactive jobs
+RESERVED_INTERACTIVE_WORKERS = int(os.environ.get('JOB_RESERVED_INTERACTIVE_WORKERS', '1'))
+# Minimum seconds between progress writes for one job
+PROGRESS_INTERVAL = 0.5
+# Jobs started within this many seconds count towards the wait-time metrics
+METRICS_WINDOW = 3600
+
+ACTIVE_STATUSES = ('queued', 'running')
+FINISHED_STATUSES = ('complete', 'error', 'canceled')
+
+logger = logging.getLogger(__name__)
+
+_job_engine = None
+_job_engine_lock = threading.Lock()
+
+
+def run_generate_job(params, api_key, progress):
+    """
+    Handler for 'generate' jobs: params are the stored row data of the Generate tab, plus
+    'regenerate' (section indexes) when rewriting single sections of a finished article.
+    Sections are checkpointed, so running a failed job again resumes where it stopped.
+    Section text is streamed into the job's progress so the app can preview it.
+    """
+    final_article, log = generate_article(
+        params['article_brief'],
+        params['company_brief'],
+        params['icp_brief'],
+        params['guidelines'],
+        api_key,
+        progress_callback=progress,
+        max_workers=SECTION_WORKERS,
+        stream=True,
+        model_routes=params.get('model_routes'),
+        context_mode=params.get('context_mode', 'full'),
+        regenerate=params.get('regenerate')
+    )
+    return {'status': 'complete', 'article': final_article, 'log': log}
+
+
+def run_link_job(params, api_key, progress):
+    """Handler for 'link' jobs: params are the stored row data of the Add Internal Links tab."""
+    linked_text = insert_internal_links(
+        article_text=params['article_text'],
+        sitemap_url=params['sitemap_url'],
+        num_links=params['num_links'],
+        priority_urls=params['priority_urls'],
+        api_key=api_key,
+        progress_callback=lambda text, pct=None: progress(text, pct),
+        mode=params.get('mode', 'llm'),
+        model_routes=params.get('model_routes')
+    )
+    return {'status': 'complete', 'linked_text': linked_text, 'file_name': params['file_name']}
+
+
+JOB_HANDLERS = {
+    'generate': run_generate_job,
+    'link': run_link_job
+}
+
+# Priority class used when submit() is not given one
+KIND_PRIORITIES = {
+    'generate': 'bulk',
+    'link': 'interactive'
+}
+
+
+class JobStore:
+    """
+    SQLite table of jobs with their parameters, status, progress and result. Safe to share between threads.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                label TEXT NOT NULL DEFAULT '',
+                priority TEXT NOT NULL DEFAULT 'bulk',
+                user TEXT NOT NULL DEFAULT '',
+                client TEXT NOT NULL DEFAULT '',
+                params TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                progress TEXT NOT NULL DEFAULT '',
+                progress_pct REAL,
+                created REAL NOT NULL,
+                started REAL,
+                finished REAL
+            )"""
+        )
+        # Tables created before jobs had a priority, user and client
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        for column, default in (('priority', 'bulk'), ('user', ''), ('client', '')):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT NOT NULL DEFAULT '{default}'")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+        self.conn.commit()
+
+    def add(self, kind, params, label='', priority='bulk', user='', client=''):
+        """Queue a job and return its id."""
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT INTO jobs (kind, status, label, priority, user, client, params, created) "
+                "VALUES (?, 'queued', ?, ?, ?, ?, ?, ?)",
+                (kind, label, priority, user, client, json.dumps(params), time.time())
+            )
+            self.conn.commit()
+            return cursor.lastrowid
+
+    def claim(self, bulk_limit=None):
+        """
+        Mark the next job (see scheduler.pick_next_job) as running and return it, or None if there is none.
+
+        Args:
+            bulk_limit: Don't start a bulk job while this many are running
+        """
+        with self.lock:
+            queued = [dict(row) for row in self.conn.execute(
+                "SELECT MIN(id) AS id, priority, user, client, MIN(created) AS created FROM jobs "
+                "WHERE status = 'queued' GROUP BY priority, user, client"
+            )]
+            if not queued:
+                return None
+
+            running = {}
+            running_bulk = 0
+            for row in self.conn.execute("SELECT user, client, priority, COUNT(*) FROM jobs WHERE status = 'running' GROUP BY user, client, priority"):
+                running[(row[0], row[1])] = running.get((row[0], row[1]), 0) + row[3]
+                if row[2] == 'bulk':
+                    running_bulk += row[3]
+            if bulk_limit is not None and running_bulk >= bulk_limit:
+                queued = [job for job in queued if job['priority'] != 'bulk']
+
+            last_started = dict(self.conn.execute("SELECT user, MAX(started) FROM jobs WHERE started IS NOT NULL GROUP BY user").fetchall())
+            chosen = pick_next_job(queued, running, last_started)
+            if chosen is None:
+                return None
+
+            now = time.time()
+            self.conn.execute("UPDATE jobs SET status = 'running', started = ? WHERE id = ?", (now, chosen['id']))
+            self.conn.commit()
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (chosen['id'],)).fetchone()
+        return self._to_dict(row)
+
+    def set_progress(self, job_id, text, pct=None):
+        with self.lock:
+            if pct is None:
+                self.conn.execute("UPDATE jobs SET progress = ? WHERE id = ?", (text, job_id))
+            else:
+                self.conn.execute("UPDATE jobs SET progress = ?, progress_pct = ? WHERE id = ?", (text, pct, job_id))
+            self.conn.commit()
+
+    def finish(self, job_id, result=None, error=None):
+        """Store a job's result, or its error message."""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished = ? WHERE id = ?",
+                ('error' if error is not None else 'complete', json.dumps(result) if result is not None else None, error, time.time(), job_id)
+            )
+            self.conn.commit()
+
+    def cancel(self, job_id):
+        """Cancel a job that has not started. Returns True if it was cancelled."""
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET status = 'canceled', finished = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+            self.conn.commit()
+            return cursor.rowcount > 0
+
+    def requeue_running(self):
+        """Queue again every job marked running (their worker process is gone). Returns how many."""
+        with self.lock:
+            cursor = self.conn.execute("UPDATE jobs SET status = 'queued', started = NULL WHERE status = 'running'")
+            self.conn.commit()
+            return cursor.rowcount
+
+    def get(self, job_id):
+        """Return a job dict, or None for an unknown id."""
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def get_many(self, job_ids):
+        """Return {job_id: job dict} for the ids that exist."""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return {}
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT * FROM jobs WHERE id IN ({','.join('?' * len(job_ids))})",
+                job_ids
+            ).fetchall()
+        return {row['id']: self._to_dict(row) for row in rows}
+
+    def queue_positions(self, kind=None):
+        """
+        Return {job_id: position} for queued jobs, 1 being the next to start.
+
+        Positions are estimates: the order is recomputed each time a worker frees up.
+        """
+        query = "SELECT id, priority, user, client, created FROM jobs WHERE status = 'queued'"
+        args = ()
+        if kind:
+            query += " AND kind = ?"
+            args = (kind,)
+        with self.lock:
+            rows = [dict(row) for row in self.conn.execute(query + " ORDER BY id", args)]
+            running = {}
+            for row in self.conn.execute("SELECT user, client, COUNT(*) FROM jobs WHERE status = 'running' GROUP BY user, client"):
+                running[(row[0], row[1])] = row[2]
+            last_started = dict(self.conn.execute("SELECT user, MAX(started) FROM jobs WHERE started IS NOT NULL GROUP BY user").fetchall())
+
+        # Replay the scheduler on a copy: each pick counts as running and as the user's latest start
+        positions = {}
+        now = time.time()
+        while rows:
+            heads = {}
+            for row in rows:
+                heads.setdefault((row['priority'], row['user'], row['client']), row)
+            chosen = pick_next_job(list(heads.values()), running, last_started, now=now)
+            positions[chosen['id']] = len(positions) + 1
+            rows.remove(chosen)
+            running[(chosen['user'], chosen['client'])] = running.get((chosen['user'], chosen['client']), 0) + 1
+            last_started[chosen['user']] = now + len(positions)
+        return positions
+
+    def metrics(self, window=METRICS_WINDOW):
+        """
+        Queue depth and wait times.
+
+        Returns:
+            dict: 'queued' and 'running' per priority class, 'queued_by_user' and
+                'queued_by_client', 'oldest_wait' (seconds the oldest queued job has waited)
+                and 'wait' per priority class: count, median and max seconds from submit to
+                start for jobs started in the last window seconds
+        """
+        now = time.time()
+        with self.lock:
+            active = self.conn.execute(
+                "SELECT status, priority, user, client, created FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchall()
+            started = self.conn.execute(
+                "SELECT priority, started - created FROM jobs WHERE started >= ?",
+                (now - window,)
+            ).fetchall()
+
+        metrics = {
+            'queued': {priority: 0 for priority in PRIORITY_CLASSES},
+            'running': {priority: 0 for priority in PRIORITY_CLASSES},
+            'queued_by_user': {},
+            'queued_by_client': {},
+            'oldest_wait': 0.0,
+            'wait': {}
+        }
+        for status, priority, user, client, created in active:
+            metrics[status][priority] = metrics[status].get(priority, 0) + 1
+            if status == 'queued':
+                metrics['queued_by_user'][user] = metrics['queued_by_user'].get(user, 0) + 1
+                metrics['queued_by_client'][client] = metrics['queued_by_client'].get(client, 0) + 1
+                metrics['oldest_wait'] = max(metrics['oldest_wait'], now - created)
+
+        waits = {}
+        for priority, wait in started:
+            waits.setdefault(priority, []).append(wait)
+        for priority, values in waits.items():
+            metrics['wait'][priority] = {'count': len(values), 'median': median(values), 'max': max(values)}
+        return metrics
+
+    def counts(self):
+        """Number of jobs per status."""
+        with self.lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def _to_dict(self, row):
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+
+class JobEngine:
+    """
+    Worker threads that take queued jobs from a JobStore and run their handlers.
+
+    Each handler is called as handler(params, api_key, progress) and returns a JSON-serializable
+    result; progress(text, pct=None) is stored on the job for the UI. An exception marks the job
+    as failed with its message.
+    """
+
+    def __init__(self, store, api_key=None, workers=JOB_WORKERS, handlers=None, poll_interval=1.0, reserved_interactive=RESERVED_INTERACTIVE_WORKERS):
+        self.store = store
+        self.api_key = api_key
+        self.workers = workers
+        # Never let bulk jobs take every worker (unless there is only one)
+        self.bulk_limit = max(1, workers - reserved_interactive)
+        self.handlers = dict(handlers or JOB_HANDLERS)
+        self.poll_interval = poll_interval
+        self.wakeup = threading.Condition()
+        self.threads = []
+        self.stopping = False
+
+    def start(self):
+        """Re-queue jobs interrupted by a restart and start the workers."""
+        requeued = self.store.requeue_running()
+        if requeued:
+            logger.info("Re-queued %d interrupted job(s)", requeued)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        """Stop after the running jobs finish (queued ones stay queued)."""
+        self.stopping = True
+        with self.wakeup:
+            self.wakeup.notify_all()
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def submit(self, kind, params, label='', user='', client='', priority=None):
+        """
+        Queue a job.
+
+        Args:
+            kind: Handler name, e.g. 'generate' or 'link'
+            params: JSON-serializable handler parameters
+            label: Short description shown in job lists
+            user: Who submitted it (fair share is per user, then per client)
+            client: Client the job is for
+            priority: 'interactive' or 'bulk' (default depends on kind, see KIND_PRIORITIES)
+
+        Returns:
+            int: Job id
+        """
+        if kind not in self.handlers:
+            raise Exception(f"Unknown job type: {kind}")
+        priority = priority or KIND_PRIORITIES.get(kind, 'bulk')
+        if priority not in PRIORITY_CLASSES:
+            raise Exception(f"Unknown priority class: {priority}")
+        job_id = self.store.add(kind, params, label, priority=priority, user=user, client=client)
+        with self.wakeup:
+            self.wakeup.notify()
+        return job_id
+
+    def get(self, job_id):
+        """Job dict with status, progress, result and error, or None."""
+        return self.store.get(job_id)
+
+    def cancel(self, job_id):
+        return self.store.cancel(job_id)
+
+    def _work(self):
+        while not self.stopping:
+            job = self.store.claim(bulk_limit=self.bulk_limit)
+            if job is None:
+                with self.wakeup:
+                    self.wakeup.wait(self.poll_interval)
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        last_write = [0.0]
+
+        def progress(text, pct=None):
+            # Streamed previews and per-section updates arrive quickly; store a few per second
+            now = time.monotonic()
+            if pct is not None or now - last_write[0] >= PROGRESS_INTERVAL:
+                last_write[0] = now
+                self.store.set_progress(job['id'], text, pct)
+
+        try:
+            # Claude calls made by the job wait for shared slots with the job's priority
+            with priority_class(job['priority']):
+                result = self.handlers[job['kind']](job['params'], self.api_key, progress)
+            self.store.finish(job['id'], result=result)
+        except Exception as e:
+            self.store.finish(job['id'], error=str(e))
+
+
+def get_job_engine(api_key=None):
+    """
+    Return the process-wide job engine, starting its workers on first use.
+
+    The API key is kept in memory only; pass it on every call so the engine started
+    first (possibly by another session) has it.
+    """
+    global _job_engine
+    with _job_engine_lock:
+        if _job_engine is None:
+            _job_engine = JobEngine(JobStore(), api_key=api_key).start()
+        elif api_key:
+            _job_engine.api_key = api_key
+        return _job_engine
@@ -0,0 +1,161 @@
+"""
+Local relevance index over sitemap pages, used to shortlist link candidates.
+
+Pages are scored against the article with BM25 over their URL slug words (plus page text
+when available), so only the most relevant few hundred URLs go into the linking prompt
+instead of the whole sitemap. Indexes are built once per sitemap and reused across jobs.
+"""
+from sitemap import url_title
+from collections import Counter
+import hashlib
+import heapq
+import math
+import re
+import threading
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'for', 'from', 'how', 'in', 'is',
+    'it', 'its', 'of', 'on', 'or', 'our', 'that', 'the', 'their', 'this', 'to', 'was', 'we',
+    'what', 'when', 'which', 'who', 'why', 'will', 'with', 'you', 'your', 'www', 'http', 'https',
+    'com', 'html', 'htm', 'php', 'index'
+}
+
+# Per-sitemap structures kept in memory, keyed by (kind, sitemap_url, fingerprint of its page URLs)
+MAX_CACHED_INDEXES = 16
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords; trailing plural 's' is dropped so 'invoices' matches 'invoice'."""
+    tokens = []
+    for token in re.findall(r'[a-z0-9]+', text.lower()):
+        if len(token) < 2 or token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def page_terms(page, page_text=''):
+    """Terms describing a page: its title, its URL path segments and optional page text."""
+    path = re.sub(r'^https?://[^/]+', '', page['url'])
+    return tokenize(f"{page['title']} {path} {page_text}")
+
+
+class SitemapIndex:
+    """
+    BM25 index over sitemap pages.
+
+    Args:
+        pages: List of dicts with 'url' and 'title' keys (as returned by fetch_sitemap)
+        page_texts: Optional dict of url -> page text to index alongside the slug
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, pages, page_texts=None):
+        page_texts = page_texts or {}
+        self.pages = pages
+        self.by_url = {page['url']: page for page in pages}
+        self.postings = {}
+        self.doc_lengths = []
+
+        for doc_id, page in enumerate(pages):
+            terms = page_terms(page, page_texts.get(page['url'], ''))
+            self.doc_lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                self.postings.setdefault(term, []).append((doc_id, tf))
+
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+        doc_count = len(pages)
+        self.idf = {
+            term: math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def scores(self, text):
+        """BM25 score of every page containing at least one term of text (dict of doc_id -> score)."""
+        query = Counter(tokenize(text))
+        scores = {}
+
+        for term, query_tf in query.items():
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            # Long queries repeat terms a lot; damp them so one topic does not drown the rest
+            weight = self.idf[term] * (1 + math.log(query_tf))
+            for doc_id, tf in docs:
+                norm = 1 - self.B + self.B * self.doc_lengths[doc_id] / (self.avg_length or 1)
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight * tf * (self.K1 + 1) / (tf + self.K1 * norm)
+
+        return scores
+
+    def shortlist(self, text, limit, priority_urls=None):
+        """
+        Pick the pages most relevant to text.
+
+        Args:
+            text: Article text
+            limit: Maximum number of relevance-ranked pages
+            priority_urls: URLs that are always included (first), even if not in the sitemap
+
+        Returns:
+            list: Page dicts with 'url' and 'title' keys
+        """
+        shortlist = []
+        included = set()
+
+        for url in priority_urls or []:
+            if url not in included:
+                shortlist.append(self.by_url.get(url) or {'url': url, 'title': url_title(url)})
+                included.add(url)
+
+        scores = self.scores(text)
+        for doc_id in heapq.nlargest(limit, scores, key=scores.get):
+            page = self.pages[doc_id]
+            if page['url'] not in included:
+                shortlist.append(page)
+                included.add(page['url'])
+
+        return shortlist
+
+
+def cached_for_sitemap(kind, sitemap_url, pages, factory):
+    """
+    Build a per-sitemap structure once and reuse it until the sitemap's page list changes.
+
+    Args:
+        kind: Name of the structure (e.g. 'bm25'), so different structures don't collide
+        sitemap_url: Client sitemap URL
+        pages: Current page list for that sitemap
+        factory: Function with no arguments that builds the structure
+    """
+    fingerprint = hashlib.sha256('\n'.join(page['url'] for page in pages).encode('utf-8')).hexdigest()
+    key = (kind, sitemap_url, fingerprint)
+
+    with _indexes_lock:
+        value = _indexes.get(key)
+    if value is not None:
+        return value
+
+    value = factory()
+    with _indexes_lock:
+        # One version per sitemap: replace older ones, then cap the total
+        for old_key in [k for k in _indexes if k[:2] == (kind, sitemap_url)]:
+            del _indexes[old_key]
+        while len(_indexes) >= MAX_CACHED_INDEXES:
+            del _indexes[next(iter(_indexes))]
+        _indexes[key] = value
+    return value
+
+
+def get_sitemap_index(sitemap_url, pages, page_texts=None):
+    """
+    Return the index for a client's sitemap, building it only when the page list changes.
+    """
+    if page_texts:
+        return SitemapIndex(pages, page_texts)
+    return cached_for_sitemap('bm25', sitemap_url, pages, lambda: SitemapIndex(pages))
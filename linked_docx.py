@@ -0,0 +1,212 @@
+"""
+Word rendering for linked articles.
+
+Turns article text with [[anchor text|URL]] links and basic markdown (headings, lists,
+**bold** / *italic*) into a .docx. Run elements are copied from templates built once,
+and each URL's hyperlink relationship is created once per document, so large articles
+with many links render quickly. export_linked_zip writes many documents into one ZIP,
+one document at a time.
+"""
+from docx import Document
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+import copy
+import io
+import re
+import tempfile
+import zipfile
+
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+LINK_RE = re.compile(r'\[\[([^\]]+)\]\]')
+EMPHASIS_RE = re.compile(r'\*\*(.+?)\*\*|__(.+?)__|(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?!\*)|(?<!\w)_(?!\s)(.+?)(?<!\s)_(?!\w)')
+HEADING_RE = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+BULLET_RE = re.compile(r'^\s*[-*+]\s+(.*)$')
+NUMBERED_RE = re.compile(r'^\s*\d+[.)]\s+(.*)$')
+
+# ZIPs smaller than this stay in memory; larger ones spill to a temp file
+ZIP_SPOOL_BYTES = 32 * 1024 * 1024
+
+
+def _run_template(bold=False, italic=False, link=False):
+    run = OxmlElement('w:r')
+    rPr = OxmlElement('w:rPr')
+    if bold:
+        rPr.append(OxmlElement('w:b'))
+    if italic:
+        rPr.append(OxmlElement('w:i'))
+    if link:
+        color = OxmlElement('w:color')
+        color.set(qn('w:val'), '0000FF')
+        rPr.append(color)
+        u = OxmlElement('w:u')
+        u.set(qn('w:val'), 'single')
+        rPr.append(u)
+    if len(rPr):
+        run.append(rPr)
+    text = OxmlElement('w:t')
+    text.set(qn('xml:space'), 'preserve')
+    run.append(text)
+    return run
+
+
+# (bold, italic, link) -> <w:r> template
+RUN_TEMPLATES = {
+    (bold, italic, link): _run_template(bold, italic, link)
+    for bold in (False, True) for italic in (False, True) for link in (False, True)
+}
+
+
+def _strip_emphasis(text):
+    return EMPHASIS_RE.sub(lambda m: next(group for group in m.groups() if group is not None), text)
+
+
+class LinkedDocxBuilder:
+    """
+    Builds one Word document from linked article text.
+
+    Usage: builder = LinkedDocxBuilder(); builder.add_text(text); builder.doc.save(path)
+    """
+
+    def __init__(self):
+        self.doc = Document()
+        self.rel_ids = {}
+        self.paragraph_styles = {}
+
+    def rel_id(self, url):
+        """Relationship id for a URL, created on first use."""
+        r_id = self.rel_ids.get(url)
+        if r_id is None:
+            r_id = self.doc.part.relate_to(url, RT.HYPERLINK, is_external=True)
+            self.rel_ids[url] = r_id
+        return r_id
+
+    def _paragraph(self, style=None):
+        paragraph = self.doc.add_paragraph()
+        if style:
+            # Style lookup by name walks the styles part, so resolve each name once
+            if style not in self.paragraph_styles:
+                self.paragraph_styles[style] = self.doc.styles[style]
+            paragraph.style = self.paragraph_styles[style]
+        return paragraph
+
+    def _run(self, text, bold=False, italic=False, link=False):
+        run = copy.deepcopy(RUN_TEMPLATES[(bold, italic, link)])
+        run[-1].text = text
+        return run
+
+    def add_inline(self, paragraph, text):
+        """Append text with [[anchor|URL]] links and **bold** / *italic* emphasis to a paragraph."""
+        p = paragraph._p
+        parts = LINK_RE.split(text)
+
+        for i, part in enumerate(parts):
+            if i % 2 == 1:
+                if '|' in part:
+                    anchor, url = part.split('|', 1)
+                    hyperlink = OxmlElement('w:hyperlink')
+                    hyperlink.set(qn('r:id'), self.rel_id(url.strip()))
+                    hyperlink.append(self._run(_strip_emphasis(anchor.strip()), link=True))
+                    p.append(hyperlink)
+                else:
+                    # Malformed link, just add as text
+                    p.append(self._run(f"[[{part}]]"))
+                continue
+
+            position = 0
+            for match in EMPHASIS_RE.finditer(part):
+                if match.start() > position:
+                    p.append(self._run(part[position:match.start()]))
+                bold_text, bold_alt, italic_text, italic_alt = match.groups()
+                if bold_text is not None or bold_alt is not None:
+                    p.append(self._run(bold_text if bold_text is not None else bold_alt, bold=True))
+                else:
+                    p.append(self._run(italic_text if italic_text is not None else italic_alt, italic=True))
+                position = match.end()
+            if position < len(part):
+                p.append(self._run(part[position:]))
+
+    def add_text(self, article_text):
+        """Add a whole article: blocks separated by blank lines, markdown headings and lists per line."""
+        for block in article_text.split('\n\n'):
+            lines = [line for line in block.split('\n') if line.strip()]
+            pending = []
+
+            def flush():
+                if pending:
+                    paragraph = self._paragraph()
+                    for j, line in enumerate(pending):
+                        if j:
+                            paragraph._p.append(OxmlElement('w:r'))
+                            paragraph._p[-1].append(OxmlElement('w:br'))
+                        self.add_inline(paragraph, line)
+                    pending.clear()
+
+            for line in lines:
+                heading = HEADING_RE.match(line)
+                bullet = BULLET_RE.match(line)
+                numbered = NUMBERED_RE.match(line)
+                if heading:
+                    flush()
+                    self.add_inline(self._paragraph(f"Heading {len(heading.group(1))}"), heading.group(2))
+                elif bullet:
+                    flush()
+                    self.add_inline(self._paragraph('List Bullet'), bullet.group(1))
+                elif numbered:
+                    flush()
+                    self.add_inline(self._paragraph('List Number'), numbered.group(1))
+                else:
+                    pending.append(line)
+            flush()
+
+
+def render_linked_document(linked_article_text):
+    """
+    Build a Word document from article text containing [[anchor text|URL]] links.
+
+    Returns:
+        Document: Word document with hyperlinks
+    """
+    builder = LinkedDocxBuilder()
+    builder.add_text(linked_article_text)
+    return builder.doc
+
+
+def linked_docx_bytes(linked_article_text):
+    """Render linked article text straight to .docx bytes."""
+    buffer = io.BytesIO()
+    render_linked_document(linked_article_text).save(buffer)
+    return buffer.getvalue()
+
+
+def export_linked_zip(articles):
+    """
+    Write many linked articles into one ZIP of .docx files.
+
+    Each document is rendered and written into the archive before the next one is built,
+    so only one document is in memory at a time.
+
+    Args:
+        articles: Iterable of (file_name, linked_article_text) pairs
+
+    Returns:
+        file: Readable file object positioned at the start of the ZIP
+    """
+    archive = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_BYTES)
+    used_names = set()
+
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for file_name, linked_article_text in articles:
+            # Keep every entry; titles can repeat
+            name, suffix = file_name, 1
+            while name in used_names:
+                suffix += 1
+                name = re.sub(r'(\.docx)?$', f'_{suffix}.docx', file_name, count=1)
+            used_names.add(name)
+
+            with zf.open(name, 'w') as entry:
+                render_linked_document(linked_article_text).save(entry)
+
+    archive.seek(0)
+    return archive
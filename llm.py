@@ -0,0 +1,187 @@
+"""
+Shared helpers for Claude calls: prompt building with prompt caching, response caching,
+streaming and usage reporting. Requests that reach the API go through the shared rate
+limiter (see rate_limiter.py), which also takes a slot in the priority pool (scheduler.py)
+and retries throttled or failed attempts.
+"""
+from anthropic.types import Message
+from llm_cache import ResponseCache, request_key
+from rate_limiter import get_rate_limiter
+import os
+import threading
+import time
+
+# Anthropic allows at most 4 cache breakpoints per request
+MAX_CACHE_BREAKPOINTS = 4
+
+# Set LLM_CACHE_DISABLED=1 to bypass the on-disk response cache everywhere
+RESPONSE_CACHE_ENABLED = os.environ.get('LLM_CACHE_DISABLED', '') not in ('1', 'true', 'yes')
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def build_cached_prompt(static_blocks, dynamic_text):
+    """
+    Build user message content with the unchanging context first so it can be prompt-cached.
+
+    Each non-empty static block becomes its own text block ending in a cache breakpoint,
+    so later calls that repeat the same leading blocks are served from the cache. Order
+    blocks from most to least stable (e.g. company brief before the article being edited).
+
+    Args:
+        static_blocks: List of strings that repeat across calls (briefs, article text, sitemap)
+        dynamic_text: The part of the prompt that changes on every call
+
+    Returns:
+        list: Content blocks for a {"role": "user", "content": ...} message
+    """
+    static_blocks = [block for block in static_blocks if block and block.strip()]
+
+    content = []
+    first_breakpoint = len(static_blocks) - MAX_CACHE_BREAKPOINTS
+    for i, block in enumerate(static_blocks):
+        text_block = {"type": "text", "text": block}
+        if i >= first_breakpoint:
+            text_block["cache_control"] = {"type": "ephemeral"}
+        content.append(text_block)
+
+    content.append({"type": "text", "text": dynamic_text})
+    return content
+
+
+def usage_counts(usage):
+    """
+    Pull token counts out of a response's usage object.
+
+    Returns:
+        dict: input_tokens, cache_read_input_tokens, cache_creation_input_tokens, output_tokens
+    """
+    return {
+        'input_tokens': getattr(usage, 'input_tokens', 0) or 0,
+        'cache_read_input_tokens': getattr(usage, 'cache_read_input_tokens', 0) or 0,
+        'cache_creation_input_tokens': getattr(usage, 'cache_creation_input_tokens', 0) or 0,
+        'output_tokens': getattr(usage, 'output_tokens', 0) or 0,
+    }
+
+
+def add_usage(totals, counts):
+    """Accumulate usage_counts() results into a running totals dict."""
+    for key, value in counts.items():
+        totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def format_usage(counts):
+    """
+    Format usage counts for logs: cache hits are tokens read from the cache,
+    misses are uncached input plus tokens written to the cache.
+    """
+    hit = counts.get('cache_read_input_tokens', 0)
+    miss = counts.get('input_tokens', 0) + counts.get('cache_creation_input_tokens', 0)
+    return f"cache hit {hit:,} / miss {miss:,} input tokens, {counts.get('output_tokens', 0):,} output tokens"
+
+
+def get_response_cache():
+    """Return the process-wide on-disk response cache, opening it on first use."""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+        return _response_cache
+
+
+def response_cache_stats():
+    """Hit/miss and token-savings statistics for the response cache (see ResponseCache.stats)."""
+    return get_response_cache().stats()
+
+
+def _cache_lookup(kwargs):
+    cache = get_response_cache()
+    key = request_key(kwargs)
+    data = cache.get(key)
+    if data is None:
+        return key, None
+
+    counts = usage_counts(Message.model_validate(data).usage)
+    cache.record_savings(counts['input_tokens'] + counts['cache_read_input_tokens'] + counts['cache_creation_input_tokens'], counts['output_tokens'])
+
+    # Nothing was billed for this call, so report zero usage to callers' logs
+    data['usage'] = {'input_tokens': 0, 'output_tokens': 0}
+    return key, Message.model_validate(data)
+
+
+def _cache_store(key, message):
+    if hasattr(message, 'model_dump'):
+        get_response_cache().put(key, message.model_dump(mode='json'))
+
+
+def create_message(client, use_cache=True, **kwargs):
+    """
+    Call client.messages.create, serving identical earlier requests from the response cache.
+
+    Args:
+        client: Anthropic client
+        use_cache: Set False to always call the API (the fresh response is still stored)
+        **kwargs: Same arguments as client.messages.create
+
+    Returns:
+        Message: The API response, or the cached one with usage reported as zero
+    """
+    key = None
+    if RESPONSE_CACHE_ENABLED:
+        key, cached = _cache_lookup(kwargs) if use_cache else (request_key(kwargs), None)
+        if cached is not None:
+            return cached
+
+    message = get_rate_limiter().call(lambda: client.messages.create(**kwargs), kwargs)
+
+    if key is not None:
+        _cache_store(key, message)
+    return message
+
+
+def stream_message(client, on_text=None, min_interval=0.1, use_cache=True, **kwargs):
+    """
+    Call Claude with messages.stream, reporting the text received so far as it arrives.
+
+    Args:
+        client: Anthropic client
+        on_text: Optional function called with the accumulated response text
+        min_interval: Minimum seconds between on_text calls (the final text is always reported)
+        use_cache: Set False to always call the API; a cached response is reported in one go
+        **kwargs: Same arguments as client.messages.create
+
+    Returns:
+        Message: The final message, same shape as client.messages.create returns
+    """
+    key = None
+    if RESPONSE_CACHE_ENABLED:
+        key, cached = _cache_lookup(kwargs) if use_cache else (request_key(kwargs), None)
+        if cached is not None:
+            if on_text:
+                on_text(''.join(block.text for block in cached.content if block.type == 'text'))
+            return cached
+
+    chunks = []
+
+    def send():
+        # A retried attempt starts the text over
+        chunks.clear()
+        last_report = 0.0
+        with client.messages.stream(**kwargs) as stream:
+            for chunk in stream.text_stream:
+                chunks.append(chunk)
+                if on_text and time.monotonic() - last_report >= min_interval:
+                    on_text(''.join(chunks))
+                    last_report = time.monotonic()
+            return stream.get_final_message()
+
+    message = get_rate_limiter().call(send, kwargs)
+
+    if on_text:
+        on_text(''.join(chunks))
+
+    if key is not None:
+        _cache_store(key, message)
+    return message
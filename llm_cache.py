@@ -0,0 +1,146 @@
+"""
+Persistent, content-addressed cache of Claude responses.
+
+Responses are stored in SQLite keyed by a hash of the full request (model, prompt and
+parameters), so rerunning the same brief after a crash or a Streamlit rerun costs nothing.
+Entries expire after a TTL and the least recently used ones are evicted once the cache
+grows past its size limit.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    'LLM_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'llm_responses.sqlite')
+)
+DEFAULT_MAX_BYTES = int(float(os.environ.get('LLM_CACHE_MAX_MB', '200')) * 1024 * 1024)
+DEFAULT_TTL_SECONDS = int(float(os.environ.get('LLM_CACHE_TTL_DAYS', '7')) * 86400)
+
+
+# Request options that don't change the response
+IGNORED_REQUEST_KEYS = ('timeout',)
+
+
+def request_key(request):
+    """Hash a messages.create request (model, messages, max_tokens, ...) into a cache key."""
+    request = {key: value for key, value in request.items() if key not in IGNORED_REQUEST_KEYS}
+    payload = json.dumps(request, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-backed LRU cache with TTL. Safe to share between threads.
+
+    Values are JSON-serializable dicts (e.g. Message.model_dump()).
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'expired': 0, 'saved_input_tokens': 0, 'saved_output_tokens': 0}
+
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.conn.commit()
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss or expired entry."""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.counters['misses'] += 1
+                return None
+
+            value, created = row
+            if self.ttl_seconds and now - created > self.ttl_seconds:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.conn.commit()
+                self.counters['expired'] += 1
+                self.counters['misses'] += 1
+                return None
+
+            self.conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.counters['hits'] += 1
+
+        return json.loads(value)
+
+    def put(self, key, value):
+        """Store value under key, evicting least recently used entries if over the size limit."""
+        data = json.dumps(value, separators=(',', ':'))
+        size = len(data.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, data, size, now, now)
+            )
+            self.counters['stores'] += 1
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Walk from least recently used until back under the limit
+        victims = []
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY last_used ASC"):
+            if total <= self.max_bytes:
+                break
+            victims.append((key,))
+            total -= size
+
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+        self.counters['evictions'] += len(victims)
+
+    def record_savings(self, input_tokens, output_tokens):
+        """Count tokens a cache hit avoided paying for."""
+        with self.lock:
+            self.counters['saved_input_tokens'] += input_tokens
+            self.counters['saved_output_tokens'] += output_tokens
+
+    def clear(self):
+        """Delete every cached response."""
+        with self.lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+
+    def stats(self):
+        """
+        Returns:
+            dict: hits, misses, hit_rate, stores, evictions, expired, saved_input_tokens,
+                saved_output_tokens, entries, bytes
+        """
+        with self.lock:
+            entries, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            stats = dict(self.counters)
+
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['entries'] = entries
+        stats['bytes'] = total
+        return stats
@@ -0,0 +1,109 @@
+"""
+Per-step model routing for Claude calls.
+
+Each pipeline step (writing a section, placing links, filtering refresh gaps, ...) maps to
+a model, a max_tokens value and a request timeout. Mechanical steps that only sort,
+dedupe or pick from a list run on a fast model; steps that write content stay on the
+writing model.
+
+The defaults below can be changed for the whole deployment with a JSON file
+(MODEL_ROUTES_PATH, default model_routes.json next to this module) and per client with
+the client's 'model_routes' entry, both shaped like {"step": {"model": ..., "max_tokens": ...}}.
+Keys left out fall back to the next level.
+"""
+import json
+import os
+
+WRITER_MODEL = os.environ.get('WRITER_MODEL', 'claude-sonnet-4-20250514')
+FAST_MODEL = os.environ.get('FAST_MODEL', 'claude-haiku-4-5-20251001')
+
+DEFAULT_ROUTES = {
+    # Manage Clients: condensing company / ICP briefs (brief_digest.py)
+    'brief_digest': {'model': WRITER_MODEL, 'max_tokens': 3000, 'timeout': 300},
+    # Content Briefs
+    'brief_dedup': {'model': FAST_MODEL, 'max_tokens': 4000, 'timeout': 120},
+    'brief_structure': {'model': WRITER_MODEL, 'max_tokens': 4000, 'timeout': 180},
+    'brief_guidelines': {'model': WRITER_MODEL, 'max_tokens': 8000, 'timeout': 300},
+    # Generate Articles (also the Message Batches path, which ignores the timeout)
+    'section': {'model': WRITER_MODEL, 'max_tokens': 4000, 'timeout': 300},
+    # Add Internal Links: edit list vs. echoing the whole linked article
+    'link_placement': {'model': FAST_MODEL, 'max_tokens': 2000, 'timeout': 120},
+    'link_rewrite': {'model': WRITER_MODEL, 'max_tokens': 8000, 'timeout': 300},
+    # Content Refresh
+    'refresh_priorities': {'model': FAST_MODEL, 'max_tokens': 3000, 'timeout': 120},
+    'refresh_recommendations': {'model': WRITER_MODEL, 'max_tokens': 5000, 'timeout': 300},
+    # AI Editor
+    'editor': {'model': WRITER_MODEL, 'max_tokens': 8000, 'timeout': 300},
+}
+
+ROUTE_KEYS = {'model': str, 'max_tokens': int, 'timeout': (int, float)}
+
+ROUTES_PATH = os.environ.get(
+    'MODEL_ROUTES_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model_routes.json')
+)
+
+_file_routes = None
+
+
+def validate_routes(routes):
+    """
+    Check a routing table (full or partial).
+
+    Raises:
+        Exception: For unknown steps or keys, or values of the wrong type
+    """
+    if not isinstance(routes, dict):
+        raise Exception("Model routes must be a JSON object of step -> settings")
+    for step, settings in routes.items():
+        if step not in DEFAULT_ROUTES:
+            raise Exception(f"Unknown step '{step}' (known steps: {', '.join(DEFAULT_ROUTES)})")
+        if not isinstance(settings, dict):
+            raise Exception(f"Settings for '{step}' must be an object")
+        for key, value in settings.items():
+            if key not in ROUTE_KEYS:
+                raise Exception(f"Unknown setting '{key}' for '{step}' (use model, max_tokens, timeout)")
+            if not isinstance(value, ROUTE_KEYS[key]) or isinstance(value, bool):
+                raise Exception(f"'{key}' for '{step}' has the wrong type")
+            if key != 'model' and value <= 0:
+                raise Exception(f"'{key}' for '{step}' must be positive")
+    return routes
+
+
+def parse_routes(text):
+    """Parse and validate routes entered as JSON text; empty text means no overrides."""
+    if not text.strip():
+        return {}
+    try:
+        routes = json.loads(text)
+    except ValueError as e:
+        raise Exception(f"Model routes are not valid JSON: {str(e)}")
+    return validate_routes(routes)
+
+
+def file_routes():
+    """Deployment-wide overrides from ROUTES_PATH (read once)."""
+    global _file_routes
+    if _file_routes is None:
+        _file_routes = {}
+        if os.path.exists(ROUTES_PATH):
+            with open(ROUTES_PATH, 'r', encoding='utf-8') as f:
+                _file_routes = validate_routes(json.load(f))
+    return _file_routes
+
+
+def get_route(step, client_routes=None):
+    """
+    Resolve the settings for one step.
+
+    Args:
+        step: Key of DEFAULT_ROUTES
+        client_routes: The client's 'model_routes' overrides, if any
+
+    Returns:
+        dict: model, max_tokens, timeout (can be passed straight to create_message)
+    """
+    route = dict(DEFAULT_ROUTES[step])
+    route.update(file_routes().get(step, {}))
+    route.update((client_routes or {}).get(step, {}))
+    return route
@@ -0,0 +1,159 @@
+"""
+Markdown outline extraction.
+
+One pass over the text finds every heading and the size of the section under it, so
+scraped competitor pages and our own articles are measured once and the result reused
+(the scrape cache stores it alongside the page). Recognizes ATX headings (# to ######,
+with optional closing #s), setext headings (underlined with === or ---), and headings
+whose text is wrapped in emphasis or links, e.g. "## **Pricing**" or "**## Pricing**".
+Fenced code blocks are skipped.
+"""
+import re
+
+ATX_RE = re.compile(r'^ {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$')
+SETEXT_RE = re.compile(r'^ {0,3}(=+|-+)[ \t]*$')
+FENCE_RE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+# "**## Heading**" as produced by some HTML-to-markdown converters
+WRAPPED_ATX_RE = re.compile(r'^ {0,3}(\*\*|__|\*|_)(#{1,6})[ \t]+(.*?)\1[ \t]*$')
+LIST_OR_QUOTE_RE = re.compile(r'^ {0,3}([-*+>]|\d+[.)])[ \t]')
+# First characters a heading, setext underline or fence can start with; other lines skip the regexes
+MARKER_CHARS = frozenset('#*_=-`~')
+
+
+def clean_heading(text):
+    """Heading text without emphasis markers, link targets or trailing anchors."""
+    text = re.sub(r'!?\[([^\]]*)\]\([^)]*\)', r'\1', text)
+    text = re.sub(r'(\*\*|__|\*|_|`)(.+?)\1', r'\2', text)
+    text = text.strip().strip('*_').strip()
+    return re.sub(r'\s+', ' ', text)
+
+
+def extract_outline(markdown):
+    """
+    Find the headings and section sizes of a markdown document in a single pass.
+
+    Args:
+        markdown: Markdown text
+
+    Returns:
+        dict: 'words' (total whitespace-separated words), 'intro_words' (words before the first heading)
+            and 'sections', a list of dicts in document order with:
+            - 'level' (1-6) and 'title'
+            - 'start' / 'end': character offsets of the heading line and of the end of the
+              section's own text (the next heading of any level)
+            - 'subtree_end': end offset including subsections (next heading of the same or
+              higher level)
+            - 'words': words in the section's own text; 'subtree_words' includes subsections
+    """
+    sections = []
+    intro_words = 0
+    total_words = 0
+    in_fence = None
+
+    # Line above, for setext headings: (start offset, text, word count) if it could be one,
+    # None after a blank line or heading, False otherwise
+    previous = None
+    offset = 0
+
+    for line in markdown.splitlines(keepends=True):
+        line_start = offset
+        offset += len(line)
+        text = line.rstrip('\r\n')
+
+        first = text.lstrip(' ')[:1]
+        fence = FENCE_RE.match(text) if first in ('`', '~') else None
+        if in_fence:
+            if fence and fence.group(1)[0] == in_fence[0] and len(fence.group(1)) >= len(in_fence):
+                in_fence = None
+            words = len(text.split())
+            total_words += words
+            if sections:
+                sections[-1]['words'] += words
+            else:
+                intro_words += words
+            previous = None
+            continue
+        if fence:
+            in_fence = fence.group(1)
+            previous = None
+            continue
+
+        heading = None
+        atx = wrapped = setext = None
+        if first in MARKER_CHARS:
+            atx = ATX_RE.match(text) if first == '#' else None
+            wrapped = WRAPPED_ATX_RE.match(text) if first in ('*', '_') else None
+            setext = SETEXT_RE.match(text) if previous and first in ('=', '-') else None
+
+        if atx:
+            heading = (len(atx.group(1)), atx.group(2) or '', line_start)
+        elif wrapped:
+            heading = (len(wrapped.group(2)), wrapped.group(3), line_start)
+        elif setext:
+            # The underlined line was counted as body text; move it into the heading
+            heading_start, heading_text, heading_words = previous
+            level = 1 if setext.group(1)[0] == '=' else 2
+            total_words -= heading_words
+            if sections:
+                sections[-1]['words'] -= heading_words
+                sections[-1]['end'] = heading_start
+            else:
+                intro_words -= heading_words
+            heading = (level, heading_text, heading_start)
+
+        if heading:
+            level, title, start = heading
+            title = clean_heading(title)
+            if title:
+                if sections and sections[-1]['end'] is None:
+                    sections[-1]['end'] = start
+                sections.append({'level': level, 'title': title, 'start': start, 'end': None, 'words': 0})
+            previous = None
+            continue
+
+        words = len(text.split())
+        total_words += words
+        if sections:
+            sections[-1]['words'] += words
+        else:
+            intro_words += words
+
+        # Only a single-line paragraph directly above can become a setext heading
+        if not words:
+            previous = None
+        elif previous is None and not LIST_OR_QUOTE_RE.match(text):
+            previous = (line_start, text.strip(), words)
+        else:
+            previous = False
+
+    if sections and sections[-1]['end'] is None:
+        sections[-1]['end'] = len(markdown)
+
+    _add_subtrees(sections, len(markdown))
+
+    return {'words': total_words, 'intro_words': intro_words, 'sections': sections}
+
+
+def _add_subtrees(sections, text_length):
+    # Sections still open at each point, outermost first (at most six deep)
+    open_sections = []
+    for section in sections:
+        while open_sections and open_sections[-1]['level'] >= section['level']:
+            open_sections.pop()['subtree_end'] = section['start']
+        for parent in open_sections:
+            parent['subtree_words'] += section['words']
+        section['subtree_words'] = section['words']
+        open_sections.append(section)
+
+    for section in open_sections:
+        section['subtree_end'] = text_length
+
+
+def outline_headers(outline, levels=(2, 3)):
+    """
+    Heading lines of an outline in markdown form.
+
+    Returns:
+        list: e.g. ['## Pricing', '### Plans'] for the requested levels
+    """
+    return [f"{'#' * section['level']} {section['title']}" for section in outline['sections'] if section['level'] in levels]
@@ -0,0 +1,288 @@
+"""
+Process-wide rate limiting and retries for Claude requests.
+
+Every request made through llm.create_message / stream_message passes through one
+RateLimiter:
+- Token buckets for requests, input tokens and output tokens per minute, set to our
+  Anthropic limits (ANTHROPIC_RPM / ANTHROPIC_ITPM / ANTHROPIC_OTPM). A request reserves
+  its estimated input tokens and its max_tokens up front; the difference from the real
+  usage is returned to the buckets when it finishes.
+- Retries on 429 / 529 / 5xx / connection errors with exponential backoff and full
+  jitter, waiting at least as long as the retry-after header asks. Errors sent as events
+  in the middle of a stream (status 200) are classified by their error type, and broken
+  connections while reading a stream are retried too.
+- Adaptive concurrency: throttling halves the number of requests allowed in flight (the
+  scheduler's slot pool), and a run of successes raises it again one step at a time up
+  to LLM_MAX_CONCURRENT.
+Counters record how much time was spent throttled or waiting on the buckets.
+"""
+from scheduler import get_llm_slots
+import anthropic
+import httpx
+import json
+import os
+import random
+import threading
+import time
+
+# Anthropic rate limits for our organization (per minute)
+REQUESTS_PER_MINUTE = int(os.environ.get('ANTHROPIC_RPM', '1000'))
+INPUT_TOKENS_PER_MINUTE = int(os.environ.get('ANTHROPIC_ITPM', '450000'))
+OUTPUT_TOKENS_PER_MINUTE = int(os.environ.get('ANTHROPIC_OTPM', '90000'))
+
+MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', '6'))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+# Successful requests in a row before concurrency is raised by one
+INCREASE_AFTER = 20
+# Throttles within this many seconds of a decrease don't halve concurrency again
+DECREASE_COOLDOWN = 5.0
+
+# Rough characters per token, for estimating a request's input size before sending it
+CHARS_PER_TOKEN = 4
+
+# 429 rate limited, 529 overloaded, other server errors
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504, 529)
+# The same conditions as error types, for errors that arrive as stream events
+THROTTLE_ERROR_TYPES = ('rate_limit_error', 'overloaded_error')
+RETRYABLE_ERROR_TYPES = THROTTLE_ERROR_TYPES + ('api_error',)
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+class TokenBucket:
+    """
+    Continuously refilling bucket holding up to one minute's allowance.
+
+    take() waits until the amount is available. A request larger than the whole bucket
+    is let through once the bucket is full, leaving it in debt.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, amount):
+        """Remove amount from the bucket, waiting as needed. Returns seconds waited."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                needed = min(amount, self.capacity)
+                if self.tokens >= needed:
+                    self.tokens -= amount
+                    return waited
+                delay = (needed - self.tokens) / self.rate
+            delay = min(delay, 1.0)
+            time.sleep(delay)
+            waited += delay
+
+    def give_back(self, amount):
+        """Return unused reservation (a negative amount charges extra usage)."""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD control of the scheduler's slot pool: halve on throttling, add one after a run of successes.
+    """
+
+    def __init__(self, slots, max_limit=None, increase_after=INCREASE_AFTER, cooldown=DECREASE_COOLDOWN):
+        self.slots = slots
+        # Never above the limit the pool was configured with
+        self.max_limit = max_limit or slots.limit
+        self.increase_after = increase_after
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.successes = 0
+        self.last_decrease = 0.0
+        self.counters = {'decreases': 0, 'increases': 0}
+
+    def on_success(self):
+        with self.lock:
+            self.successes += 1
+            if self.successes >= self.increase_after and self.slots.limit < self.max_limit:
+                self.slots.set_limit(self.slots.limit + 1)
+                self.successes = 0
+                self.counters['increases'] += 1
+
+    def on_throttle(self):
+        with self.lock:
+            self.successes = 0
+            now = time.monotonic()
+            # Requests already in flight when the limit was hit fail together; count them once
+            if now - self.last_decrease < self.cooldown:
+                return
+            self.last_decrease = now
+            if self.slots.limit > 1:
+                self.slots.set_limit(max(1, self.slots.limit // 2))
+                self.counters['decreases'] += 1
+
+
+def estimate_input_tokens(request):
+    """Rough input token count of a messages.create request (system, messages and tools)."""
+    parts = [request.get('system', ''), request.get('messages', []), request.get('tools', [])]
+    return len(json.dumps(parts, default=str)) // CHARS_PER_TOKEN
+
+
+def retry_after_seconds(error):
+    """Wait requested by an API error's retry-after headers, or None."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except ValueError:
+        return None
+    return None
+
+
+def error_type(error):
+    """The API error type (e.g. 'overloaded_error') from an error's body, or None."""
+    body = getattr(error, 'body', None)
+    if not isinstance(body, dict):
+        return None
+    details = body.get('error', body)
+    return details.get('type') if isinstance(details, dict) else None
+
+
+def is_retryable(error):
+    """
+    True for connection errors, timeouts, the status codes in RETRYABLE_STATUS_CODES and
+    the error types in RETRYABLE_ERROR_TYPES (mid-stream error events have status 200).
+    """
+    if isinstance(error, (anthropic.APIConnectionError, httpx.TransportError)):
+        return True
+    return getattr(error, 'status_code', None) in RETRYABLE_STATUS_CODES or error_type(error) in RETRYABLE_ERROR_TYPES
+
+
+def is_throttle(error):
+    """True for 429 (rate limited) and 529 (overloaded) responses and the matching stream errors."""
+    return getattr(error, 'status_code', None) in (429, 529) or error_type(error) in THROTTLE_ERROR_TYPES
+
+
+class RateLimiter:
+    """
+    Token buckets, retries and adaptive concurrency around Claude requests. Safe to share between threads.
+    """
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, input_tokens_per_minute=INPUT_TOKENS_PER_MINUTE,
+                 output_tokens_per_minute=OUTPUT_TOKENS_PER_MINUTE, max_retries=MAX_RETRIES, slots=None):
+        self.requests = TokenBucket(requests_per_minute)
+        self.input_tokens = TokenBucket(input_tokens_per_minute)
+        self.output_tokens = TokenBucket(output_tokens_per_minute)
+        self.max_retries = max_retries
+        self.slots = slots or get_llm_slots()
+        self.concurrency = AdaptiveConcurrency(self.slots)
+        self.lock = threading.Lock()
+        self.counters = {
+            'requests': 0,
+            'throttled': 0,
+            'retries': 0,
+            'failed': 0,
+            'backoff_seconds': 0.0,
+            'bucket_wait_seconds': 0.0
+        }
+
+    def _count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def call(self, send, request):
+        """
+        Send a request with rate limiting and retries.
+
+        Args:
+            send: Function making the API call and returning the Message
+            request: The messages.create arguments (used to estimate its token cost)
+
+        Returns:
+            Message: The response of the first successful attempt
+        """
+        input_estimate = estimate_input_tokens(request)
+        output_reserve = int(request.get('max_tokens', 0))
+
+        for attempt in range(self.max_retries + 1):
+            with self.slots.slot():
+                waited = self.requests.take(1)
+                waited += self.input_tokens.take(input_estimate)
+                waited += self.output_tokens.take(output_reserve)
+                if waited:
+                    self._count('bucket_wait_seconds', waited)
+
+                self._count('requests')
+                try:
+                    message = send()
+                except (anthropic.APIError, httpx.TransportError) as e:
+                    if not is_retryable(e):
+                        raise
+                    error = e
+                else:
+                    usage = getattr(message, 'usage', None)
+                    actual_input = (getattr(usage, 'input_tokens', 0) or 0) + (getattr(usage, 'cache_creation_input_tokens', 0) or 0)
+                    self.input_tokens.give_back(input_estimate - actual_input)
+                    self.output_tokens.give_back(output_reserve - (getattr(usage, 'output_tokens', 0) or 0))
+                    self.concurrency.on_success()
+                    return message
+
+            # Failed attempts still count against the request bucket, but not against the token buckets
+            self.input_tokens.give_back(input_estimate)
+            self.output_tokens.give_back(output_reserve)
+
+            if is_throttle(error):
+                self._count('throttled')
+                self.concurrency.on_throttle()
+            if attempt == self.max_retries:
+                self._count('failed')
+                raise error
+
+            # Full jitter, but never sooner than the server asked
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+            retry_after = retry_after_seconds(error)
+            if retry_after is not None:
+                delay = max(delay, retry_after + random.uniform(0, BACKOFF_BASE))
+            self._count('retries')
+            self._count('backoff_seconds', delay)
+            time.sleep(delay)
+
+    def stats(self):
+        """
+        Returns:
+            dict: requests, throttled, retries, failed, backoff_seconds, bucket_wait_seconds,
+                concurrency_limit, concurrency_decreases, concurrency_increases
+        """
+        with self.lock:
+            stats = dict(self.counters)
+        stats['concurrency_limit'] = self.slots.limit
+        stats['concurrency_decreases'] = self.concurrency.counters['decreases']
+        stats['concurrency_increases'] = self.concurrency.counters['increases']
+        return stats
+
+
+def get_rate_limiter():
+    """Return the process-wide rate limiter."""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter()
+        return _rate_limiter
+
+
+def rate_limit_stats():
+    """Throttling and retry statistics (see RateLimiter.stats)."""
+    return get_rate_limiter().stats()
@@ -0,0 +1,180 @@
+"""
+Priority and fair-share scheduling for shared Claude capacity.
+
+Two levels:
+- Jobs: the job store picks the next queued job by priority class, then by how many jobs
+  each user (and each of that user's clients) already has running, so one writer queuing
+  40 articles doesn't block everyone else (see pick_next_job).
+- Calls: every Claude request made in this process takes a slot from one global pool
+  (LLM_MAX_CONCURRENT) sized to our Anthropic rate limits. Waiting interactive calls
+  (editor, research, refresh) get the next free slot before bulk generation calls.
+
+The priority of a call comes from the surrounding priority_class() block; calls outside
+one are interactive.
+"""
+from collections import deque
+from contextlib import contextmanager
+import contextvars
+import os
+import threading
+import time
+
+# Highest priority first
+PRIORITY_CLASSES = ('interactive', 'bulk')
+DEFAULT_PRIORITY = 'interactive'
+
+# Claude requests in flight at once across the whole process
+LLM_MAX_CONCURRENT = int(os.environ.get('LLM_MAX_CONCURRENT', '8'))
+# Queued bulk jobs waiting longer than this are scheduled like interactive ones
+PRIORITY_AGING_SECONDS = float(os.environ.get('JOB_PRIORITY_AGING_SECONDS', '900'))
+
+_current_priority = contextvars.ContextVar('llm_priority', default=DEFAULT_PRIORITY)
+
+_llm_slots = None
+_llm_slots_lock = threading.Lock()
+
+
+@contextmanager
+def priority_class(priority):
+    """Run the enclosed Claude calls with the given priority class ('interactive' or 'bulk')."""
+    if priority not in PRIORITY_CLASSES:
+        raise Exception(f"Unknown priority class: {priority}")
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def current_priority():
+    return _current_priority.get()
+
+
+def pick_next_job(queued, running, last_started, now=None, aging_seconds=PRIORITY_AGING_SECONDS):
+    """
+    Choose which queued job to start.
+
+    Order: priority class (bulk jobs that waited past aging_seconds count as interactive),
+    then fewest running jobs for the user, then fewest for the user's client, then the user
+    served longest ago, then the oldest job.
+
+    Args:
+        queued: Oldest queued job per (priority, user, client) group, as dicts with
+            'id', 'priority', 'user', 'client' and 'created'
+        running: Dict of (user, client) -> number of running jobs
+        last_started: Dict of user -> time their latest job started
+        now: Current time (defaults to time.time())
+        aging_seconds: Wait after which a bulk job is promoted
+
+    Returns:
+        dict: The chosen entry of queued, or None if it is empty
+    """
+    now = time.time() if now is None else now
+    running_by_user = {}
+    for (user, _), count in running.items():
+        running_by_user[user] = running_by_user.get(user, 0) + count
+
+    def rank(job):
+        priority = PRIORITY_CLASSES.index(job['priority']) if job['priority'] in PRIORITY_CLASSES else len(PRIORITY_CLASSES)
+        if now - job['created'] >= aging_seconds:
+            priority = 0
+        return (
+            priority,
+            running_by_user.get(job['user'], 0),
+            running.get((job['user'], job['client']), 0),
+            last_started.get(job['user']) or 0.0,
+            job['id']
+        )
+
+    return min(queued, key=rank, default=None)
+
+
+class PrioritySlots:
+    """
+    Counting semaphore whose waiters are served by priority class, first come first served within a class.
+
+    The limit can be changed while in use; waiters are woken when it grows.
+    """
+
+    def __init__(self, limit=LLM_MAX_CONCURRENT):
+        self.limit = limit
+        self.in_use = 0
+        self.condition = threading.Condition()
+        self.waiting = {priority: deque() for priority in PRIORITY_CLASSES}
+        self.counters = {priority: {'acquired': 0, 'waited': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0} for priority in PRIORITY_CLASSES}
+
+    def _next_ticket(self):
+        for priority in PRIORITY_CLASSES:
+            if self.waiting[priority]:
+                return self.waiting[priority][0]
+        return None
+
+    def acquire(self, priority=None):
+        priority = priority or current_priority()
+        ticket = object()
+        start = time.monotonic()
+        with self.condition:
+            self.waiting[priority].append(ticket)
+            while self.in_use >= self.limit or self._next_ticket() is not ticket:
+                self.condition.wait()
+            self.waiting[priority].popleft()
+            self.in_use += 1
+
+            waited = time.monotonic() - start
+            counters = self.counters[priority]
+            counters['acquired'] += 1
+            if waited > 0.01:
+                counters['waited'] += 1
+            counters['wait_seconds'] += waited
+            counters['max_wait_seconds'] = max(counters['max_wait_seconds'], waited)
+            # The next waiter may fit as well
+            self.condition.notify_all()
+
+    def release(self):
+        with self.condition:
+            self.in_use -= 1
+            self.condition.notify_all()
+
+    def set_limit(self, limit):
+        with self.condition:
+            self.limit = max(1, limit)
+            self.condition.notify_all()
+
+    @contextmanager
+    def slot(self, priority=None):
+        """Hold one slot for the enclosed block."""
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        """
+        Returns:
+            dict: limit, in_use, waiting (per class) and per-class counters with average wait
+        """
+        with self.condition:
+            stats = {
+                'limit': self.limit,
+                'in_use': self.in_use,
+                'waiting': {priority: len(queue) for priority, queue in self.waiting.items()}
+            }
+            for priority, counters in self.counters.items():
+                stats[priority] = dict(counters)
+                stats[priority]['avg_wait_seconds'] = counters['wait_seconds'] / counters['acquired'] if counters['acquired'] else 0.0
+        return stats
+
+
+def get_llm_slots():
+    """Return the process-wide pool of Claude request slots."""
+    global _llm_slots
+    with _llm_slots_lock:
+        if _llm_slots is None:
+            _llm_slots = PrioritySlots()
+        return _llm_slots
+
+
+def llm_slot_stats():
+    """Usage and wait statistics of the Claude request slots (see PrioritySlots.stats)."""
+    return get_llm_slots().stats()
@@ -0,0 +1,211 @@
+"""
+Persistent cache of scraped competitor pages.
+
+Scraped markdown and its outline (headings and section sizes) are stored in SQLite keyed by a normalized URL,
+so the same competitor page is only paid for once across keywords, clients, Content
+Briefs and Content Refresh. Entries expire after a TTL; when an expired page is scraped
+again its content hash tells whether it actually changed. The least recently used pages
+are evicted once the cache grows past its size limit.
+"""
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    'SCRAPE_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'scrapes.sqlite')
+)
+DEFAULT_MAX_BYTES = int(float(os.environ.get('SCRAPE_CACHE_MAX_MB', '500')) * 1024 * 1024)
+DEFAULT_TTL_SECONDS = int(float(os.environ.get('SCRAPE_CACHE_TTL_DAYS', '14')) * 86400)
+SCRAPE_CACHE_ENABLED = os.environ.get('SCRAPE_CACHE_DISABLED', '') not in ('1', 'true', 'yes')
+
+# Query parameters that never change page content
+TRACKING_PARAMS = {'gclid', 'fbclid', 'msclkid', 'mc_cid', 'mc_eid', 'ref', '_hsenc', '_hsmi'}
+
+_scrape_cache = None
+_scrape_cache_lock = threading.Lock()
+
+
+def normalize_url(url):
+    """
+    Canonical form of a URL for cache keys.
+
+    Lowercases scheme and host, drops www., default ports, fragments, tracking parameters
+    and trailing slashes, and sorts the remaining query parameters.
+    """
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or 'https').lower()
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if parts.port and (scheme, parts.port) not in (('http', 80), ('https', 443)):
+        host = f"{host}:{parts.port}"
+
+    path = parts.path.rstrip('/') or '/'
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith('utm_')
+    )
+    return urlunsplit((scheme, host, path, urlencode(query), ''))
+
+
+def content_hash(markdown):
+    return hashlib.sha256(markdown.encode('utf-8')).hexdigest()
+
+
+class ScrapeCache:
+    """
+    SQLite-backed LRU cache of scraped pages with TTL. Safe to share between threads.
+
+    Each entry holds the page markdown, its outline and a hash of the markdown.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'expired': 0, 'changed': 0, 'unchanged': 0}
+
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        # Caches written before outlines were stored only had header lists; start those over
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(pages)")]
+        if columns and 'outline' not in columns:
+            self.conn.execute("DROP TABLE pages")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                markdown TEXT NOT NULL,
+                outline TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                fetched REAL NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used)")
+        self.conn.commit()
+
+    def get(self, url):
+        """
+        Return the cached page for url, or None on a miss or expired entry.
+
+        Returns:
+            dict: 'url', 'markdown', 'outline', 'content_hash' and 'fetched'
+        """
+        key = normalize_url(url)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT url, markdown, outline, content_hash, fetched FROM pages WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.counters['misses'] += 1
+                return None
+
+            cached_url, markdown, outline, digest, fetched = row
+            # Expired rows are kept until re-scraped so put() can tell whether the page changed
+            if self.ttl_seconds and now - fetched > self.ttl_seconds:
+                self.counters['expired'] += 1
+                self.counters['misses'] += 1
+                return None
+
+            self.conn.execute("UPDATE pages SET last_used = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.counters['hits'] += 1
+
+        return {'url': cached_url, 'markdown': markdown, 'outline': json.loads(outline), 'content_hash': digest, 'fetched': fetched}
+
+    def put(self, url, markdown, outline):
+        """
+        Store a freshly scraped page, evicting least recently used pages if over the size limit.
+
+        Returns:
+            bool or None: Whether the content differs from the previously cached copy
+                (None if the page was not cached before)
+        """
+        key = normalize_url(url)
+        digest = content_hash(markdown)
+        outline_json = json.dumps(outline)
+        size = len(markdown.encode('utf-8')) + len(outline_json.encode('utf-8'))
+        now = time.time()
+
+        with self.lock:
+            previous = self.conn.execute("SELECT content_hash FROM pages WHERE key = ?", (key,)).fetchone()
+            changed = None
+            if previous is not None:
+                changed = previous[0] != digest
+                self.counters['changed' if changed else 'unchanged'] += 1
+
+            if size > self.max_bytes:
+                return changed
+
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (key, url, markdown, outline, content_hash, size, fetched, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, markdown, outline_json, digest, size, now, now)
+            )
+            self.counters['stores'] += 1
+            self._evict()
+            self.conn.commit()
+
+        return changed
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Walk from least recently used until back under the limit
+        victims = []
+        for key, size in self.conn.execute("SELECT key, size FROM pages ORDER BY last_used ASC"):
+            if total <= self.max_bytes:
+                break
+            victims.append((key,))
+            total -= size
+
+        self.conn.executemany("DELETE FROM pages WHERE key = ?", victims)
+        self.counters['evictions'] += len(victims)
+
+    def clear(self):
+        """Delete every cached page."""
+        with self.lock:
+            self.conn.execute("DELETE FROM pages")
+            self.conn.commit()
+
+    def stats(self):
+        """
+        Returns:
+            dict: hits, misses, hit_rate, stores, evictions, expired, changed, unchanged,
+                entries, bytes
+        """
+        with self.lock:
+            entries, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages").fetchone()
+            stats = dict(self.counters)
+
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['entries'] = entries
+        stats['bytes'] = total
+        return stats
+
+
+def get_scrape_cache():
+    """Return the process-wide on-disk scrape cache, opening it on first use."""
+    global _scrape_cache
+    with _scrape_cache_lock:
+        if _scrape_cache is None:
+            _scrape_cache = ScrapeCache()
+        return _scrape_cache
+
+
+def scrape_cache_stats():
+    """Hit/miss statistics for the scrape cache (see ScrapeCache.stats)."""
+    return get_scrape_cache().stats()
@@ -0,0 +1,162 @@
+"""
+Concurrent competitor scraping shared by Content Briefs and Content Refresh.
+
+URLs are scraped with FireCrawl in parallel (bounded overall and per domain, so one site
+never gets more than a couple of simultaneous requests), each with its own timeout.
+Results come back in the order the URLs were given (SERP rank), while progress is
+reported as each page finishes, so research takes about as long as the slowest page.
+Pages are read through the on-disk scrape cache (see scrape_cache.py).
+"""
+from api_clients import get_firecrawl_client
+from scrape_cache import get_scrape_cache, SCRAPE_CACHE_ENABLED
+from outline import extract_outline, outline_headers
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urlsplit
+import os
+import threading
+import time
+
+SCRAPE_WORKERS = int(os.environ.get('SCRAPE_WORKERS', '8'))
+# Simultaneous requests to any one domain
+SCRAPE_PER_DOMAIN = int(os.environ.get('SCRAPE_PER_DOMAIN', '2'))
+# Seconds one page may take once its scrape has started
+SCRAPE_TIMEOUT = float(os.environ.get('SCRAPE_TIMEOUT', '60'))
+# Extra seconds to wait for FireCrawl to give up on its own before abandoning a page
+TIMEOUT_GRACE = 5
+
+
+def url_domain(url):
+    """Host of a URL without a leading www., e.g. https://www.example.com/a -> example.com."""
+    host = urlsplit(url).netloc.lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+class DomainLimiter:
+    """Per-domain semaphores limiting simultaneous requests to the same site."""
+
+    def __init__(self, per_domain=SCRAPE_PER_DOMAIN):
+        self.per_domain = per_domain
+        self.semaphores = {}
+        self.lock = threading.Lock()
+
+    def slot(self, url):
+        domain = url_domain(url)
+        with self.lock:
+            if domain not in self.semaphores:
+                self.semaphores[domain] = threading.BoundedSemaphore(self.per_domain)
+            return self.semaphores[domain]
+
+
+def scrape_markdown(firecrawl, url, timeout=SCRAPE_TIMEOUT):
+    """
+    Scrape one page with FireCrawl.
+
+    Returns:
+        str: Page markdown
+
+    Raises:
+        Exception: If the scrape fails or returns no markdown
+    """
+    result = firecrawl.scrape(url, timeout=int(timeout * 1000))
+    markdown = result.markdown if hasattr(result, 'markdown') else ''
+    if not markdown:
+        raise Exception("No markdown content returned")
+    return markdown
+
+
+def scrape_urls(urls, firecrawl_key, max_workers=SCRAPE_WORKERS, per_domain=SCRAPE_PER_DOMAIN, timeout=SCRAPE_TIMEOUT, progress_callback=None, use_cache=True):
+    """
+    Scrape several URLs concurrently, serving repeat URLs from the scrape cache.
+
+    Args:
+        urls: URLs in SERP rank order
+        firecrawl_key: FireCrawl API key
+        max_workers: Pages scraped at the same time
+        per_domain: Pages scraped at the same time from one domain
+        timeout: Seconds allowed per page
+        progress_callback: Optional function called with progress text as each page finishes
+            (always from the calling thread)
+        use_cache: Read and update the on-disk scrape cache
+
+    Returns:
+        list: One dict per URL, in the given order, with 'url', 'markdown' ('' on failure),
+            'outline' (see outline.extract_outline), 'headers' (H2/H3 lines), 'cached' (served
+            from the cache), 'changed' (True/False when a previously cached page was re-scraped,
+            else None) and 'error' (None on success)
+    """
+
+    def update_progress(text):
+        if progress_callback:
+            progress_callback(text)
+
+    results = [{'url': url, 'markdown': '', 'outline': None, 'headers': [], 'cached': False, 'changed': None, 'error': None} for url in urls]
+    cache = get_scrape_cache() if use_cache and SCRAPE_CACHE_ENABLED else None
+    done_count = 0
+
+    to_scrape = []
+    for idx, url in enumerate(urls):
+        cached = cache.get(url) if cache else None
+        if cached:
+            results[idx].update(markdown=cached['markdown'], outline=cached['outline'], headers=outline_headers(cached['outline']), cached=True)
+            done_count += 1
+            update_progress(f"Cached {done_count}/{len(urls)}: {url[:50]}")
+        else:
+            to_scrape.append(idx)
+
+    if not to_scrape:
+        return results
+
+    firecrawl = get_firecrawl_client(firecrawl_key)
+    limiter = DomainLimiter(per_domain)
+    started = {}
+
+    def scrape(idx, url):
+        with limiter.slot(url):
+            started[idx] = time.time()
+            return scrape_markdown(firecrawl, url, timeout)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(to_scrape))))
+    try:
+        futures = {executor.submit(scrape, idx, urls[idx]): idx for idx in to_scrape}
+        pending = set(futures)
+
+        while pending:
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+
+            # Give up on pages that ran past their timeout (the request itself can't be interrupted)
+            now = time.time()
+            expired = {
+                future for future in pending
+                if futures[future] in started and now - started[futures[future]] > timeout + TIMEOUT_GRACE
+            }
+            pending -= expired
+
+            for future in done | expired:
+                idx = futures[future]
+                url = urls[idx]
+                done_count += 1
+                if future in expired:
+                    results[idx]['error'] = f"Timed out after {timeout:.0f}s"
+                else:
+                    try:
+                        markdown = future.result()
+                        outline = extract_outline(markdown)
+                        results[idx].update(markdown=markdown, outline=outline, headers=outline_headers(outline))
+                    except Exception as e:
+                        results[idx]['error'] = str(e)
+
+                    # A failed cache write doesn't make the scrape itself fail
+                    if cache and not results[idx]['error']:
+                        try:
+                            results[idx]['changed'] = cache.put(url, markdown, outline)
+                        except Exception as e:
+                            update_progress(f"Could not cache {url[:50]}: {str(e)}")
+
+                if results[idx]['error']:
+                    update_progress(f"Failed {done_count}/{len(urls)}: {url[:50]} ({results[idx]['error']})")
+                else:
+                    update_progress(f"Scraped {done_count}/{len(urls)}: {url[:50]} ({len(results[idx]['markdown'])} chars)")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return results
@@ -0,0 +1,135 @@
+"""
+Checkpoints of written article sections.
+
+generate_article stores every section as soon as it is written, keyed by (brief hash,
+section index, prompt hash). The prompt hash covers the full request (model, briefs,
+context mode, ...), so a checkpoint is only reused for exactly the same section prompt.
+When a run fails part-way, running the same brief again restores the finished sections
+and only writes the missing ones. Regenerating a section replaces its checkpoint, so later
+reruns pick up the new version.
+
+Unlike the response cache, checkpoints are not evicted by size; entries unused for
+SECTION_STORE_TTL_DAYS are deleted when the store is opened.
+"""
+from brief_digest import brief_hash
+from llm_cache import request_key
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_STORE_PATH = os.environ.get(
+    'SECTION_STORE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'sections.sqlite')
+)
+DEFAULT_TTL_SECONDS = int(float(os.environ.get('SECTION_STORE_TTL_DAYS', '30')) * 86400)
+
+# Set SECTION_CHECKPOINTS_DISABLED=1 to always write every section
+CHECKPOINTS_ENABLED = os.environ.get('SECTION_CHECKPOINTS_DISABLED', '') not in ('1', 'true', 'yes')
+
+_section_store = None
+_section_store_lock = threading.Lock()
+
+
+def prompt_hash(request):
+    """Hash of a section's messages.create request (see llm_cache.request_key)."""
+    return request_key(request)
+
+
+class SectionStore:
+    """
+    SQLite table of written sections. Safe to share between threads.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.counters = {'restored': 0, 'stored': 0}
+
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS sections (
+                brief_hash TEXT NOT NULL,
+                section_index INTEGER NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                content TEXT NOT NULL,
+                model TEXT NOT NULL DEFAULT '',
+                usage TEXT NOT NULL DEFAULT '{}',
+                created REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (brief_hash, section_index, prompt_hash)
+            )"""
+        )
+        if ttl_seconds:
+            self.conn.execute("DELETE FROM sections WHERE last_used < ?", (time.time() - ttl_seconds,))
+        self.conn.commit()
+
+    def get(self, brief_hash, section_index, prompt_hash):
+        """
+        Returns:
+            dict: content, model, usage (of the original write) - or None if the section isn't stored
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT content, model, usage FROM sections WHERE brief_hash = ? AND section_index = ? AND prompt_hash = ?",
+                (brief_hash, section_index, prompt_hash)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE sections SET last_used = ? WHERE brief_hash = ? AND section_index = ? AND prompt_hash = ?",
+                (time.time(), brief_hash, section_index, prompt_hash)
+            )
+            self.conn.commit()
+            self.counters['restored'] += 1
+
+        content, model, usage = row
+        return {'content': content, 'model': model, 'usage': json.loads(usage)}
+
+    def put(self, brief_hash, section_index, prompt_hash, content, model='', usage=None):
+        """Store (or replace) a written section."""
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sections (brief_hash, section_index, prompt_hash, content, model, usage, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (brief_hash, section_index, prompt_hash, content, model, json.dumps(usage or {}), now, now)
+            )
+            self.conn.commit()
+            self.counters['stored'] += 1
+
+    def clear(self, brief_hash=None):
+        """Delete the checkpoints of one brief, or all of them."""
+        with self.lock:
+            if brief_hash is None:
+                self.conn.execute("DELETE FROM sections")
+            else:
+                self.conn.execute("DELETE FROM sections WHERE brief_hash = ?", (brief_hash,))
+            self.conn.commit()
+
+    def stats(self):
+        """
+        Returns:
+            dict: restored, stored (this process), sections, briefs (in the store)
+        """
+        with self.lock:
+            sections, briefs = self.conn.execute("SELECT COUNT(*), COUNT(DISTINCT brief_hash) FROM sections").fetchone()
+            stats = dict(self.counters)
+        stats['sections'] = sections
+        stats['briefs'] = briefs
+        return stats
+
+
+def get_section_store():
+    """Return the process-wide section store, or None when checkpoints are disabled."""
+    global _section_store
+    if not CHECKPOINTS_ENABLED:
+        return None
+    with _section_store_lock:
+        if _section_store is None:
+            _section_store = SectionStore()
+        return _section_store
@@ -0,0 +1,228 @@
+"""
+Cached Google searches (SerpAPI) for topic research and content refresh.
+
+Results are stored in SQLite keyed by (query, num, locale) and reused until they expire.
+A cached search with more results answers a later request for fewer (num=10 covers
+num=5), and People Also Ask questions are stored with the organic results.
+search_keywords resolves many keywords at once; research_keywords also scrapes every
+result page through the shared scrape stage.
+"""
+from api_clients import serpapi_search
+from scraper import scrape_urls
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    'SERP_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'serps.sqlite')
+)
+DEFAULT_TTL_SECONDS = int(float(os.environ.get('SERP_CACHE_TTL_HOURS', '72')) * 3600)
+SERP_CACHE_ENABLED = os.environ.get('SERP_CACHE_DISABLED', '') not in ('1', 'true', 'yes')
+SERP_WORKERS = int(os.environ.get('SERP_WORKERS', '5'))
+
+# SerpAPI parameters that change which results come back
+LOCALE_PARAMS = ('gl', 'hl', 'location', 'google_domain')
+# Parts of the response worth keeping
+KEPT_KEYS = ('organic_results', 'related_questions', 'search_information')
+
+_serp_cache = None
+_serp_cache_lock = threading.Lock()
+
+
+def normalize_query(query):
+    return ' '.join(query.lower().split())
+
+
+def locale_key(params):
+    """Locale part of the cache key, e.g. 'gl=us|hl=en' ('' for SerpAPI defaults)."""
+    return '|'.join(f"{name}={params[name]}" for name in LOCALE_PARAMS if params.get(name))
+
+
+class SerpCache:
+    """
+    SQLite-backed cache of SerpAPI responses with TTL. Safe to share between threads.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'stores': 0}
+
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS serps (
+                query TEXT NOT NULL,
+                locale TEXT NOT NULL,
+                num INTEGER NOT NULL,
+                response TEXT NOT NULL,
+                fetched REAL NOT NULL,
+                PRIMARY KEY (query, locale, num)
+            )"""
+        )
+        self.conn.commit()
+
+    def get(self, query, num, locale=''):
+        """
+        Return a cached response with at least num results, trimmed to num, or None.
+        """
+        cutoff = time.time() - self.ttl_seconds
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT response FROM serps WHERE query = ? AND locale = ? AND num >= ? AND fetched >= ? "
+                "ORDER BY num ASC LIMIT 1",
+                (normalize_query(query), locale, num, cutoff)
+            ).fetchone()
+            self.counters['hits' if row else 'misses'] += 1
+
+        if row is None:
+            return None
+        response = json.loads(row[0])
+        response['organic_results'] = response.get('organic_results', [])[:num]
+        return response
+
+    def put(self, query, num, locale, response):
+        """Store a response and drop expired ones."""
+        kept = {key: response[key] for key in KEPT_KEYS if key in response}
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO serps (query, locale, num, response, fetched) VALUES (?, ?, ?, ?, ?)",
+                (normalize_query(query), locale, num, json.dumps(kept), now)
+            )
+            self.conn.execute("DELETE FROM serps WHERE fetched < ?", (now - self.ttl_seconds,))
+            self.conn.commit()
+            self.counters['stores'] += 1
+
+    def clear(self):
+        """Delete every cached search."""
+        with self.lock:
+            self.conn.execute("DELETE FROM serps")
+            self.conn.commit()
+
+    def stats(self):
+        """
+        Returns:
+            dict: hits, misses, hit_rate, stores, entries
+        """
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM serps").fetchone()[0]
+            stats = dict(self.counters)
+
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['entries'] = entries
+        return stats
+
+
+def get_serp_cache():
+    """Return the process-wide on-disk SERP cache, opening it on first use."""
+    global _serp_cache
+    with _serp_cache_lock:
+        if _serp_cache is None:
+            _serp_cache = SerpCache()
+        return _serp_cache
+
+
+def serp_cache_stats():
+    """Hit/miss statistics for the SERP cache (see SerpCache.stats)."""
+    return get_serp_cache().stats()
+
+
+def google_search(params, use_cache=True):
+    """
+    serpapi_search with caching.
+
+    Args:
+        params: SerpAPI parameters (q, num, api_key and optional gl/hl/location/google_domain)
+        use_cache: Serve and store results in the on-disk SERP cache
+
+    Returns:
+        dict: Response with 'organic_results' and 'related_questions'
+    """
+    num = int(params.get('num', 10))
+    locale = locale_key(params)
+    cache = get_serp_cache() if use_cache and SERP_CACHE_ENABLED else None
+
+    if cache:
+        cached = cache.get(params['q'], num, locale)
+        if cached is not None:
+            return cached
+
+    response = serpapi_search(params)
+    if cache:
+        cache.put(params['q'], num, locale, response)
+    return response
+
+
+def search_keywords(keywords, serpapi_key, num=10, max_workers=SERP_WORKERS, progress_callback=None, use_cache=True, **locale):
+    """
+    Run Google searches for several keywords concurrently.
+
+    Args:
+        keywords: List of keywords
+        serpapi_key: SerpAPI key
+        num: Results per keyword
+        max_workers: Searches run at the same time
+        progress_callback: Optional function called with progress text (from the calling thread)
+        use_cache: Use the on-disk SERP cache
+        **locale: Optional gl / hl / location / google_domain
+
+    Returns:
+        dict: keyword -> {'urls', 'people_also_ask', 'error'}, in the order given
+    """
+
+    def update_progress(text):
+        if progress_callback:
+            progress_callback(text)
+
+    keywords = list(dict.fromkeys(keyword.strip() for keyword in keywords if keyword.strip()))
+    results = {keyword: {'urls': [], 'people_also_ask': [], 'error': None} for keyword in keywords}
+    if not keywords:
+        return results
+
+    def search(keyword):
+        params = {'q': keyword, 'num': num, 'api_key': serpapi_key}
+        params.update(locale)
+        return google_search(params, use_cache=use_cache)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(keywords)))) as executor:
+        futures = {executor.submit(search, keyword): keyword for keyword in keywords}
+        for done_count, future in enumerate(as_completed(futures), 1):
+            keyword = futures[future]
+            try:
+                response = future.result()
+                results[keyword]['urls'] = [r['link'] for r in response.get('organic_results', []) if r.get('link')][:num]
+                results[keyword]['people_also_ask'] = [q.get('question', '') for q in response.get('related_questions', [])]
+                update_progress(f"Searched {done_count}/{len(keywords)}: {keyword}")
+            except Exception as e:
+                results[keyword]['error'] = str(e)
+                update_progress(f"Search failed {done_count}/{len(keywords)}: {keyword} ({str(e)})")
+
+    return results
+
+
+def research_keywords(keywords, serpapi_key, firecrawl_key, num=10, progress_callback=None, use_cache=True, **locale):
+    """
+    Search several keywords and scrape all of their result pages in one concurrent pass.
+
+    URLs shared between keywords are scraped once.
+
+    Returns:
+        dict: keyword -> {'urls', 'people_also_ask', 'pages', 'error'}, where pages is the
+            scrape_urls result for that keyword's URLs in SERP order
+    """
+    results = search_keywords(keywords, serpapi_key, num=num, progress_callback=progress_callback, use_cache=use_cache, **locale)
+
+    all_urls = list(dict.fromkeys(url for result in results.values() for url in result['urls']))
+    pages = {page['url']: page for page in scrape_urls(all_urls, firecrawl_key, progress_callback=progress_callback, use_cache=use_cache)}
+
+    for result in results.values():
+        result['pages'] = [pages[url] for url in result['urls']]
+    return results
@@ -0,0 +1,109 @@
+"""
+Load simulation for the job scheduler with the fake Claude backend.
+
+One writer queues a large bulk run for one client, others queue a few articles a moment
+later, and someone runs short interactive jobs. Prints when each user's jobs started, the
+queue metrics and the Claude slot statistics, so fair share and priorities can be checked
+without API keys.
+
+Usage:
+    python simulate_jobs.py [--bulk 40] [--workers 4] [--llm-slots 8] [--latency 0.2]
+"""
+import argparse
+import os
+import time
+
+# Before the app modules read them
+os.environ['LLM_FAKE_BACKEND'] = '1'
+os.environ['LLM_CACHE_DISABLED'] = '1'
+# Every simulated article uses the same brief; don't restore sections between them
+os.environ['SECTION_CHECKPOINTS_DISABLED'] = '1'
+
+from jobs import JobStore, JobEngine, run_generate_job
+from scheduler import get_llm_slots, llm_slot_stats
+from api_clients import get_anthropic_client
+from llm import create_message
+
+BRIEF = '\n'.join(f"## H2 Section {i} (150 words)\nCover point {i}." for i in range(6))
+
+
+def run_interactive_job(params, api_key, progress):
+    """One short Claude call, like an editor or research request."""
+    message = create_message(
+        get_anthropic_client(api_key),
+        model="claude-sonnet-4-20250514",
+        max_tokens=500,
+        messages=[{"role": "user", "content": params['prompt']}]
+    )
+    return {'status': 'complete', 'text': message.content[0].text}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate shared job load with a fake Claude backend")
+    parser.add_argument('--bulk', type=int, default=40, help="Articles queued by the heavy user")
+    parser.add_argument('--workers', type=int, default=4, help="Job workers")
+    parser.add_argument('--llm-slots', type=int, default=8, help="Claude requests in flight at once")
+    parser.add_argument('--latency', type=float, default=0.2, help="Seconds per fake Claude request")
+    args = parser.parse_args()
+
+    get_anthropic_client('fake').messages.latency = args.latency
+    get_llm_slots().set_limit(args.llm_slots)
+
+    store = JobStore(':memory:')
+    engine = JobEngine(
+        store,
+        api_key='fake',
+        workers=args.workers,
+        handlers={'generate': run_generate_job, 'interactive': run_interactive_job},
+        poll_interval=0.05
+    )
+
+    article = {'title': '', 'article_brief': BRIEF, 'company_brief': 'Company', 'icp_brief': 'ICP', 'guidelines': ''}
+    submitted = []
+    for i in range(args.bulk):
+        submitted.append(engine.submit('generate', article, label=f"bulk {i}", user='alice', client='Acme'))
+    engine.start()
+
+    time.sleep(args.latency)
+    for user, client in (('bob', 'Globex'), ('bob', 'Initech'), ('carol', 'Acme')):
+        for i in range(2):
+            submitted.append(engine.submit('generate', article, label=f"{user} {i}", user=user, client=client))
+    for i in range(3):
+        submitted.append(engine.submit('interactive', {'prompt': f"Edit paragraph {i}"}, user='dave', client='Acme', priority='interactive'))
+
+    start = time.time()
+    while True:
+        jobs = store.get_many(submitted)
+        if all(job['status'] not in ('queued', 'running') for job in jobs.values()):
+            break
+        time.sleep(0.1)
+    elapsed = time.time() - start
+    engine.stop()
+
+    print(f"{len(submitted)} jobs finished in {elapsed:.1f}s "
+          f"({args.workers} workers, {args.llm_slots} Claude slots, {args.latency}s per call)\n")
+
+    order = sorted(jobs.values(), key=lambda job: job['started'])
+    by_user = {}
+    for position, job in enumerate(order, 1):
+        by_user.setdefault((job['user'], job['priority']), []).append((position, job['started'] - job['created']))
+    for (user, priority), starts in sorted(by_user.items()):
+        positions = [position for position, _ in starts]
+        waits = [wait for _, wait in starts]
+        print(f"{user:>6} ({priority:>11}): {len(starts):3} jobs, start positions {positions[:6]}{'...' if len(positions) > 6 else ''}, "
+              f"wait median {sorted(waits)[len(waits) // 2]:.1f}s, max {max(waits):.1f}s")
+
+    metrics = store.metrics()
+    print("\nWait by class: " + ', '.join(
+        f"{priority} median {wait['median']:.1f}s / max {wait['max']:.1f}s" for priority, wait in metrics['wait'].items()
+    ))
+    slots = llm_slot_stats()
+    fake = get_anthropic_client('fake').messages
+    print(f"Claude calls: {fake.calls}, peak in flight {fake.peak_in_flight} (limit {slots['limit']})")
+    for priority in ('interactive', 'bulk'):
+        print(f"  {priority}: {slots[priority]['acquired']} calls, {slots[priority]['waited']} waited, "
+              f"avg wait {slots[priority]['avg_wait_seconds']:.2f}s, max {slots[priority]['max_wait_seconds']:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
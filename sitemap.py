@@ -0,0 +1,228 @@
+"""
+Sitemap fetching for internal linking.
+
+Handles plain <urlset> sitemaps, <sitemapindex> files (recursively, with child sitemaps
+fetched concurrently) and gzipped sitemaps. Files are parsed incrementally as they stream
+in, so memory stays flat for sitemaps with tens of thousands of URLs. Each file is cached
+on disk and revalidated with ETag / Last-Modified, so repeat jobs for the same client only
+download what changed.
+"""
+from api_clients import get_http_session
+from concurrent.futures import ThreadPoolExecutor
+import xml.etree.ElementTree as ET
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import os
+import time
+
+CACHE_DIR = os.environ.get(
+    'SITEMAP_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'sitemaps')
+)
+# Cached files younger than this are used without contacting the server at all
+FRESH_SECONDS = int(os.environ.get('SITEMAP_FRESH_SECONDS', '3600'))
+MAX_WORKERS = int(os.environ.get('SITEMAP_MAX_WORKERS', '8'))
+REQUEST_TIMEOUT = 30
+
+
+def url_title(url):
+    """Derive a page title from the last URL segment, e.g. /blog/payment-automation -> Payment Automation."""
+    return url.rstrip('/').split('/')[-1].replace('-', ' ').title()
+
+
+def parse_sitemap_stream(stream):
+    """
+    Incrementally parse a sitemap file.
+
+    Args:
+        stream: Binary file-like object with the (already decompressed) XML
+
+    Returns:
+        tuple: ('urlset' or 'sitemapindex', list of <loc> URLs)
+    """
+    kind = None
+    root = None
+    locs = []
+
+    for event, elem in ET.iterparse(stream, events=('start', 'end')):
+        tag = elem.tag.rsplit('}', 1)[-1]
+        if event == 'start':
+            if root is None:
+                root, kind = elem, tag
+            continue
+
+        if tag == 'loc' and elem.text:
+            locs.append(elem.text.strip())
+        elif tag in ('url', 'sitemap'):
+            # Drop finished entries so the tree never holds more than one at a time
+            root.clear()
+
+    if kind not in ('urlset', 'sitemapindex'):
+        raise Exception(f"Not a sitemap (root element <{kind}>)")
+
+    return kind, locs
+
+
+def _cache_path(url):
+    return os.path.join(CACHE_DIR, hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+
+def _read_cache(url):
+    try:
+        with open(_cache_path(url), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache(url, entry):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _cache_path(url)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, path)
+
+
+class _ChunkStream(io.RawIOBase):
+    """Read-only file object over an iterator of byte chunks (e.g. response.iter_content)."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending:
+            self.pending = next(self.chunks, None)
+            if self.pending is None:
+                self.pending = b''
+                return 0
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+def _open_body(response, url):
+    # iter_content already undoes Content-Encoding: gzip
+    chunks = response.iter_content(chunk_size=64 * 1024)
+    first = next(chunks, b'')
+    body = _ChunkStream(itertools.chain([first], chunks))
+
+    # .xml.gz files are gzip payloads regardless of headers; sniff the magic bytes to be sure
+    if url.lower().endswith('.gz') or first[:2] == b'\x1f\x8b':
+        return gzip.GzipFile(fileobj=body)
+    return body
+
+
+def fetch_sitemap_file(url, use_cache=True):
+    """
+    Fetch and parse one sitemap file, using the on-disk copy when it is still valid.
+
+    Returns:
+        tuple: (kind, locs, source) where source is 'cache', 'revalidated' or 'network'
+    """
+    cached = _read_cache(url) if use_cache else None
+    if cached and time.time() - cached['fetched'] < FRESH_SECONDS:
+        return cached['kind'], cached['locs'], 'cache'
+
+    headers = {}
+    if cached:
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+
+    with get_http_session().get(url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as response:
+        if response.status_code == 304 and cached:
+            cached['fetched'] = time.time()
+            _write_cache(url, cached)
+            return cached['kind'], cached['locs'], 'revalidated'
+
+        response.raise_for_status()
+        kind, locs = parse_sitemap_stream(_open_body(response, url))
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+
+    _write_cache(url, {
+        'url': url,
+        'kind': kind,
+        'locs': locs,
+        'etag': etag,
+        'last_modified': last_modified,
+        'fetched': time.time()
+    })
+    return kind, locs, 'network'
+
+
+def fetch_sitemap_pages(sitemap_url, use_cache=True, max_workers=MAX_WORKERS, progress_callback=None):
+    """
+    Fetch every page URL reachable from a sitemap or sitemap index.
+
+    Args:
+        sitemap_url: URL of a sitemap, sitemap index, or .xml.gz file
+        use_cache: Reuse and revalidate on-disk copies (False forces a full download)
+        max_workers: Number of child sitemaps fetched in parallel
+        progress_callback: Optional function to call with progress updates (text)
+
+    Returns:
+        list: List of dicts with 'url' and 'title' keys, in sitemap order without duplicates
+    """
+
+    def update_progress(text):
+        if progress_callback:
+            progress_callback(text)
+
+    # The root has to work; child failures are reported and skipped
+    kind, locs, source = fetch_sitemap_file(sitemap_url, use_cache)
+    page_urls = []
+    seen_sitemaps = {sitemap_url}
+    stats = {'cache': 0, 'revalidated': 0, 'network': 0, 'failed': 0}
+    stats[source] += 1
+
+    level = [(kind, locs)]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while level:
+            children = []
+            for kind, locs in level:
+                if kind == 'urlset':
+                    page_urls.extend(locs)
+                else:
+                    children.extend(loc for loc in locs if loc not in seen_sitemaps)
+            children = [child for child in dict.fromkeys(children)]
+            seen_sitemaps.update(children)
+            if not children:
+                break
+
+            update_progress(f"Fetching {len(children)} child sitemaps...")
+            futures = [executor.submit(fetch_sitemap_file, child, use_cache) for child in children]
+
+            # Collect in index order so page order is stable between runs
+            level = []
+            for child, future in zip(children, futures):
+                try:
+                    kind, locs, source = future.result()
+                    level.append((kind, locs))
+                    stats[source] += 1
+                except Exception as e:
+                    stats['failed'] += 1
+                    update_progress(f"Skipping child sitemap {child}: {str(e)}")
+
+    pages = []
+    seen_pages = set()
+    for url in page_urls:
+        if url not in seen_pages:
+            seen_pages.add(url)
+            pages.append({'url': url, 'title': url_title(url)})
+
+    update_progress(
+        f"Sitemap: {len(pages)} pages from {len(seen_sitemaps)} files "
+        f"({stats['cache']} cached, {stats['revalidated']} unchanged, {stats['network']} downloaded, {stats['failed']} failed)"
+    )
+    return pages
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# Offline Claude backend and no on-disk response cache, before the app modules read them
+os.environ.setdefault('LLM_FAKE_BACKEND', '1')
+os.environ.setdefault('LLM_CACHE_DISABLED', '1')
+os.environ.setdefault('LLM_FAKE_LATENCY', '0')
+os.environ.setdefault('SECTION_CHECKPOINTS_DISABLED', '1')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,80 @@
+from add_internal_links import place_links_with_claude
+from anchor_matcher import AnchorMatcher, link_article_locally
+from fake_llm import FakeAnthropic
+from link_index import get_sitemap_index
+import link_index
+
+PAGES = [
+    {'url': 'https://example.com/payments', 'title': 'Payment Processing'},
+    {'url': 'https://example.com/invoices', 'title': 'Invoice Automation'},
+]
+
+
+def test_hybrid_mode_reuses_the_cached_sitemap_index(monkeypatch):
+    monkeypatch.setattr(link_index, '_indexes', {})
+    sitemap_url = 'https://example.com/sitemap.xml'
+    pages = [{'url': f"https://example.com/page-{i}", 'title': f"Topic {i} guide"} for i in range(200)]
+    index = get_sitemap_index(sitemap_url, pages)
+    client = FakeAnthropic(latency=0, responder=lambda kwargs: '[]')
+
+    for existing in ({pages[0]['url']}, {pages[1]['url'], pages[2]['url']}):
+        place_links_with_claude(
+            "Topic 5 guide and topic 7 guide.", sitemap_url, pages, 3, [], client, lambda text: None,
+            use_cache=False, candidate_limit=50, existing_urls=existing
+        )
+        assert get_sitemap_index(sitemap_url, pages) is index
+
+    assert len(link_index._indexes) == 1
+
+
+def test_hybrid_mode_shortlist_excludes_linked_urls(monkeypatch):
+    monkeypatch.setattr(link_index, '_indexes', {})
+    pages = [{'url': f"https://example.com/page-{i}", 'title': f"Topic {i} guide"} for i in range(200)]
+    prompts = []
+
+    def responder(kwargs):
+        prompts.append(kwargs['messages'][-1]['content'][0]['text'])
+        return '[]'
+
+    place_links_with_claude(
+        "Topic 5 guide.", 'https://example.com/sitemap.xml', pages, 3, [], FakeAnthropic(latency=0, responder=responder),
+        lambda text: None, use_cache=False, candidate_limit=50, existing_urls={'https://example.com/page-5'}
+    )
+    assert 'https://example.com/page-5\n' not in prompts[0] + '\n'
+    assert prompts[0].count('- Topic') == 50
+
+
+def test_anchor_matcher_finds_titles_and_plurals():
+    matcher = AnchorMatcher(PAGES + [{'url': 'https://example.com/pricing', 'title': 'Pricing'}])
+    matches = matcher.find_matches("Invoice automations cut payment-processing costs. See pricing.")
+    assert {(match['anchor'], match['url']) for match in matches} == {
+        ('Invoice automations', 'https://example.com/invoices'),
+        ('payment-processing', 'https://example.com/payments'),
+    }
+
+
+def test_local_linking_skips_headings_and_existing_links():
+    article = "## Payment Processing\nWe cover [[invoice automation|https://example.com/invoices]] and payment processing."
+    linked, selected = link_article_locally(article, 'https://example.com/sitemap.xml', PAGES, 5)
+    assert linked == "## Payment Processing\nWe cover [[invoice automation|https://example.com/invoices]] and [[payment processing|https://example.com/payments]]."
+    assert len(selected) == 1
+
+
+def test_local_linking_spreads_links_across_paragraphs():
+    pages = PAGES + [{'url': 'https://example.com/expenses', 'title': 'Expense Management'}]
+    article = (
+        "Payment processing, invoice automation and expense management in one platform.\n\n"
+        "Finance teams start with invoice automation.\n\n"
+        "Later they add expense management.\n\n"
+        "Some never need payment processing."
+    )
+    linked, selected = link_article_locally(article, 'https://example.com/sitemap.xml', pages, 3)
+    assert len(selected) == 3
+    assert [paragraph.count('[[') for paragraph in linked.split('\n\n')] == [1, 1, 1, 0]
+
+
+def test_local_linking_fills_remaining_slots_in_linked_paragraphs():
+    article = "Payment processing and invoice automation.\n\nNothing to link here."
+    linked, selected = link_article_locally(article, 'https://example.com/sitemap.xml', PAGES, 2)
+    assert linked == "[[Payment processing|https://example.com/payments]] and [[invoice automation|https://example.com/invoices]].\n\nNothing to link here."
+    assert len(selected) == 2
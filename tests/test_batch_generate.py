@@ -0,0 +1,99 @@
+from types import SimpleNamespace
+import re
+
+import pytest
+
+from batch_generate import FakeBatchClient, build_batch_requests, generate_articles_batch
+from section_store import SectionStore
+import batch_generate
+
+
+def brief(name, sections=3):
+    lines = []
+    for i in range(sections):
+        level = '### H3' if i % 2 else '## H2'
+        lines.append(f"{level} {name} part {i} (100 words)\nCover {name} point {i}.")
+    return '\n'.join(lines)
+
+
+def job(name, sections=3):
+    return {'article_brief': brief(name, sections), 'company_brief': 'Company', 'icp_brief': 'ICP', 'guidelines': ''}
+
+
+def section_responder(params):
+    # Name each section after its title, so results can be traced back to the brief
+    section_prompt = params['messages'][0]['content'][-1]['text']
+    return f"Text of {section_prompt.split(chr(10))[1]}."
+
+
+def with_results(client, change):
+    """Pass the fake batch results through change(entries) -> entries."""
+    batches = client.messages.batches
+    original = batches.results
+    batches.results = lambda batch_id: iter(change(list(original(batch_id))))
+    return client
+
+
+def fail(entries, failures):
+    return [
+        SimpleNamespace(custom_id=entry.custom_id, result=SimpleNamespace(type=failures[entry.custom_id]))
+        if entry.custom_id in failures else entry
+        for entry in entries
+    ]
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = SectionStore(':memory:')
+    monkeypatch.setattr(batch_generate, 'get_section_store', lambda: store)
+    return store
+
+
+def run(jobs, client):
+    return generate_articles_batch(jobs, client=client, poll_interval=0, progress_callback=lambda *args: None)
+
+
+def test_custom_ids_are_valid_and_map_back_to_sections():
+    requests, manifest = build_batch_requests({7: job('alpha'), 'b-2': job('beta', 2)})
+    custom_ids = [request['custom_id'] for request in requests]
+    assert len(set(custom_ids)) == len(custom_ids) == 5
+    assert all(re.fullmatch(r'[a-zA-Z0-9_-]{1,64}', custom_id) for custom_id in custom_ids)
+    for request in requests:
+        job_id, index = manifest['requests'][request['custom_id']]
+        title = manifest['jobs'][job_id][index]['title']
+        assert f"{title}\n" in request['params']['messages'][0]['content'][-1]['text']
+
+
+def test_results_in_any_order_are_assembled_in_brief_order(store):
+    client = with_results(FakeBatchClient(section_responder, polls_until_done=2), lambda entries: entries[::-1])
+    results = run({1: job('alpha'), 2: job('beta')}, client)
+
+    assert set(results) == {'1', '2'}
+    article = results['1']['article']
+    assert article == (
+        "\n## alpha part 0\n\nText of H2: alpha part 0.\n"
+        "\n### alpha part 1\n\nText of H3: alpha part 1.\n"
+        "\n## alpha part 2\n\nText of H2: alpha part 2."
+    )
+    assert "beta" not in article
+    assert results['1']['log'].count("✓ Wrote") == 3
+    assert "Article assembled (batch msgbatch_fake_1)" in results['1']['log']
+
+
+def test_failed_sections_fail_only_their_article(store):
+    failures = {'job1_s1': 'errored', 'job2_s0': 'expired'}
+    client = with_results(FakeBatchClient(section_responder), lambda entries: fail(entries, failures))
+    results = run({1: job('alpha'), 2: job('beta'), 3: job('gamma')}, client)
+
+    assert results['1'] == {'status': 'error', 'error': "1 section(s) failed in batch msgbatch_fake_1: H3: alpha part 1 (errored)"}
+    assert results['2'] == {'status': 'error', 'error': "1 section(s) failed in batch msgbatch_fake_1: H2: beta part 0 (expired)"}
+    assert results['3']['status'] == 'complete'
+
+    # Succeeded sections are checkpointed, failed ones are not
+    assert store.stats()['stored'] == 9 - len(failures)
+
+
+def test_missing_results_are_reported_as_failed(store):
+    client = with_results(FakeBatchClient(section_responder), lambda entries: [e for e in entries if e.custom_id != 'job1_s2'])
+    results = run({1: job('alpha')}, client)
+    assert results['1'] == {'status': 'error', 'error': "1 section(s) failed in batch msgbatch_fake_1: H2: alpha part 2"}
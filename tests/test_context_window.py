@@ -0,0 +1,48 @@
+import pytest
+
+from api_clients import get_anthropic_client
+import write_article
+
+BRIEF = '\n'.join(f"## H2 Section {i} (100 words)\nCover point {i}. " + "Detail. " * 40 for i in range(5))
+
+
+@pytest.fixture
+def prompts(monkeypatch):
+    prompts = []
+
+    def responder(kwargs):
+        prompts.append('\n'.join(block['text'] for block in kwargs['messages'][-1]['content']))
+        return f"Section text {len(prompts)}"
+
+    messages = get_anthropic_client('fake').messages
+    monkeypatch.setattr(messages, 'responder', responder)
+    monkeypatch.setattr(messages, 'latency', 0)
+    return prompts
+
+
+def test_window_mode_sends_outline_and_neighbouring_sections_only(prompts):
+    article, _ = write_article.generate_article(
+        BRIEF, 'Company', 'ICP', '', 'fake', progress_callback=lambda *args: None, use_cache=False, context_mode='window'
+    )
+    assert len(prompts) == 5
+    middle = next(prompt for prompt in prompts if "SECTION TO WRITE:\nH2: Section 2\n" in prompt)
+    assert "H2: Section 4" in middle
+    assert "Cover point 1" in middle and "Cover point 3" in middle
+    assert "Cover point 0" not in middle and "Cover point 4" not in middle
+    assert "Section text" in article
+
+
+def test_window_mode_shares_less_context():
+    report = write_article.context_token_report(BRIEF, 'Company', 'ICP', '')
+    assert report['window']['sections'] == report['full']['sections'] == 5
+    assert report['window']['shared_tokens'] < report['full']['shared_tokens']
+    assert report['window']['input_tokens'] < report['full']['input_tokens']
+
+
+def test_report_compares_cost_with_prompt_caching():
+    report = {
+        'full': {'sections': 5, 'shared_tokens': 500, 'section_tokens': 500, 'largest_request': 600, 'input_tokens': 3000, 'cached_equivalent': 1958},
+        'window': {'sections': 5, 'shared_tokens': 300, 'section_tokens': 1000, 'largest_request': 600, 'input_tokens': 2500, 'cached_equivalent': 2309},
+    }
+    summary = write_article.format_context_report(report).split('\n')[-1]
+    assert summary == "window vs full: 17% fewer input tokens sent, 18% more with prompt caching"
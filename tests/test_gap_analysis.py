@@ -0,0 +1,55 @@
+from gap_analysis import analyze_gaps, article_summary, gap_json
+from outline import extract_outline
+
+
+def page(*sections):
+    """Markdown with one H2 per (title, words) pair."""
+    return '\n\n'.join(f"## {title}\n\n" + ' '.join(['word'] * words) for title, words in sections)
+
+
+ARTICLE = page(("What is invoice automation", 100), ("Invoice automation pricing", 40), ("Conclusion", 50))
+COMPETITORS = [
+    page(("What is invoice automation?", 120), ("Pricing", 200), ("Integrations", 150)),
+    page(("Invoice automation pricing", 180), ("2. Integration", 130), ("Conclusion", 60)),
+    page(("Pricing", 220), ("Integrations", 170), ("Security", 90)),
+]
+
+
+def report():
+    return analyze_gaps(extract_outline(ARTICLE), [extract_outline(markdown) for markdown in COMPETITORS], keyword='invoice automation')
+
+
+def test_sections_align_ignoring_the_keyword():
+    aligned = {section['title']: section for section in report()['aligned']}
+    pricing = aligned['Invoice automation pricing']
+    assert (pricing['pages'], pricing['competitor_median_words'], pricing['thin']) == (3, 200, True)
+    assert pricing['word_delta'] == 40 - 200
+    assert aligned['Conclusion']['pages'] == 1 and not aligned['Conclusion']['thin']
+    assert aligned['What is invoice automation']['pages'] == 1
+
+
+def test_competitor_only_topics_are_missing_when_common_enough():
+    missing = report()['missing']
+    assert [(topic['title'], topic['pages'], topic['median_words']) for topic in missing] == [('Integrations', 3, 150)]
+    assert missing[0]['variants'] == ['2. Integration']
+
+
+def test_gap_json_and_summary():
+    gaps = report()
+    assert gap_json(gaps) == {
+        'missing_sections': [{
+            'title': 'Integrations',
+            'frequency': "appears in 3/3 competitors",
+            'competitor_median_words': 150,
+            'also_called': ['2. Integration']
+        }],
+        'thin_sections': [{'title': 'Invoice automation pricing', 'issue': "40 words vs competitor median 200 across 3/3 competitors"}]
+    }
+    summary = article_summary(ARTICLE, gaps)
+    assert "## Invoice automation pricing (40 words; covered by 3/3 competitors, competitor median 200 words)" in summary
+    assert summary.endswith("THIN SECTION EXCERPTS:\n## Invoice automation pricing " + ' '.join(['word'] * 40))
+
+
+def test_single_competitor_topics_count_with_few_competitors():
+    gaps = analyze_gaps(extract_outline(ARTICLE), [extract_outline(COMPETITORS[2])], keyword='invoice automation')
+    assert {topic['title'] for topic in gaps['missing']} == {'Integrations', 'Security'}
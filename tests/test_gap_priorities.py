@@ -0,0 +1,34 @@
+from types import SimpleNamespace
+
+from analyze_content import gap_candidates, priority_tool, validate_priorities, PRIORITY_TOOL_NAME
+
+GAPS = {
+    'missing_sections': [{'title': 'Pricing'}, {'title': 'pricing '}, {'title': 'Integrations'}],
+    'thin_sections': [{'title': 'Pricing'}, {'title': 'Setup'}],
+}
+
+
+def tool_message(entries):
+    return SimpleNamespace(content=[SimpleNamespace(type='tool_use', name=PRIORITY_TOOL_NAME, input={'gaps': entries})])
+
+
+def test_duplicate_titles_are_asked_about_once():
+    candidates = gap_candidates(GAPS)
+    assert [(candidate['title'], candidate['type']) for candidate in candidates] == [
+        ('Pricing', 'missing'), ('Integrations', 'missing'), ('Setup', 'thin')
+    ]
+    title_enum = priority_tool(candidates)['input_schema']['properties']['gaps']['items']['properties']['title']['enum']
+    assert title_enum == ['Pricing', 'Integrations', 'Setup']
+
+
+def test_validate_priorities_reports_wrong_and_omitted_entries():
+    candidates = gap_candidates(GAPS)
+    valid, unresolved, errors = validate_priorities(tool_message([
+        {'title': 'pricing', 'type': 'missing', 'priority': 'low', 'reason': 'Not for this audience'},
+        {'title': 'Setup', 'type': 'missing', 'priority': 'high', 'reason': 'Needed'},
+        {'title': 'Unknown', 'type': 'thin', 'priority': 'high', 'reason': 'x'},
+    ]), candidates)
+
+    assert list(valid) == ['Pricing'] and valid['Pricing']['priority'] == 'low'
+    assert [candidate['title'] for candidate in unresolved] == ['Integrations', 'Setup']
+    assert len(errors) == 3
@@ -0,0 +1,46 @@
+from header_clusters import cluster_headers, format_topics, header_parts, header_terms
+
+
+def test_header_parts_and_terms():
+    assert header_parts('### FAQs') == (3, 'FAQs')
+    assert header_parts('Pricing') == (2, 'Pricing')
+    assert header_terms('Step 2: Choosing the Invoices') == header_terms('choosing invoice')
+
+
+def test_near_duplicate_headers_share_a_topic():
+    topics = cluster_headers([
+        ['## Pricing Plans', '## 1. Getting Started'],
+        ['## Plans and Pricing', '### Getting started'],
+        ['## pricing plans!'],
+    ])
+    pricing = topics[0]
+    assert (pricing['title'], pricing['pages'], pricing['count']) == ('Pricing Plans', 3, 3)
+    # Same words after normalization: shown once
+    assert pricing['variants'] == ['Plans and Pricing']
+    # Numbering and case don't make a new wording
+    assert (topics[1]['title'], topics[1]['pages'], topics[1]['variants']) == ('1. Getting Started', 2, [])
+
+
+def test_stopword_only_headers_are_kept_per_wording():
+    topics = cluster_headers([
+        ['## What is it?', '## Pricing'],
+        ['## What is it', '## How to'],
+    ])
+    assert (topics[0]['title'], topics[0]['pages']) == ('What is it?', 2)
+    assert {(topic['title'], topic['pages']) for topic in topics[1:]} == {('Pricing', 1), ('How to', 1)}
+    # Headers with no words at all are still dropped
+    assert [topic['title'] for topic in cluster_headers([['## ???', '## Pricing']])] == ['Pricing']
+
+
+def test_equally_common_topics_keep_outline_order():
+    topics = cluster_headers([
+        ['## Introduction', '## Benefits', '## Pricing', '## Conclusion'],
+        ['## Introduction', '## Benefits', '## Setup', '## Pricing', '## Conclusion'],
+        ['## Alternatives', '## Setup'],
+    ])
+    assert [topic['title'] for topic in topics] == ['Introduction', 'Benefits', 'Setup', 'Pricing', 'Conclusion', 'Alternatives']
+
+
+def test_format_topics():
+    topics = cluster_headers([['## Pricing Plans', '### FAQ'], ['## Plans and Pricing']])
+    assert format_topics(topics, 2) == "## Pricing Plans (2/2 pages; also: Plans and Pricing)\n### FAQ (1/2 pages)"
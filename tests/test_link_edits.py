@@ -0,0 +1,65 @@
+from add_internal_links import apply_link_edits, parse_link_edits, place_links_with_claude
+from fake_llm import FakeAnthropic
+import json
+
+PAGES = [
+    {'url': 'https://example.com/payments', 'title': 'Payment Processing'},
+    {'url': 'https://example.com/invoices', 'title': 'Invoice Automation'},
+]
+VALID_URLS = {page['url'] for page in PAGES}
+
+
+def test_edit_applies_in_paragraph_starting_with_heading():
+    article = "# My Article\nWe automate payment processing for finance teams."
+    edits = [{'paragraph': 0, 'anchor': 'payment processing', 'url': 'https://example.com/payments'}]
+    linked, applied, rejected = apply_link_edits(article, edits, VALID_URLS)
+    assert linked == "# My Article\nWe automate [[payment processing|https://example.com/payments]] for finance teams."
+    assert applied == edits and rejected == []
+
+
+def test_edit_never_links_inside_a_heading():
+    article = "# Payment processing\nIntro text."
+    edits = [{'paragraph': 0, 'anchor': 'Payment processing', 'url': 'https://example.com/payments'}]
+    linked, applied, rejected = apply_link_edits(article, edits, VALID_URLS)
+    assert linked == article
+    assert rejected[0][1] == "anchor not found in paragraph"
+
+
+def test_edit_rejections():
+    article = "Payment processing and invoice automation.\n\nMore about [[payment processing|https://example.com/payments]]."
+    edits = [
+        {'paragraph': 0, 'anchor': 'Payment processing', 'url': 'https://example.com/other'},
+        {'paragraph': 5, 'anchor': 'invoice automation', 'url': 'https://example.com/invoices'},
+        {'paragraph': 1, 'anchor': 'payment processing', 'url': 'https://example.com/payments'},
+        'not an edit',
+    ]
+    _, applied, rejected = apply_link_edits(article, edits, VALID_URLS, existing_urls={'https://example.com/payments'})
+    assert applied == []
+    assert [reason for _, reason in rejected] == ["URL not in sitemap", "no such paragraph", "URL already linked", "malformed edit"]
+
+
+def test_parse_link_edits_tolerates_surrounding_text():
+    response = 'Here are the links:\n```json\n[{"paragraph": 1, "anchor": "a", "url": "u"}]\n```\nI avoided [headings].'
+    assert parse_link_edits(response) == [{'paragraph': 1, 'anchor': 'a', 'url': 'u'}]
+
+
+def test_parse_link_edits_wraps_non_list_values():
+    assert parse_link_edits('{"paragraph": 1, "anchor": "a", "url": "u"}') == [{'paragraph': 1, 'anchor': 'a', 'url': 'u'}]
+    edits = parse_link_edits('[1, "two"]')
+    _, applied, rejected = apply_link_edits("Text.", edits, VALID_URLS)
+    assert applied == [] and [reason for _, reason in rejected] == ["malformed edit", "malformed edit"]
+
+
+def test_edit_reusing_a_linked_url_is_reported_as_already_linked():
+    article = "We cover [[payment processing|https://example.com/payments]].\n\nInvoice automation and payment processing."
+    response = json.dumps([
+        {'paragraph': 1, 'anchor': 'payment processing', 'url': 'https://example.com/payments'},
+        {'paragraph': 1, 'anchor': 'Invoice automation', 'url': 'https://example.com/invoices'},
+    ])
+    progress = []
+    linked = place_links_with_claude(
+        article, 'https://example.com/sitemap.xml', PAGES, 2, [], FakeAnthropic(latency=0, responder=lambda kwargs: response),
+        progress.append, use_cache=False, existing_urls={'https://example.com/payments'}
+    )
+    assert linked == "We cover [[payment processing|https://example.com/payments]].\n\n[[Invoice automation|https://example.com/invoices]] and payment processing."
+    assert "Skipped link 'payment processing' -> https://example.com/payments: URL already linked" in progress
@@ -0,0 +1,91 @@
+import io
+import zipfile
+
+from docx import Document
+from docx.oxml.ns import qn
+
+from linked_docx import export_linked_zip, linked_docx_bytes, render_linked_document
+
+
+def runs(paragraph):
+    """(text, bold, italic, link URL) for each run of a paragraph, hyperlinks included."""
+    rels = paragraph.part.rels
+    result = []
+    for element in paragraph._p:
+        if element.tag == qn('w:hyperlink'):
+            url = rels[element.get(qn('r:id'))].target_ref
+            result.extend((run_text(run), bold(run), italic(run), url) for run in element.findall(qn('w:r')))
+        elif element.tag == qn('w:r') and run_text(element):
+            result.append((run_text(element), bold(element), italic(element), None))
+    return result
+
+
+def run_text(run):
+    return ''.join(t.text or '' for t in run.findall(qn('w:t')))
+
+
+def bold(run):
+    return run.find(f"{qn('w:rPr')}/{qn('w:b')}") is not None
+
+
+def italic(run):
+    return run.find(f"{qn('w:rPr')}/{qn('w:i')}") is not None
+
+
+def test_links_and_emphasis_are_rendered_as_runs():
+    doc = render_linked_document(
+        "## Why **automate**\n\n"
+        "Read about [[payment processing|https://example.com/payments]], *fast* and __simple__. "
+        "Again: [[payments|https://example.com/payments]] or [[**invoices**|https://example.com/invoices]]. [[no url]]\n\n"
+        "- A [[bullet link|https://example.com/bullet]]\n"
+        "1. Numbered *item*"
+    )
+    heading, body, bullet, numbered = doc.paragraphs
+    assert heading.style.name == 'Heading 2'
+    assert runs(heading) == [('Why ', False, False, None), ('automate', True, False, None)]
+    assert runs(body) == [
+        ('Read about ', False, False, None),
+        ('payment processing', False, False, 'https://example.com/payments'),
+        (', ', False, False, None),
+        ('fast', False, True, None),
+        (' and ', False, False, None),
+        ('simple', True, False, None),
+        ('. Again: ', False, False, None),
+        ('payments', False, False, 'https://example.com/payments'),
+        (' or ', False, False, None),
+        ('invoices', False, False, 'https://example.com/invoices'),
+        ('. ', False, False, None),
+        ('[[no url]]', False, False, None),
+    ]
+    assert (bullet.style.name, runs(bullet)[-1][3]) == ('List Bullet', 'https://example.com/bullet')
+    assert (numbered.style.name, runs(numbered)) == ('List Number', [('Numbered ', False, False, None), ('item', False, True, None)])
+
+    # One relationship per URL, however often it is linked
+    hyperlinks = [rel for rel in doc.part.rels.values() if rel.is_external]
+    assert sorted(rel.target_ref for rel in hyperlinks) == [
+        'https://example.com/bullet', 'https://example.com/invoices', 'https://example.com/payments'
+    ]
+
+
+def test_zip_keeps_every_article_under_a_unique_name():
+    articles = [
+        ('a.docx', "First [[link|https://example.com/1]]."),
+        ('a.docx', "Second."),
+        ('b.docx', "Third."),
+        ('a.docx', "Fourth."),
+        ('notes', "Fifth."),
+        ('notes', "Sixth."),
+    ]
+    with zipfile.ZipFile(export_linked_zip(iter(articles))) as zf:
+        assert zf.namelist() == ['a.docx', 'a_2.docx', 'b.docx', 'a_3.docx', 'notes', 'notes_2.docx']
+        texts = {name: Document(io.BytesIO(zf.read(name))).paragraphs[0].text for name in zf.namelist()}
+
+    assert texts == {
+        'a.docx': "First link.", 'a_2.docx': "Second.", 'b.docx': "Third.",
+        'a_3.docx': "Fourth.", 'notes': "Fifth.", 'notes_2.docx': "Sixth.",
+    }
+
+
+def test_docx_bytes_open_as_a_document():
+    doc = Document(io.BytesIO(linked_docx_bytes("Line one\nline two")))
+    assert doc.paragraphs[0].text == "Line one\nline two"
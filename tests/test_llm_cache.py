@@ -0,0 +1,103 @@
+import pytest
+
+from fake_llm import FakeAnthropic
+from llm_cache import ResponseCache, request_key
+import llm
+import llm_cache
+
+REQUEST = {'model': 'claude-test', 'max_tokens': 100, 'messages': [{'role': 'user', 'content': 'Hello'}]}
+
+
+class Clock:
+    """Stand-in for time.time that only moves when told to."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_cache.time, 'time', clock)
+    return clock
+
+
+def test_request_key_ignores_timeout_and_key_order():
+    reordered = {'messages': REQUEST['messages'], 'max_tokens': 100, 'model': 'claude-test'}
+    assert request_key(REQUEST) == request_key(reordered) == request_key(dict(REQUEST, timeout=30))
+    assert request_key(REQUEST) != request_key(dict(REQUEST, max_tokens=200))
+    assert request_key(REQUEST) != request_key(dict(REQUEST, messages=[{'role': 'user', 'content': 'Hello!'}]))
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = ResponseCache(':memory:', ttl_seconds=60)
+    cache.put('a', {'text': 'A'})
+
+    clock.now += 59
+    assert cache.get('a') == {'text': 'A'}
+    clock.now += 2
+    assert cache.get('a') is None
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['expired'], stats['entries']) == (1, 1, 1, 0)
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    value = {'text': 'x' * 100}
+    cache = ResponseCache(':memory:', max_bytes=250, ttl_seconds=0)
+    cache.put('a', value)
+    clock.now += 1
+    cache.put('b', value)
+    clock.now += 1
+    assert cache.get('a') == value
+    clock.now += 1
+    cache.put('c', value)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == value and cache.get('c') == value
+    assert cache.stats()['evictions'] == 1
+
+
+def test_values_over_the_size_limit_are_not_stored():
+    cache = ResponseCache(':memory:', max_bytes=10)
+    cache.put('a', {'text': 'x' * 100})
+    assert cache.stats()['entries'] == 0
+
+
+def test_cache_hit_reports_zero_usage(monkeypatch):
+    cache = ResponseCache(':memory:')
+    monkeypatch.setattr(llm, '_response_cache', cache)
+    monkeypatch.setattr(llm, 'RESPONSE_CACHE_ENABLED', True)
+    client = FakeAnthropic(latency=0, responder=lambda kwargs: "Hi there")
+
+    first = llm.create_message(client, **REQUEST)
+    assert first.usage.output_tokens == 2
+
+    key, cached = llm._cache_lookup(dict(REQUEST, timeout=30))
+    assert key == request_key(REQUEST)
+    assert cached.content[0].text == "Hi there"
+    assert (cached.usage.input_tokens, cached.usage.output_tokens) == (0, 0)
+
+    second = llm.create_message(client, **REQUEST)
+    assert second.content[0].text == "Hi there" and second.usage.output_tokens == 0
+    assert client.messages.calls == 1
+
+    stats = cache.stats()
+    assert stats['hits'] == 2
+    assert stats['saved_input_tokens'] == 2 * first.usage.input_tokens
+    assert stats['saved_output_tokens'] == 2 * first.usage.output_tokens
+
+
+def test_use_cache_false_calls_the_api_and_refreshes_the_entry(monkeypatch):
+    monkeypatch.setattr(llm, '_response_cache', ResponseCache(':memory:'))
+    monkeypatch.setattr(llm, 'RESPONSE_CACHE_ENABLED', True)
+    answers = iter(["Old", "New"])
+    client = FakeAnthropic(latency=0, responder=lambda kwargs: next(answers))
+
+    llm.create_message(client, **REQUEST)
+    assert llm.create_message(client, use_cache=False, **REQUEST).content[0].text == "New"
+    assert llm.create_message(client, **REQUEST).content[0].text == "New"
+    assert client.messages.calls == 2
@@ -0,0 +1,53 @@
+from outline import extract_outline, outline_headers
+
+
+def titles(markdown):
+    return [(section['level'], section['title']) for section in extract_outline(markdown)['sections']]
+
+
+def test_atx_headings_with_closing_hashes_and_sizes():
+    markdown = "Intro words here.\n\n# Guide #\n\nOne two three.\n\n## Pricing ##\n\nFour five.\n\n### Plans\n\nSix.\n\n## FAQ\n\nSeven eight nine ten.\n"
+    outline = extract_outline(markdown)
+    assert titles(markdown) == [(1, 'Guide'), (2, 'Pricing'), (3, 'Plans'), (2, 'FAQ')]
+    assert outline['intro_words'] == 3
+    assert [section['words'] for section in outline['sections']] == [3, 2, 1, 4]
+    assert [section['subtree_words'] for section in outline['sections']] == [10, 3, 1, 4]
+    pricing = outline['sections'][1]
+    assert markdown[pricing['start']:pricing['subtree_end']] == "## Pricing ##\n\nFour five.\n\n### Plans\n\nSix.\n\n"
+    assert outline['words'] == 13
+
+
+def test_setext_headings():
+    markdown = "Guide\n=====\n\nOne two.\n\nPricing\n-------\nThree.\n"
+    outline = extract_outline(markdown)
+    assert titles(markdown) == [(1, 'Guide'), (2, 'Pricing')]
+    assert outline['intro_words'] == 0
+    assert [section['words'] for section in outline['sections']] == [2, 1]
+    assert outline['words'] == 3
+
+
+def test_setext_underline_needs_a_single_line_paragraph():
+    # A thematic break after a list or a multi-line paragraph is not a heading
+    assert titles("- item\n---\n") == []
+    assert titles("Line one\nline two\n---\n") == []
+    assert titles("\n---\n") == []
+
+
+def test_headings_wrapped_in_emphasis_or_links():
+    markdown = "## **Pricing**\n\n**## Plans and tiers**\n\n### [FAQ](https://example.com/faq)\n\n## `Setup` _guide_\n"
+    assert titles(markdown) == [(2, 'Pricing'), (2, 'Plans and tiers'), (3, 'FAQ'), (2, 'Setup guide')]
+
+
+def test_headings_inside_fenced_code_are_ignored():
+    markdown = "## Install\n\n```bash\n# not a heading\npip install app\n```\n\n~~~~\n## also not\n```\n~~~~\n\n## Use\n"
+    assert titles(markdown) == [(2, 'Install'), (2, 'Use')]
+
+
+def test_empty_headings_are_skipped():
+    assert titles("#\n\n## \n\n## Real\n") == [(2, 'Real')]
+
+
+def test_outline_headers_keeps_requested_levels():
+    outline = extract_outline("# Title\n\n## Pricing\n\n### Plans\n\n#### Detail\n")
+    assert outline_headers(outline) == ['## Pricing', '### Plans']
+    assert outline_headers(outline, levels=(1,)) == ['# Title']
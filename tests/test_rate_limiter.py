@@ -0,0 +1,96 @@
+import anthropic
+import httpx
+import pytest
+
+from fake_llm import FakeAnthropic
+from llm import stream_message
+from rate_limiter import RateLimiter, TokenBucket, is_retryable, is_throttle
+from scheduler import PrioritySlots
+import rate_limiter
+
+REQUEST = httpx.Request('POST', 'https://api.anthropic.com/v1/messages')
+
+
+def status_error(status, error_type, headers=None):
+    return anthropic.APIStatusError(
+        error_type,
+        response=httpx.Response(status, request=REQUEST, headers=headers),
+        body={'type': 'error', 'error': {'type': error_type, 'message': error_type}}
+    )
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    monkeypatch.setattr(rate_limiter, 'BACKOFF_BASE', 0.001)
+    limiter = RateLimiter(max_retries=3, slots=PrioritySlots(4))
+    monkeypatch.setattr(rate_limiter, '_rate_limiter', limiter)
+    return limiter
+
+
+def failing_send(errors, result='ok'):
+    errors = list(errors)
+
+    def send():
+        if errors:
+            raise errors.pop(0)
+        return result
+    return send
+
+
+def test_error_classification():
+    assert is_retryable(status_error(529, 'overloaded_error')) and is_throttle(status_error(529, 'overloaded_error'))
+    # Errors sent as events in the middle of a stream come with status 200
+    assert is_retryable(status_error(200, 'overloaded_error')) and is_throttle(status_error(200, 'overloaded_error'))
+    assert is_retryable(httpx.ReadError('connection reset'))
+    assert not is_retryable(status_error(400, 'invalid_request_error'))
+
+
+def test_retries_throttles_and_transport_errors(limiter):
+    send = failing_send([status_error(429, 'rate_limit_error', {'retry-after': '0'}), httpx.RemoteProtocolError('peer closed')])
+    assert limiter.call(send, {'max_tokens': 10}) == 'ok'
+    stats = limiter.stats()
+    assert stats['retries'] == 2
+    assert stats['throttled'] == 1
+
+
+def test_non_retryable_errors_pass_through(limiter):
+    with pytest.raises(anthropic.APIStatusError):
+        limiter.call(failing_send([status_error(400, 'invalid_request_error')]), {'max_tokens': 10})
+    assert limiter.stats()['retries'] == 0
+
+
+def test_gives_up_after_max_retries(limiter):
+    with pytest.raises(anthropic.APIStatusError):
+        limiter.call(failing_send([status_error(529, 'overloaded_error')] * 4), {'max_tokens': 10})
+    assert limiter.stats()['failed'] == 1
+
+
+def test_throttling_halves_concurrency(limiter):
+    limiter.call(failing_send([status_error(529, 'overloaded_error')]), {'max_tokens': 10})
+    assert limiter.slots.limit == 2
+
+
+def test_stream_retried_after_mid_stream_overload(limiter):
+    client = FakeAnthropic(latency=0)
+    real_stream = client.messages.stream
+    attempts = []
+
+    def stream(**kwargs):
+        attempts.append(kwargs)
+        if len(attempts) == 1:
+            raise status_error(200, 'overloaded_error')
+        return real_stream(**kwargs)
+
+    client.messages.stream = stream
+    seen = []
+    message = stream_message(client, on_text=seen.append, use_cache=False, model='fake', max_tokens=10,
+                             messages=[{'role': 'user', 'content': 'Hello there'}])
+    assert len(attempts) == 2
+    assert message.content[0].text == 'Placeholder response to: Hello there'
+    assert seen[-1].strip() == message.content[0].text
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(600)  # 10 per second
+    assert bucket.take(600) == 0
+    assert bucket.take(2) > 0
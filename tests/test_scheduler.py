@@ -0,0 +1,113 @@
+import threading
+import time
+
+from fake_llm import FakeAnthropic
+from jobs import JobStore, JobEngine
+from llm import create_message
+from rate_limiter import RateLimiter
+from scheduler import pick_next_job, priority_class, PrioritySlots
+import rate_limiter
+
+
+def queued_job(job_id, user, client='Acme', priority='bulk', created=None):
+    return {'id': job_id, 'priority': priority, 'user': user, 'client': client, 'created': created or time.time()}
+
+
+def test_pick_next_job_prefers_interactive():
+    queued = [queued_job(1, 'alice'), queued_job(2, 'bob', priority='interactive')]
+    assert pick_next_job(queued, {}, {})['id'] == 2
+
+
+def test_pick_next_job_fair_share_between_users_and_clients():
+    queued = [queued_job(1, 'alice'), queued_job(2, 'bob')]
+    # alice already has a job running, so bob goes next even though alice's job is older
+    assert pick_next_job(queued, {('alice', 'Acme'): 1}, {})['id'] == 2
+
+    queued = [queued_job(1, 'bob', 'Globex'), queued_job(2, 'bob', 'Initech')]
+    assert pick_next_job(queued, {('bob', 'Globex'): 1}, {})['id'] == 2
+
+
+def test_pick_next_job_promotes_aged_bulk_jobs():
+    now = time.time()
+    queued = [queued_job(1, 'alice', created=now - 1000), queued_job(2, 'bob', priority='interactive', created=now)]
+    assert pick_next_job(queued, {}, {}, now=now, aging_seconds=900)['id'] == 1
+    assert pick_next_job(queued, {}, {}, now=now, aging_seconds=2000)['id'] == 2
+
+
+def test_job_store_interleaves_users():
+    store = JobStore(':memory:')
+    for i in range(5):
+        store.add('generate', {}, priority='bulk', user='alice')
+    store.add('generate', {}, priority='bulk', user='bob')
+    store.add('generate', {}, priority='bulk', user='carol')
+
+    users = [store.claim()['user'] for _ in range(3)]
+    assert sorted(users) == ['alice', 'bob', 'carol']
+
+
+def test_job_store_bulk_limit_keeps_a_worker_for_interactive_jobs():
+    store = JobStore(':memory:')
+    for _ in range(3):
+        store.add('generate', {}, priority='bulk', user='alice')
+
+    assert store.claim(bulk_limit=1)['priority'] == 'bulk'
+    assert store.claim(bulk_limit=1) is None
+
+    store.add('link', {}, priority='interactive', user='dave')
+    assert store.claim(bulk_limit=1)['user'] == 'dave'
+
+
+def test_priority_slots_serve_interactive_waiters_first():
+    slots = PrioritySlots(1)
+    slots.acquire('bulk')
+    order = []
+
+    def waiter(priority):
+        with slots.slot(priority):
+            order.append(priority)
+
+    threads = [threading.Thread(target=waiter, args=('bulk',))]
+    threads[0].start()
+    time.sleep(0.05)
+    threads.append(threading.Thread(target=waiter, args=('interactive',)))
+    threads[1].start()
+    time.sleep(0.05)
+
+    slots.release()
+    for thread in threads:
+        thread.join(5)
+    assert order == ['interactive', 'bulk']
+
+
+def test_engine_never_exceeds_the_claude_slot_limit(monkeypatch):
+    slots = PrioritySlots(2)
+    monkeypatch.setattr(rate_limiter, '_rate_limiter', RateLimiter(slots=slots))
+    client = FakeAnthropic(latency=0.05)
+
+    def handler(params, api_key, progress):
+        message = create_message(client, use_cache=False, model='fake', max_tokens=10, messages=[{'role': 'user', 'content': 'hi'}])
+        return {'status': 'complete', 'text': message.content[0].text}
+
+    store = JobStore(':memory:')
+    engine = JobEngine(store, api_key='fake', workers=6, handlers={'work': handler}, poll_interval=0.01, reserved_interactive=0)
+    job_ids = [engine.submit('work', {}, user=f"user{i % 3}", priority='bulk') for i in range(12)]
+    engine.start()
+    try:
+        deadline = time.time() + 10
+        while time.time() < deadline and any(store.get(job_id)['status'] in ('queued', 'running') for job_id in job_ids):
+            time.sleep(0.02)
+    finally:
+        engine.stop(timeout=5)
+
+    assert all(store.get(job_id)['status'] == 'complete' for job_id in job_ids)
+    assert client.messages.calls == 12
+    assert client.messages.peak_in_flight <= 2
+
+
+def test_priority_class_sets_call_priority():
+    slots = PrioritySlots(1)
+    with priority_class('bulk'):
+        with slots.slot():
+            pass
+    assert slots.stats()['bulk']['acquired'] == 1
+    assert slots.stats()['interactive']['acquired'] == 0
@@ -0,0 +1,92 @@
+from types import SimpleNamespace
+
+import pytest
+
+from scrape_cache import ScrapeCache, normalize_url
+import scrape_cache
+import scraper
+
+PAGE = "# Guide\n\n## First step\n\nSome text.\n"
+
+
+class Clock:
+    """Stand-in for time.time that only moves when told to."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeFirecrawl:
+    """scrape(url) returns pages[url]; URLs missing from pages fail."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.scraped = []
+
+    def scrape(self, url, timeout=None):
+        self.scraped.append(url)
+        if url not in self.pages:
+            raise Exception("Scrape failed")
+        return SimpleNamespace(markdown=self.pages[url])
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ScrapeCache(':memory:')
+    monkeypatch.setattr(scraper, 'get_scrape_cache', lambda: cache)
+    monkeypatch.setattr(scraper, 'SCRAPE_CACHE_ENABLED', True)
+    return cache
+
+
+def serve(monkeypatch, pages):
+    firecrawl = FakeFirecrawl(pages)
+    monkeypatch.setattr(scraper, 'get_firecrawl_client', lambda key: firecrawl)
+    return firecrawl
+
+
+def test_equivalent_urls_share_an_entry():
+    assert normalize_url('https://WWW.Example.com:443/guide/?utm_source=x&b=2&a=1#top') == 'https://example.com/guide?a=1&b=2'
+    assert normalize_url('http://example.com:8080/') == 'http://example.com:8080/'
+
+
+def test_expired_page_is_rescraped_and_compared(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(scrape_cache.time, 'time', clock)
+    cache = ScrapeCache(':memory:', ttl_seconds=60)
+
+    assert cache.put('https://example.com/a', PAGE, []) is None
+    clock.now += 30
+    assert cache.get('https://www.example.com/a/')['markdown'] == PAGE
+    clock.now += 31
+    assert cache.get('https://example.com/a') is None
+
+    assert cache.put('https://example.com/a', PAGE, []) is False
+    assert cache.put('https://example.com/a', PAGE + "More.", []) is True
+    stats = cache.stats()
+    assert (stats['hits'], stats['expired'], stats['unchanged'], stats['changed'], stats['entries']) == (1, 1, 1, 1, 1)
+
+
+def test_failed_scrapes_are_not_cached(monkeypatch, cache):
+    firecrawl = serve(monkeypatch, {'https://example.com/a': PAGE})
+    results = scraper.scrape_urls(['https://example.com/a', 'https://example.com/b'], 'key')
+    assert results[0]['error'] is None and results[0]['headers'] == ['## First step']
+    assert results[1]['error'] == "Scrape failed" and results[1]['markdown'] == ''
+    assert cache.stats()['entries'] == 1
+
+    # The cached page is served; the failed one is tried again
+    results = scraper.scrape_urls(['https://example.com/a', 'https://example.com/b'], 'key')
+    assert results[0]['cached'] is True and results[0]['markdown'] == PAGE
+    assert results[1]['cached'] is False and results[1]['error'] == "Scrape failed"
+    assert firecrawl.scraped.count('https://example.com/a') == 1
+    assert firecrawl.scraped.count('https://example.com/b') == 2
+
+
+def test_use_cache_false_always_scrapes(monkeypatch, cache):
+    firecrawl = serve(monkeypatch, {'https://example.com/a': PAGE})
+    scraper.scrape_urls(['https://example.com/a'], 'key')
+    results = scraper.scrape_urls(['https://example.com/a'], 'key', use_cache=False)
+    assert results[0]['cached'] is False
+    assert len(firecrawl.scraped) == 2
@@ -0,0 +1,70 @@
+import pytest
+
+from api_clients import get_anthropic_client
+from section_store import SectionStore
+import write_article
+
+BRIEF = '\n'.join(f"## H2 Section {i} (100 words)\nCover point {i}." for i in range(5))
+
+
+class FailingResponder:
+    """Placeholder answers numbered by call; fails on one section while fail_on is set."""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.calls = 0
+
+    def __call__(self, kwargs):
+        prompt = kwargs['messages'][-1]['content'][-1]['text']
+        if self.fail_on and self.fail_on in prompt:
+            raise Exception("section failed")
+        self.calls += 1
+        return f"Section text {self.calls}"
+
+
+@pytest.fixture
+def responder(monkeypatch):
+    store = SectionStore(':memory:')
+    monkeypatch.setattr(write_article, 'get_section_store', lambda: store)
+    responder = FailingResponder()
+    messages = get_anthropic_client('fake').messages
+    monkeypatch.setattr(messages, 'responder', responder)
+    monkeypatch.setattr(messages, 'latency', 0)
+    return responder
+
+
+def generate(**kwargs):
+    return write_article.generate_article(BRIEF, 'Company', 'ICP', '', 'fake', progress_callback=lambda *args: None, use_cache=False, **kwargs)
+
+
+def test_failed_run_resumes_from_first_missing_section(responder):
+    responder.fail_on = 'H2: Section 3'
+    with pytest.raises(Exception):
+        generate()
+    assert responder.calls == 3
+
+    responder.fail_on = None
+    article, log = generate()
+    # Only sections 3 and 4 are written again
+    assert responder.calls == 5
+    assert log.count('↺ Restored') == 3
+    assert [line for line in article.split('\n') if line.startswith('Section text')] == [f"Section text {i}" for i in range(1, 6)]
+
+
+def test_regenerate_rewrites_only_the_chosen_section(responder):
+    first, _ = generate()
+    regenerated, log = generate(regenerate=[2])
+    assert responder.calls == 6
+    assert log.count('↺ Restored') == 4
+    assert 'Section text 6' in regenerated and 'Section text 3' not in regenerated
+
+    # Later runs pick up the regenerated version
+    again, _ = generate()
+    assert again == regenerated
+    assert responder.calls == 6
+
+
+def test_prompt_change_writes_sections_again(responder):
+    generate()
+    generate(context_mode='window')
+    assert responder.calls == 10
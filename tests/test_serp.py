@@ -0,0 +1,66 @@
+import pytest
+
+from serp import SerpCache, google_search, search_keywords
+import serp
+
+
+class FakeSerpAPI:
+    """serpapi_search stand-in returning num numbered results per query."""
+
+    def __init__(self):
+        self.searches = []
+
+    def __call__(self, params):
+        self.searches.append(dict(params))
+        num = int(params.get('num', 10))
+        return {
+            'organic_results': [{'link': f"https://example.com/{params['q'].replace(' ', '-')}/{i}"} for i in range(num)],
+            'related_questions': [{'question': f"What is {params['q']}?"}],
+            'search_metadata': {'id': 'not kept'},
+        }
+
+
+@pytest.fixture
+def search(monkeypatch):
+    search = FakeSerpAPI()
+    cache = SerpCache(':memory:')
+    monkeypatch.setattr(serp, 'serpapi_search', search)
+    monkeypatch.setattr(serp, 'get_serp_cache', lambda: cache)
+    monkeypatch.setattr(serp, 'SERP_CACHE_ENABLED', True)
+    return search
+
+
+def test_larger_cached_search_serves_fewer_results(search):
+    ten = google_search({'q': 'Payment  Automation', 'num': 10, 'api_key': 'key'})
+    five = google_search({'q': 'payment automation', 'num': 5, 'api_key': 'key'})
+    assert len(search.searches) == 1
+    assert five['organic_results'] == ten['organic_results'][:5]
+    assert five['related_questions'] == ten['related_questions']
+    assert 'search_metadata' not in five
+
+    # More results than were cached, or another locale, need a new search
+    assert len(google_search({'q': 'payment automation', 'num': 20, 'api_key': 'key'})['organic_results']) == 20
+    google_search({'q': 'payment automation', 'num': 5, 'gl': 'uk', 'api_key': 'key'})
+    assert len(search.searches) == 3
+
+
+def test_expired_searches_are_not_served(monkeypatch, search):
+    monkeypatch.setattr(serp, 'get_serp_cache', lambda: SerpCache(':memory:', ttl_seconds=-1))
+    google_search({'q': 'invoices', 'num': 10, 'api_key': 'key'})
+    google_search({'q': 'invoices', 'num': 10, 'api_key': 'key'})
+    assert len(search.searches) == 2
+
+
+def test_search_keywords_deduplicates_and_reports_failures(monkeypatch, search):
+    def failing(params):
+        if params['q'] == 'broken':
+            raise Exception("SerpAPI error")
+        return search(params)
+
+    monkeypatch.setattr(serp, 'serpapi_search', failing)
+    results = search_keywords(['invoices', ' invoices ', 'broken', 'payments'], 'key', num=3)
+    assert list(results) == ['invoices', 'broken', 'payments']
+    assert results['invoices']['urls'] == [f"https://example.com/invoices/{i}" for i in range(3)]
+    assert results['invoices']['people_also_ask'] == ["What is invoices?"]
+    assert results['broken'] == {'urls': [], 'people_also_ask': [], 'error': "SerpAPI error"}
+    assert [params['q'] for params in search.searches].count('invoices') == 1
@@ -0,0 +1,122 @@
+import gzip
+
+import pytest
+import requests
+
+import sitemap
+
+
+def urlset(*urls):
+    return ('<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+            + ''.join(f"<url><loc>{url}</loc></url>" for url in urls) + '</urlset>').encode('utf-8')
+
+
+def sitemapindex(*urls):
+    return ('<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+            + ''.join(f"<sitemap><loc>{url}</loc></sitemap>" for url in urls) + '</sitemapindex>').encode('utf-8')
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, body=b'', headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), 7):
+            yield self.body[start:start + 7]
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error")
+
+
+class FakeSession:
+    """Serves files from a dict of url -> (body, headers); honours If-None-Match / If-Modified-Since."""
+
+    def __init__(self, files):
+        self.files = files
+        self.requests = []
+
+    def get(self, url, headers=None, stream=False, timeout=None):
+        headers = headers or {}
+        self.requests.append((url, headers))
+        if url not in self.files:
+            return FakeResponse(404)
+        body, file_headers = self.files[url]
+        if (headers.get('If-None-Match') and headers['If-None-Match'] == file_headers.get('ETag')) or \
+                (headers.get('If-Modified-Since') and headers['If-Modified-Since'] == file_headers.get('Last-Modified')):
+            return FakeResponse(304)
+        return FakeResponse(200, body, file_headers)
+
+
+@pytest.fixture
+def serve(monkeypatch, tmp_path):
+    monkeypatch.setattr(sitemap, 'CACHE_DIR', str(tmp_path))
+
+    def serve(files):
+        session = FakeSession(files)
+        monkeypatch.setattr(sitemap, 'get_http_session', lambda: session)
+        return session
+
+    return serve
+
+
+def test_nested_sitemap_index_with_gzipped_children(serve):
+    serve({
+        'https://example.com/sitemap.xml': (sitemapindex('https://example.com/posts.xml', 'https://example.com/more.xml'), {}),
+        'https://example.com/posts.xml': (sitemapindex('https://example.com/posts-1.xml.gz'), {}),
+        'https://example.com/posts-1.xml.gz': (gzip.compress(urlset('https://example.com/blog/payment-automation', 'https://example.com/a')), {}),
+        'https://example.com/more.xml': (urlset('https://example.com/a', 'https://example.com/pricing/'), {}),
+    })
+    pages = sitemap.fetch_sitemap_pages('https://example.com/sitemap.xml')
+    assert pages == [
+        {'url': 'https://example.com/a', 'title': 'A'},
+        {'url': 'https://example.com/pricing/', 'title': 'Pricing'},
+        {'url': 'https://example.com/blog/payment-automation', 'title': 'Payment Automation'},
+    ]
+
+
+def test_failing_child_is_skipped(serve):
+    serve({
+        'https://example.com/sitemap.xml': (sitemapindex('https://example.com/missing.xml', 'https://example.com/pages.xml'), {}),
+        'https://example.com/pages.xml': (urlset('https://example.com/a'), {}),
+    })
+    progress = []
+    pages = sitemap.fetch_sitemap_pages('https://example.com/sitemap.xml', progress_callback=progress.append)
+    assert pages == [{'url': 'https://example.com/a', 'title': 'A'}]
+    assert any(line.startswith("Skipping child sitemap https://example.com/missing.xml: 404") for line in progress)
+    assert progress[-1].endswith("1 failed)")
+
+
+def test_failing_root_raises(serve):
+    serve({})
+    with pytest.raises(requests.HTTPError):
+        sitemap.fetch_sitemap_pages('https://example.com/sitemap.xml')
+
+
+@pytest.mark.parametrize('validator', ['ETag', 'Last-Modified'])
+def test_stale_copy_is_revalidated(serve, monkeypatch, validator):
+    url = 'https://example.com/sitemap.xml'
+    headers = {'ETag': '"v1"'} if validator == 'ETag' else {'Last-Modified': 'Wed, 01 Jan 2025 00:00:00 GMT'}
+    session = serve({url: (urlset('https://example.com/a'), headers)})
+
+    assert sitemap.fetch_sitemap_file(url)[2] == 'network'
+    assert sitemap.fetch_sitemap_file(url) == ('urlset', ['https://example.com/a'], 'cache')
+    assert len(session.requests) == 1
+
+    monkeypatch.setattr(sitemap, 'FRESH_SECONDS', 0)
+    assert sitemap.fetch_sitemap_file(url) == ('urlset', ['https://example.com/a'], 'revalidated')
+    sent = session.requests[-1][1]
+    assert sent == ({'If-None-Match': '"v1"'} if validator == 'ETag' else {'If-Modified-Since': headers['Last-Modified']})
+
+    # A changed file is downloaded again
+    session.files[url] = (urlset('https://example.com/b'), {'ETag': '"v2"'})
+    assert sitemap.fetch_sitemap_file(url) == ('urlset', ['https://example.com/b'], 'network')
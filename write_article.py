@@ -1,9 +1,289 @@
-from anthropic import Anthropic
+from api_clients import get_anthropic_client
+from llm import build_cached_prompt, create_message, stream_message, usage_counts, add_usage, format_usage
+from model_routing import get_route
+from rate_limiter import CHARS_PER_TOKEN
+from section_store import get_section_store, brief_hash, prompt_hash
 import re
 import os
-import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-def generate_article(article_brief_text, company_brief_text, icp_brief_text, writing_guidelines_text, api_key, progress_callback=None):
+def parse_brief(brief):
+    """
+    Parse brief into sections with structure:
+    {
+        'level': 'H2' or 'H3',
+        'title': 'Section Title',
+        'word_count': 150,
+        'guidelines': 'Write this section...'
+    }
+    """
+    sections = []
+    lines = brief.split('\n')
+    i = 0
+
+    while i < len(lines):
+        line = lines[i].strip()
+
+        # Check for H2 or H3 header
+        if line.startswith('## H2 ') or line.startswith('### H3 '):
+            level = 'H2' if line.startswith('## H2 ') else 'H3'
+
+            # Extract title and word count
+            # Format: "H2 Title (150 words)" or "H2 Title (150)"
+            rest = line[6:].strip() if level == 'H2' else line[7:].strip()  # Remove "## H2 " or "### H3 "
+
+            # Find word count in parentheses
+            word_count_match = re.search(r'\((\d+)\s*(?:words?)?\)', rest)
+
+            if word_count_match:
+                word_count = int(word_count_match.group(1))
+                title = rest[:word_count_match.start()].strip()
+            else:
+                # No word count specified, default to 200
+                word_count = 200
+                title = rest
+
+            # Get guidelines (next line(s) until next header or end)
+            i += 1
+            guidelines_lines = []
+            while i < len(lines):
+                next_line = lines[i].strip()
+                if next_line.startswith('## H2 ') or next_line.startswith('### H3 '):
+                    break
+                if next_line:  # Skip empty lines
+                    guidelines_lines.append(next_line)
+                i += 1
+
+            guidelines = ' '.join(guidelines_lines)
+
+            sections.append({
+                'level': level,
+                'title': title,
+                'word_count': word_count,
+                'guidelines': guidelines
+            })
+
+            continue
+
+        i += 1
+
+    return sections
+
+
+# How much of the brief each section prompt sees:
+# 'full'   - the whole brief in the shared context (every section pays for every section's guidelines)
+# 'window' - a titles-only outline in the shared context, plus the section's parent H2 and
+#            its immediate neighbours' guidelines in the section prompt
+CONTEXT_MODES = ('full', 'window')
+
+# Prompt caching prices relative to uncached input tokens
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.1
+
+
+def format_outline(sections):
+    """Titles-only outline of parsed sections, H3s indented under their H2."""
+    return '\n'.join(
+        f"{'  ' if section['level'] == 'H3' else ''}{section['level']}: {section['title']}"
+        for section in sections
+    )
+
+
+def section_window(sections, index):
+    """
+    Local context for one section in 'window' mode: its parent H2 and its neighbours' guidelines.
+    
+    Args:
+        sections: parse_brief result
+        index: Position of the section in sections (0-based)
+    
+    Returns:
+        str: Context block for the section prompt (empty if there is nothing around it)
+    """
+    section = sections[index]
+    blocks = []
+    
+    parent = None
+    if section['level'] == 'H3':
+        parent = next((sections[i] for i in range(index - 1, -1, -1) if sections[i]['level'] == 'H2'), None)
+        if parent:
+            blocks.append(f"PARENT SECTION ({parent['level']}: {parent['title']}):\n{parent['guidelines']}")
+    
+    # The parent is usually also the previous section; don't repeat it
+    if index > 0 and sections[index - 1] is not parent:
+        previous = sections[index - 1]
+        blocks.append(f"PREVIOUS SECTION ({previous['level']}: {previous['title']}) - already covered, don't repeat it:\n{previous['guidelines']}")
+    if index + 1 < len(sections):
+        following = sections[index + 1]
+        blocks.append(f"NEXT SECTION ({following['level']}: {following['title']}) - covered next, leave it for there:\n{following['guidelines']}")
+    
+    return '\n\n'.join(blocks)
+
+
+def build_shared_context(article_brief_text, company_brief_text, icp_brief_text, writing_guidelines_text, context_mode='full'):
+    """Build the context block shared by every section prompt of an article (see CONTEXT_MODES)."""
+    guidelines_block = f"GLOBAL WRITING GUIDELINES:\n{writing_guidelines_text}" if writing_guidelines_text else ''
+    
+    if context_mode == 'window':
+        brief_block = f"ARTICLE OUTLINE (all sections, in order):\n{format_outline(parse_brief(article_brief_text))}"
+    else:
+        brief_block = f"FULL ARTICLE BRIEF (for context):\n{article_brief_text}"
+    
+    return f"""You are writing ONE SECTION of an article. Write ONLY this section, nothing else.
+
+{brief_block}
+
+COMPANY CONTEXT:
+{company_brief_text}
+
+TARGET AUDIENCE:
+{icp_brief_text}
+
+{guidelines_block}"""
+
+
+def build_section_request(shared_context, section, route=None, window=''):
+    """
+    Build the messages.create arguments for writing one section.
+    
+    Args:
+        shared_context: build_shared_context result
+        section: parse_brief section
+        route: 'section' route to use (model and max_tokens); defaults to get_route('section')
+        window: section_window result in 'window' context mode
+    
+    Returns:
+        dict: model, max_tokens and messages (shared context cached, section prompt last)
+    """
+    # Determine section type for prompt
+    if section['level'] == 'H2':
+        section_type = "an H2 section intro paragraph"
+    else:
+        section_type = "an H3 subsection"
+    
+    window_block = f"SURROUNDING SECTIONS (for context):\n{window}\n\n" if window else ''
+    
+    section_prompt = f"""{window_block}SECTION TO WRITE:
+{section['level']}: {section['title']}
+
+WORD COUNT TARGET: {section['word_count']} words
+
+WRITING GUIDELINES FOR THIS SECTION:
+{section['guidelines']}
+
+Instructions:
+- Write ONLY the body content for this section
+- Do NOT include the section header (## or ###) - it will be added automatically
+- Start directly with the paragraph content
+- Follow the section-specific writing guidelines exactly
+- Target approximately {section['word_count']} words (±10% is acceptable)
+- Use markdown formatting for emphasis within the content
+- This is {section_type} - write accordingly
+
+Write the section content now:"""
+
+    route = route or get_route('section')
+    return dict(
+        model=route['model'],
+        max_tokens=route['max_tokens'],
+        messages=[{
+            "role": "user",
+            "content": build_cached_prompt([shared_context], section_prompt)
+        }]
+    )
+
+
+def estimate_tokens(text):
+    """Rough token count of prompt text."""
+    return len(text) // CHARS_PER_TOKEN
+
+
+def context_token_report(article_brief_text, company_brief_text, icp_brief_text, writing_guidelines_text):
+    """
+    Estimate the input tokens of every section prompt of an article in each context mode.
+    
+    Returns:
+        dict: mode -> {'sections', 'shared_tokens', 'section_tokens', 'largest_request',
+            'input_tokens' (everything sent), 'cached_equivalent' (input cost in uncached tokens
+            when the shared context is written to the prompt cache once and read by the other sections)}
+    """
+    sections = parse_brief(article_brief_text)
+    report = {}
+    
+    for mode in CONTEXT_MODES:
+        shared_tokens = estimate_tokens(build_shared_context(
+            article_brief_text, company_brief_text, icp_brief_text, writing_guidelines_text, context_mode=mode
+        ))
+        per_section = []
+        for index, section in enumerate(sections):
+            window = section_window(sections, index) if mode == 'window' else ''
+            request = build_section_request('', section, window=window)
+            per_section.append(estimate_tokens(request['messages'][0]['content'][-1]['text']))
+        
+        count = len(sections)
+        report[mode] = {
+            'sections': count,
+            'shared_tokens': shared_tokens,
+            'section_tokens': sum(per_section),
+            'largest_request': shared_tokens + max(per_section, default=0),
+            'input_tokens': shared_tokens * count + sum(per_section),
+            'cached_equivalent': round(
+                (shared_tokens * (CACHE_WRITE_MULTIPLIER + CACHE_READ_MULTIPLIER * (count - 1)) if count else 0)
+                + sum(per_section)
+            )
+        }
+    
+    return report
+
+
+def format_context_report(report):
+    """
+    One line per context mode, plus how 'window' compares with 'full'.
+    
+    The comparison gives both the tokens sent and the cost with prompt caching: the window
+    shares less context, so it can send fewer tokens yet cost more once cache reads are counted.
+    """
+    def change(full, window):
+        if window <= full:
+            return f"{100 * (full - window) / full:.0f}% fewer"
+        return f"{100 * (window - full) / full:.0f}% more"
+    
+    lines = []
+    for mode, stats in report.items():
+        lines.append(
+            f"{mode}: {stats['sections']} sections, ~{stats['input_tokens']:,} input tokens sent "
+            f"(shared {stats['shared_tokens']:,} x {stats['sections']} + sections {stats['section_tokens']:,}), "
+            f"~{stats['cached_equivalent']:,} with prompt caching, largest request ~{stats['largest_request']:,}"
+        )
+    full, window = report['full'], report['window']
+    if full['input_tokens'] and full['cached_equivalent']:
+        lines.append(
+            f"window vs full: {change(full['input_tokens'], window['input_tokens'])} input tokens sent, "
+            f"{change(full['cached_equivalent'], window['cached_equivalent'])} with prompt caching"
+        )
+    return '\n'.join(lines)
+
+
+def assemble_article(article_sections):
+    """Join written sections (dicts with level, title, content) into the final markdown article."""
+    full_article = []
+    
+    for section in article_sections:
+        # Add header
+        if section['level'] == 'H2':
+            full_article.append(f"\n## {section['title']}\n")
+        else:
+            full_article.append(f"\n### {section['title']}\n")
+        
+        # Add content
+        full_article.append(section['content'])
+    
+    return '\n'.join(full_article)
+
+
+def generate_article(article_brief_text, company_brief_text, icp_brief_text, writing_guidelines_text, api_key, progress_callback=None, max_workers=1, stream=False, use_cache=True, model_routes=None, context_mode='full', checkpoints=True, regenerate=None):
     """
     Generate an article from briefs using Claude AI.
     Handles both H2 and H3 sections with individual word counts.
@@ -15,11 +295,22 @@ def generate_article(article_brief_text, company_brief_text, icp_brief_text, wri
         writing_guidelines_text: Global writing guidelines (optional, can be empty string)
         api_key: Anthropic API key
         progress_callback: Optional function to call with progress updates (text, progress_pct)
+        max_workers: Number of sections to write in parallel (1 = one after another)
+        stream: Stream section text as it is written; partial text is sent through progress_callback
+        use_cache: Reuse identical earlier responses from the on-disk response cache
+        model_routes: The client's model routing overrides (see model_routing.py)
+        context_mode: How much of the brief each section sees, 'full' or 'window' (see CONTEXT_MODES)
+        checkpoints: Store each written section and restore sections already written for the
+            same brief and prompt (see section_store.py), so a failed run resumes where it stopped
+        regenerate: Indexes (0-based) of sections to write again even if checkpointed or cached
     
     Returns:
         tuple: (final_article_text, log_text)
     """
     
+    if context_mode not in CONTEXT_MODES:
+        raise Exception(f"Unknown context mode '{context_mode}' (use {' or '.join(CONTEXT_MODES)})")
+    
     def update_progress(text, pct=None):
         if progress_callback:
             progress_callback(text, pct)
@@ -27,142 +318,97 @@ def generate_article(article_brief_text, company_brief_text, icp_brief_text, wri
             print(text)
     
     # Initialize client
-    client = Anthropic(api_key=api_key)
+    client = get_anthropic_client(api_key)
     
     update_progress("Parsing article brief...")
     
-    # Parse sections from brief
-    def parse_brief(brief):
-        """
-        Parse brief into sections with structure:
-        {
-            'level': 'H2' or 'H3',
-            'title': 'Section Title',
-            'word_count': 150,
-            'guidelines': 'Write this section...'
-        }
-        """
-        sections = []
-        lines = brief.split('\n')
-        i = 0
-        
-        while i < len(lines):
-            line = lines[i].strip()
-            
-            # Check for H2 or H3 header
-            if line.startswith('## H2 ') or line.startswith('### H3 '):
-                level = 'H2' if line.startswith('## H2 ') else 'H3'
-                
-                # Extract title and word count
-                # Format: "H2 Title (150 words)" or "H2 Title (150)"
-                rest = line[6:].strip() if level == 'H2' else line[7:].strip()  # Remove "## H2 " or "### H3 "
-                
-                # Find word count in parentheses
-                word_count_match = re.search(r'\((\d+)\s*(?:words?)?\)', rest)
-                
-                if word_count_match:
-                    word_count = int(word_count_match.group(1))
-                    title = rest[:word_count_match.start()].strip()
-                else:
-                    # No word count specified, default to 200
-                    word_count = 200
-                    title = rest
-                
-                # Get guidelines (next line(s) until next header or end)
-                i += 1
-                guidelines_lines = []
-                while i < len(lines):
-                    next_line = lines[i].strip()
-                    if next_line.startswith('## H2 ') or next_line.startswith('### H3 '):
-                        break
-                    if next_line:  # Skip empty lines
-                        guidelines_lines.append(next_line)
-                    i += 1
-                
-                guidelines = ' '.join(guidelines_lines)
-                
-                sections.append({
-                    'level': level,
-                    'title': title,
-                    'word_count': word_count,
-                    'guidelines': guidelines
-                })
-                
-                continue
-            
-            i += 1
-        
-        return sections
-    
     sections = parse_brief(article_brief_text)
     update_progress(f"✓ Parsed {len(sections)} sections from brief")
     
     # Log file
     log = []
     log.append(f"Article Generation Log\n{'='*50}\n")
-    log.append(f"Total sections to write: {len(sections)}\n\n")
+    log.append(f"Total sections to write: {len(sections)}\n")
+    context_report = context_token_report(article_brief_text, company_brief_text, icp_brief_text, writing_guidelines_text)
+    log.append(f"Section context: {context_mode}\n{format_context_report(context_report)}\n\n")
     
     # Write each section
-    article_sections = []
+    total_sections = len(sections)
+    article_sections = [None] * total_sections
+    section_logs = [None] * total_sections
+    section_usage = [None] * total_sections
+    
+    # Latest streamed text, written by whichever worker is streaming and read by the calling thread
+    partial_lock = threading.Lock()
+    latest_partial = {'text': None, 'reported': None}
+    
+    # Sections written on the calling thread (all of them, or the first one before fanning out) report directly
+    calling_thread = threading.get_ident()
+    
+    def on_partial(section, text):
+        preview = f"Writing {section['level']}: {section['title']}...\n\n{text}"
+        if max_workers <= 1 or threading.get_ident() == calling_thread:
+            update_progress(preview)
+        else:
+            with partial_lock:
+                latest_partial['text'] = preview
+    
+    def report_partial():
+        with partial_lock:
+            text = latest_partial['text']
+        if text is not None and text is not latest_partial['reported']:
+            latest_partial['reported'] = text
+            update_progress(text)
+    
+    # Context shared by every section goes first so it is served from the prompt cache
+    shared_context = build_shared_context(article_brief_text, company_brief_text, icp_brief_text, writing_guidelines_text, context_mode)
+    route = get_route('section', model_routes)
+    
+    section_requests = [
+        build_section_request(shared_context, section, route, section_window(sections, index) if context_mode == 'window' else '')
+        for index, section in enumerate(sections)
+    ]
+    
+    # Restore sections already written for this brief and prompt
+    store = get_section_store() if checkpoints else None
+    article_hash = brief_hash(article_brief_text)
+    regenerate = set(regenerate or [])
+    restored_usage = {}
+    if store:
+        for index, section in enumerate(sections):
+            if index in regenerate:
+                continue
+            checkpoint = store.get(article_hash, index, prompt_hash(section_requests[index]))
+            if checkpoint is None:
+                continue
+            article_sections[index] = {'level': section['level'], 'title': section['title'], 'content': checkpoint['content']}
+            add_usage(restored_usage, checkpoint['usage'])
+            section_logs[index] = f"↺ Restored {section['level']}: {section['title']} from checkpoint ({len(checkpoint['content'].split())} words; {checkpoint['model']})\n"
+    restored = sum(section is not None for section in article_sections)
+    if restored:
+        update_progress(f"↺ Restored {restored}/{total_sections} sections from checkpoints", restored / total_sections)
     
     def write_section(section, index):
-        """Write one section"""
+        """Write one section (may run on a worker thread, so no progress updates here)"""
         section_label = f"{section['level']}: {section['title']}"
         
-        update_progress(f"Writing {section_label} ({section['word_count']} words)...")
+        request = section_requests[index - 1]
+        # A regenerated section must not come back from the response cache either
+        section_use_cache = use_cache and (index - 1) not in regenerate
         
-        # Determine section type for prompt
-        if section['level'] == 'H2':
-            section_type = "an H2 section intro paragraph"
+        if stream:
+            message = stream_message(client, on_text=lambda text: on_partial(section, text), use_cache=section_use_cache, timeout=route['timeout'], **request)
         else:
-            section_type = "an H3 subsection"
-        
-        prompt = f"""You are writing ONE SECTION of an article. Write ONLY this section, nothing else.
-
-FULL ARTICLE BRIEF (for context):
-{article_brief_text}
-
-COMPANY CONTEXT:
-{company_brief_text}
-
-TARGET AUDIENCE:
-{icp_brief_text}
-
-{'GLOBAL WRITING GUIDELINES:\n' + writing_guidelines_text if writing_guidelines_text else ''}
-
-SECTION TO WRITE:
-{section['level']}: {section['title']}
-
-WORD COUNT TARGET: {section['word_count']} words
-
-WRITING GUIDELINES FOR THIS SECTION:
-{section['guidelines']}
-
-Instructions:
-- Write ONLY the body content for this section
-- Do NOT include the section header (## or ###) - it will be added automatically
-- Start directly with the paragraph content
-- Follow the section-specific writing guidelines exactly
-- Target approximately {section['word_count']} words (±10% is acceptable)
-- Use markdown formatting for emphasis within the content
-- This is {section_type} - write accordingly
-
-Write the section content now:"""
-
-        message = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=4000,
-            messages=[{
-                "role": "user",
-                "content": prompt
-            }]
-        )
+            message = create_message(client, use_cache=section_use_cache, timeout=route['timeout'], **request)
         
         section_content = message.content[0].text.strip()
+        section_usage[index - 1] = usage_counts(message.usage)
+        if store:
+            store.put(article_hash, index - 1, prompt_hash(request), section_content, message.model, section_usage[index - 1])
         
         # Count words
         word_count = len(section_content.split())
-        log.append(f"✓ Wrote {section_label} ({word_count} words, target: {section['word_count']})\n")
+        section_logs[index - 1] = f"✓ Wrote {section_label} ({word_count} words, target: {section['word_count']}; {message.model}; {format_usage(section_usage[index - 1])})\n"
         
         return {
             'level': section['level'],
@@ -170,31 +416,63 @@ Write the section content now:"""
             'content': section_content
         }
     
-    # Write all sections one by one
-    total_sections = len(sections)
-    for i, section in enumerate(sections, 1):
-        written_section = write_section(section, i)
-        article_sections.append(written_section)
-        update_progress(f"Completed {i}/{total_sections} sections", (i / total_sections))
-        time.sleep(1)  # Rate limiting
+    missing = [i for i in range(1, total_sections + 1) if article_sections[i - 1] is None]
+    completed = restored
     
-    # Assemble full article
-    def assemble_article():
-        full_article = []
+    if max_workers <= 1:
+        # Write the remaining sections one by one
+        for i in missing:
+            section = sections[i - 1]
+            update_progress(f"Writing {section['level']}: {section['title']} ({section['word_count']} words)...")
+            article_sections[i - 1] = write_section(section, i)
+            completed += 1
+            update_progress(f"Completed {completed}/{total_sections} sections", (completed / total_sections))
+    elif missing:
+        # Write sections in parallel; results land in their brief slot so assembly order is unchanged
+        if len(missing) > 1:
+            # Write the first section alone so the shared context is cached before fanning out
+            first = sections[missing[0] - 1]
+            update_progress(f"Writing {first['level']}: {first['title']} ({first['word_count']} words)...")
+            article_sections[missing[0] - 1] = write_section(first, missing[0])
+            completed += 1
+            update_progress(f"Completed {completed}/{total_sections} sections", (completed / total_sections))
         
-        for section in article_sections:
-            # Add header
-            if section['level'] == 'H2':
-                full_article.append(f"\n## {section['title']}\n")
-            else:
-                full_article.append(f"\n### {section['title']}\n")
-            
-            # Add content
-            full_article.append(section['content'])
-        
-        return '\n'.join(full_article)
+        update_progress(f"Writing {total_sections - completed} sections ({max_workers} at a time)...")
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            # Each section runs in a copy of this context so the caller's priority class applies
+            futures = {
+                executor.submit(contextvars.copy_context().run, write_section, section, i): i
+                for i, section in enumerate(sections, 1)
+                if article_sections[i - 1] is None
+            }
+            pending = set(futures)
+            while pending:
+                # Wake up periodically while streaming so partial text reaches the caller's thread
+                done, pending = wait(pending, timeout=0.25 if stream else None, return_when=FIRST_COMPLETED)
+                if stream:
+                    report_partial()
+                for future in done:
+                    i = futures[future]
+                    article_sections[i - 1] = future.result()
+                    completed += 1
+                    update_progress(f"Completed {completed}/{total_sections} sections", (completed / total_sections))
+        finally:
+            # Don't start queued sections once one has failed
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    log.extend(section_logs)
     
-    final_article = assemble_article()
+    total_usage = {}
+    for counts in section_usage:
+        if counts:
+            add_usage(total_usage, counts)
+    log.append(f"\nToken usage: {format_usage(total_usage)}\n")
+    if restored:
+        log.append(f"Restored {restored} sections from checkpoints (originally {format_usage(restored_usage)})\n")
+    
+    # Assemble full article
+    final_article = assemble_article(article_sections)
     
     update_progress("✓ Article assembled", 1.0)
     log.append("\n✓ Article assembled\n")